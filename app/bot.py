@@ -4,10 +4,16 @@ Main Telegram bot implementation.
 Handles all Telegram commands and interactions.
 """
 import asyncio
+import functools
+import html
 import logging
-import os
-import tempfile
-from typing import Optional
+import signal
+import string
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from telegram import Update, BotCommand
 from telegram.ext import (
@@ -19,6 +25,7 @@ from telegram.ext import (
     ConversationHandler,
 )
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
 
 from app.utils.config import config
 from app.utils.history import HistoryManager
@@ -31,6 +38,80 @@ logger = logging.getLogger(__name__)
 # Conversation states
 WAITING_FOR_IMAGE = 1
 
+# Minimum seconds between edits of a streamed reply (Telegram rate-limits edits)
+STREAM_EDIT_INTERVAL = 0.5
+
+# Minimum new characters before a streamed reply is re-joined and edited
+STREAM_EDIT_MIN_CHARS = 200
+
+# Seconds a per-chat worker waits for new work before exiting
+CHAT_WORKER_IDLE_SECONDS = 60.0
+
+# Byte budget for downloaded photos kept in memory, keyed by file_unique_id
+IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Response templates, built once at import; dynamic values are html-escaped
+WELCOME_MESSAGE = """
+Welcome to Avivo RAG Bot! 🤖
+
+I can help you with:
+• <b>Text Search</b> - Ask questions about documents (/ask)
+• <b>Image Captioning</b> - Get captions for images (/image)
+• <b>Summarization</b> - Summarize previous interactions (/summarize)
+
+Use /help for detailed usage instructions.
+""".strip()
+
+HELP_TEXT = """
+<b>Available Commands:</b>
+
+/ask &lt;query&gt; — Ask a question about documents
+Example: /ask What are the company policies?
+
+/image — Upload an image for captioning
+Reply with a photo and I'll generate a caption and tags
+
+/summarize — Summarize your recent interactions
+I'll create a summary of your last 3 messages or images
+
+/start — Show welcome message
+/help — Show this help message
+
+<b>Tips:</b>
+• Use clear, specific queries for better results
+• Uploaded images should be clear for better captions
+• I keep track of your last 3 interactions for summarization
+""".strip()
+
+ANSWER_TEMPLATE = string.Template("<b>Answer:</b>\n$answer\n\n<b>Sources:</b>\n$sources")
+CAPTION_TEMPLATE = string.Template("<b>Caption:</b> $caption\n\n<b>Tags:</b> $tags")
+SUMMARY_TEMPLATE = string.Template("<b>Summary:</b>\n$summary")
+
+ChatHandler = Callable[["TelegramRAGBot", Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+CommandCallback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+
+
+def enqueue_per_chat(handler: ChatHandler) -> ChatHandler:
+    """Run a handler on its chat's worker queue instead of the dispatcher task.
+
+    Updates from one chat are still handled in order, but a slow handler in one
+    chat no longer delays updates from other chats.
+
+    Args:
+        handler: Bot handler method.
+
+    Returns:
+        Wrapped handler that enqueues the call and returns immediately.
+    """
+
+    @functools.wraps(handler)
+    async def wrapper(
+        self: "TelegramRAGBot", update: Update, context: ContextTypes.DEFAULT_TYPE
+    ) -> None:
+        self._enqueue(handler, update, context)
+
+    return wrapper
+
 
 class TelegramRAGBot:
     """Main Telegram bot application."""
@@ -40,6 +121,11 @@ class TelegramRAGBot:
         self.config = config
         self.history_manager = HistoryManager(max_per_user=3)
 
+        # Dedicated pools for blocking work so slow vision inference cannot starve
+        # retrieval; BLIP gets a single slot since it holds the GPU.
+        self.rag_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag")
+        self.vision_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="blip")
+
         # Initialize RAG service
         self.rag_service = RAGService(
             embedding_model=config.embedding_model,
@@ -49,6 +135,17 @@ class TelegramRAGBot:
             chunk_overlap_tokens=config.chunk_overlap_tokens,
             top_k=config.rag_top_k,
             max_context_tokens=config.rag_max_context_tokens,
+            embedding_backend=config.embedding_backend,
+            embedding_onnx_file=config.embedding_onnx_file,
+            vector_quantization=config.vector_quantization,
+            vector_store_backend=config.vector_store_backend,
+            vector_index_type=config.vector_index_type,
+            vector_search_threads=config.vector_search_threads,
+            query_cache_size=config.rag_query_cache_size,
+            embedding_device=config.embedding_device,
+            executor=self.rag_executor,
+            batch_size=config.rag_batch_size,
+            batch_wait_ms=config.rag_batch_wait_ms,
         )
 
         # Initialize LLM client
@@ -56,10 +153,37 @@ class TelegramRAGBot:
             openai_api_key=config.openai_api_key,
             ollama_url=config.ollama_url,
             timeout_seconds=config.llm_timeout_seconds,
+            embedder=self.rag_service.embedder,
+            semantic_cache_size=config.semantic_cache_size,
+            semantic_cache_threshold=config.semantic_cache_threshold,
+            batch_size=config.llm_batch_size,
+            batch_wait_ms=config.llm_batch_wait_ms,
+            executor=self.rag_executor,
+            context_window=config.llm_context_window,
         )
 
-        # Initialize vision service
-        self.vision_service = BLIPCaptioningService(model_name=config.vision_model)
+        # Vision service is built on first /image use (loading BLIP takes seconds)
+        self.vision_service: Optional[BLIPCaptioningService] = None
+        self._vision_lock = asyncio.Lock()
+
+        # Downloaded photo bytes (LRU) so re-sent photos skip Telegram's API
+        self._image_cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._image_cache_bytes = 0
+
+        # Last LLM summary per user: user_id -> (context_text, summary)
+        self._summary_cache: Dict[int, Tuple[str, str]] = {}
+
+        # Command name -> handler, dispatched by route_command
+        self._commands: Dict[str, CommandCallback] = {
+            "start": self.start_command,
+            "help": self.help_command,
+            "ask": self.ask_command,
+            "summarize": self.summarize_command,
+        }
+
+        # Per-chat work queues (see enqueue_per_chat)
+        self._chat_queues: Dict[int, asyncio.Queue] = {}
+        self._chat_workers: Dict[int, asyncio.Task] = {}
 
         # Will be set in main
         self.app: Optional[Application] = None
@@ -74,57 +198,134 @@ class TelegramRAGBot:
         self.rag_service.initialize(data_dir)
         logger.info("Bot services initialized")
 
-    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle /start command.
+    async def _get_vision_service(self) -> BLIPCaptioningService:
+        """Get the vision service, loading the BLIP model on first use.
+
+        Returns:
+            Initialized BLIPCaptioningService.
+        """
+        if self.vision_service is not None:
+            return self.vision_service
+
+        async with self._vision_lock:
+            if self.vision_service is None:
+                loop = asyncio.get_running_loop()
+                self.vision_service = await loop.run_in_executor(
+                    self.vision_executor,
+                    lambda: BLIPCaptioningService(
+                        model_name=self.config.vision_model,
+                        executor=self.vision_executor,
+                        quantize=self.config.vision_quantize,
+                        cpu_offload=self.config.vision_cpu_offload,
+                        fp8_weights=self.config.vision_fp8_weights,
+                    ),
+                )
+        return self.vision_service
+
+    def _enqueue(self, handler: ChatHandler, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Queue a handler call on its chat's worker, starting the worker if needed.
 
         Args:
+            handler: Bot handler method (unbound).
             update: Telegram update.
             context: Context.
         """
-        welcome_message = """
-Welcome to Avivo RAG Bot! 🤖
+        chat_id = update.effective_chat.id
+        queue = self._chat_queues.get(chat_id)
+        if queue is None:
+            queue = self._chat_queues[chat_id] = asyncio.Queue()
 
-I can help you with:
-• <b>Text Search</b> - Ask questions about documents (/ask)
-• <b>Image Captioning</b> - Get captions for images (/image)
-• <b>Summarization</b> - Summarize previous interactions (/summarize)
+        queue.put_nowait((handler, update, context))
 
-Use /help for detailed usage instructions.
-        """.strip()
+        if chat_id not in self._chat_workers:
+            self._chat_workers[chat_id] = asyncio.create_task(self._chat_worker(chat_id, queue))
 
-        await update.message.reply_text(welcome_message, parse_mode=ParseMode.HTML)
-        logger.info(f"User {update.effective_user.id} started bot")
+    async def _chat_worker(self, chat_id: int, queue: asyncio.Queue) -> None:
+        """Drain a chat's queue serially, exiting after an idle period.
 
-    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle /help command.
+        Args:
+            chat_id: Telegram chat ID.
+            queue: The chat's work queue.
+        """
+        while True:
+            try:
+                handler, update, context = await asyncio.wait_for(
+                    queue.get(), timeout=CHAT_WORKER_IDLE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                if queue.empty():
+                    del self._chat_queues[chat_id]
+                    del self._chat_workers[chat_id]
+                    return
+                continue
+
+            try:
+                await handler(self, update, context)
+            except Exception as e:
+                logger.error(f"Update {update} caused error: {e}", exc_info=True)
+            finally:
+                queue.task_done()
+
+    async def shutdown(self) -> None:
+        """Cancel chat workers and release client connections."""
+        workers = list(self._chat_workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._chat_workers.clear()
+        self._chat_queues.clear()
+
+        await self.rag_service.aclose()
+        await self.llm_client.aclose()
+        if self.vision_service is not None:
+            await self.vision_service.aclose()
+
+        # Drop queued work and wait for in-flight calls off the event loop
+        for executor in (self.rag_executor, self.vision_executor):
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def route_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Dispatch a command message to its handler.
+
+        Replaces one CommandHandler per command: the command name is parsed once
+        and looked up in a dict instead of testing every handler's filter.
 
         Args:
             update: Telegram update.
             context: Context.
         """
-        help_text = """
-<b>Available Commands:</b>
+        tokens = update.message.text.split()
+        command, _, target = tokens[0][1:].partition("@")
+        if target and target.lower() != (context.bot.username or "").lower():
+            return  # Addressed to another bot in a group chat
 
-/ask &lt;query&gt; — Ask a question about documents
-Example: /ask What are the company policies?
+        handler = self._commands.get(command.lower())
+        if handler is None:
+            return
 
-/image — Upload an image for captioning
-Reply with a photo and I'll generate a caption and tags
+        context.args = tokens[1:]
+        await handler(update, context)
 
-/summarize — Summarize your recent interactions
-I'll create a summary of your last 3 messages or images
+    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /start command.
 
-/start — Show welcome message
-/help — Show this help message
+        Args:
+            update: Telegram update.
+            context: Context.
+        """
+        await update.message.reply_text(WELCOME_MESSAGE, parse_mode=ParseMode.HTML)
+        logger.info(f"User {update.effective_user.id} started bot")
 
-<b>Tips:</b>
-• Use clear, specific queries for better results
-• Uploaded images should be clear for better captions
-• I keep track of your last 3 interactions for summarization
-        """.strip()
+    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /help command.
 
-        await update.message.reply_text(help_text, parse_mode=ParseMode.HTML)
+        Args:
+            update: Telegram update.
+            context: Context.
+        """
+        await update.message.reply_text(HELP_TEXT, parse_mode=ParseMode.HTML)
 
+    @enqueue_per_chat
     async def ask_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /ask command for document retrieval.
 
@@ -150,8 +351,8 @@ I'll create a summary of your last 3 messages or images
         await update.message.chat.send_action("typing")
 
         try:
-            # Retrieve relevant chunks
-            retrieved = self.rag_service.retrieve(query, k=self.config.rag_top_k)
+            # Retrieve relevant chunks (batched with concurrent queries, off the loop)
+            retrieved = await self.rag_service.retrieve_async(query, self.config.rag_top_k)
 
             if not retrieved:
                 await update.message.reply_text(
@@ -160,51 +361,96 @@ I'll create a summary of your last 3 messages or images
                 )
                 return
 
-            # Build prompt
-            prompt = self.rag_service.build_prompt(query, retrieved)
-
-            # Generate answer
-            result = await self.llm_client.generate_async(
-                prompt,
-                max_tokens=self.config.llm_max_tokens,
-                temperature=self.config.llm_temperature,
+            # Build messages (static context prefix + query)
+            messages = self.rag_service.build_messages(query, retrieved)
+
+            # Stream answer into a placeholder message
+            reply = await update.message.reply_text("…")
+            answer = await self._stream_to_message(
+                reply,
+                self.llm_client.generate_stream(
+                    messages=messages,
+                    max_tokens=self.config.llm_max_tokens,
+                    temperature=self.config.llm_temperature,
+                ),
             )
 
             # Check if response contains an error
-            if "Error" in result.get("text", "") or not result.get("text"):
-                error_msg = result.get("text", "Failed to generate response")
+            if "Error" in answer or not answer:
+                error_msg = answer or "Failed to generate response"
                 if "quota" in error_msg.lower():
-                    await update.message.reply_text(
+                    await reply.edit_text(
                         "⚠️ LLM API quota exceeded. Please check your OpenAI account or configure Ollama.\n\n"
                         f"Documents found: {len(retrieved)} chunk(s) with relevant information.\n"
                         "Set OLLAMA_URL environment variable and restart the bot to use local LLM.",
                         parse_mode=ParseMode.HTML,
                     )
                 else:
-                    await update.message.reply_text(
-                        f"Error: {error_msg}",
+                    await reply.edit_text(
+                        f"Error: {html.escape(error_msg)}",
                         parse_mode=ParseMode.HTML,
                     )
                 return
 
             # Format response
-            response_text = f"<b>Answer:</b>\n{result['text']}\n\n"
-            response_text += "<b>Sources:</b>\n"
-            for i, r in enumerate(retrieved, 1):
-                source_info = f"{i}. {r['doc_name']} (chunk {r['chunk_index']}) - similarity: {r['score']:.2f}"
-                response_text += source_info + "\n"
-
-            # Send response
-            await update.message.reply_text(response_text, parse_mode=ParseMode.HTML)
+            sources = "\n".join(
+                f"{i}. {r['doc_name']} (chunk {r['chunk_index']}) - similarity: {r['score']:.2f}"
+                for i, r in enumerate(retrieved, 1)
+            )
+            response_text = ANSWER_TEMPLATE.substitute(
+                answer=html.escape(answer), sources=html.escape(sources)
+            )
+
+            # Replace streamed text with the final formatted response
+            await reply.edit_text(response_text, parse_mode=ParseMode.HTML)
             logger.info(f"User {user_id} asked: {query[:50]}")
 
         except Exception as e:
             logger.error(f"Error in /ask command: {e}")
             await update.message.reply_text(
-                f"Error: {str(e)[:100]}",
+                f"Error: {html.escape(str(e)[:100])}",
                 parse_mode=ParseMode.HTML,
             )
 
+    async def _stream_to_message(self, message, chunks: AsyncIterator[str]) -> str:
+        """Accumulate streamed text, editing a message with progress every few hundred chars.
+
+        Intermediate edits are sent as plain text since partial output may not be
+        valid HTML; the caller makes the final formatted edit.
+
+        Args:
+            message: Telegram message to edit.
+            chunks: Async iterator of text deltas.
+
+        Returns:
+            Full generated text (stripped).
+        """
+        parts: List[str] = []
+        total_len = 0
+        shown_len = 0
+        last_edit = time.monotonic()
+
+        async for chunk in chunks:
+            parts.append(chunk)
+            total_len += len(chunk)
+            # Joining is O(total); only do it when an edit is actually due
+            if total_len - shown_len < STREAM_EDIT_MIN_CHARS:
+                continue
+            now = time.monotonic()
+            if now - last_edit < STREAM_EDIT_INTERVAL:
+                continue
+
+            text = "".join(parts).strip()
+            if text:
+                try:
+                    await message.edit_text(text)
+                except BadRequest as e:
+                    logger.debug(f"Skipped streaming edit: {e}")
+            shown_len = total_len
+            last_edit = now
+
+        return "".join(parts).strip()
+
     async def image_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /image command to start image captioning.
 
@@ -228,8 +474,6 @@ I'll create a summary of your last 3 messages or images
         Returns:
             State (WAITING_FOR_IMAGE to continue or ConversationHandler.END).
         """
-        user_id = update.effective_user.id
-
         if not update.message.photo:
             await update.message.reply_text(
                 "Please send a valid image.",
@@ -237,56 +481,90 @@ I'll create a summary of your last 3 messages or images
             )
             return WAITING_FOR_IMAGE
 
+        # Caption on the chat's worker so the conversation can end right away
+        self._enqueue(TelegramRAGBot._caption_photo, update, context)
+        return ConversationHandler.END
+
+    async def _caption_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Download an uploaded photo, caption it and reply.
+
+        Args:
+            update: Telegram update.
+            context: Context.
+        """
+        user_id = update.effective_user.id
+
         await update.message.chat.send_action("upload_photo")
 
         try:
             # Download image
             photo = update.message.photo[-1]
-            file = await context.bot.get_file(photo.file_id)
-
-            # Save to temp file
-            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp_file:
-                tmp_path = tmp_file.name
-
-            # Download file to path
-            await file.download_to_drive(tmp_path)
+            image_bytes = BytesIO(await self._download_photo(photo, context))
 
             await update.message.chat.send_action("typing")
 
             # Generate caption
-            result = await self.vision_service.caption_image_async(tmp_path)
+            vision_service = await self._get_vision_service()
+            result = await vision_service.caption_image_from_bytes_async(image_bytes)
 
             # Add to history
             self.history_manager.add_interaction(
                 user_id,
                 "image",
                 result["caption"],
-                metadata={"tags": result["tags"], "file": tmp_path},
+                metadata={"tags": result["tags"], "file_id": photo.file_unique_id},
             )
 
             # Format response
             if result["success"]:
-                caption = result["caption"]
-                tags = ", ".join(result["tags"])
-                response = f"<b>Caption:</b> {caption}\n\n<b>Tags:</b> {tags}"
+                response = CAPTION_TEMPLATE.substitute(
+                    caption=html.escape(result["caption"]),
+                    tags=html.escape(", ".join(result["tags"])),
+                )
             else:
-                response = f"Error: {result['caption']}"
+                response = f"Error: {html.escape(result['caption'])}"
 
             await update.message.reply_text(response, parse_mode=ParseMode.HTML)
-
-            # Clean up
-            os.unlink(tmp_path)
             logger.info(f"User {user_id} captioned image")
 
         except Exception as e:
             logger.error(f"Error handling image: {e}")
             await update.message.reply_text(
-                f"Error processing image: {str(e)[:100]}",
+                f"Error processing image: {html.escape(str(e)[:100])}",
                 parse_mode=ParseMode.HTML,
             )
 
-        return ConversationHandler.END
+    async def _download_photo(self, photo, context: ContextTypes.DEFAULT_TYPE) -> bytes:
+        """Download a photo's bytes, reusing cached bytes for repeated photos.
+
+        Args:
+            photo: Telegram PhotoSize.
+            context: Context.
 
+        Returns:
+            Raw image bytes.
+        """
+        key = photo.file_unique_id
+        data = self._image_cache.get(key)
+        if data is not None:
+            self._image_cache.move_to_end(key)
+            logger.debug(f"Image cache hit for {key}")
+            return data
+
+        # Download into memory; no temp file to write or clean up
+        file = await context.bot.get_file(photo.file_id)
+        data = bytes(await file.download_as_bytearray())
+
+        if len(data) <= IMAGE_CACHE_MAX_BYTES:
+            self._image_cache[key] = data
+            self._image_cache_bytes += len(data)
+            while self._image_cache_bytes > IMAGE_CACHE_MAX_BYTES:
+                _, evicted = self._image_cache.popitem(last=False)
+                self._image_cache_bytes -= len(evicted)
+
+        return data
+
+    @enqueue_per_chat
     async def summarize_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /summarize command.
 
@@ -306,9 +584,27 @@ I'll create a summary of your last 3 messages or images
             )
             return
 
+        # Short histories get a templated summary with no LLM round-trip
+        local_summary = self.history_manager.build_local_summary(user_id)
+        if local_summary:
+            await update.message.reply_text(
+                SUMMARY_TEMPLATE.substitute(summary=html.escape(local_summary)),
+                parse_mode=ParseMode.HTML,
+            )
+            return
+
         # Build context for summarization
         context_text = self.history_manager.get_context_for_summarization(user_id)
 
+        # Nothing new since the last summary
+        cached = self._summary_cache.get(user_id)
+        if cached and cached[0] == context_text:
+            await update.message.reply_text(
+                SUMMARY_TEMPLATE.substitute(summary=html.escape(cached[1])),
+                parse_mode=ParseMode.HTML,
+            )
+            return
+
         # Create summarization prompt
         prompt = f"""Summarize the following recent interactions in 2-3 sentences:
 
@@ -319,11 +615,17 @@ Summary:"""
         await update.message.chat.send_action("typing")
 
         try:
-            result = await self.llm_client.generate_async(prompt, max_tokens=100)
+            # Per-user history behind a fixed template; never serve another user's summary
+            result = await self.llm_client.generate_async(prompt, max_tokens=100, use_cache=False)
 
             if result.get("text"):
                 summary = result["text"]
-                await update.message.reply_text(f"<b>Summary:</b>\n{summary}", parse_mode=ParseMode.HTML)
+                if not summary.startswith("Error"):
+                    self._summary_cache[user_id] = (context_text, summary)
+                await update.message.reply_text(
+                    SUMMARY_TEMPLATE.substitute(summary=html.escape(summary)),
+                    parse_mode=ParseMode.HTML,
+                )
             else:
                 await update.message.reply_text(
                     "Error generating summary.",
@@ -333,7 +635,7 @@ Summary:"""
         except Exception as e:
             logger.error(f"Error in /summarize: {e}")
             await update.message.reply_text(
-                f"Error: {str(e)[:100]}",
+                f"Error: {html.escape(str(e)[:100])}",
                 parse_mode=ParseMode.HTML,
             )
 
@@ -350,6 +652,7 @@ Summary:"""
 async def main():
     """Initialize and start the bot."""
     app = None
+    bot = None
     try:
         logger.info("Starting Telegram RAG Bot...")
         
@@ -358,15 +661,16 @@ async def main():
         await bot.initialize(data_dir="data")
         
         # Create Telegram application
-        app = Application.builder().token(config.telegram_bot_token).build()
-        
-        # Add command handlers
-        app.add_handler(CommandHandler("start", bot.start_command))
-        app.add_handler(CommandHandler("help", bot.help_command))
-        app.add_handler(CommandHandler("ask", bot.ask_command))
-        app.add_handler(CommandHandler("summarize", bot.summarize_command))
+        app = (
+            Application.builder()
+            .token(config.telegram_bot_token)
+            .concurrent_updates(True)
+            .connection_pool_size(128)
+            .pool_timeout(1.0)
+            .build()
+        )
         
-        # Add image conversation handler
+        # Add image conversation handler (checked before the command router)
         conv_handler = ConversationHandler(
             entry_points=[CommandHandler("image", bot.image_command)],
             states={
@@ -377,21 +681,27 @@ async def main():
             fallbacks=[CommandHandler("cancel", bot.start_command)],
         )
         app.add_handler(conv_handler)
+
+        # Route all other commands with a single dict lookup
+        app.add_handler(
+            MessageHandler(filters.COMMAND & filters.UpdateType.MESSAGE, bot.route_command)
+        )
         
         # Add error handler
         app.add_error_handler(bot.error_handler)
         
         # Start the bot
-        logger.info("Starting bot polling...")
+        mode = "webhook" if config.use_webhook else "polling"
+        logger.info(f"Starting bot {mode}...")
         await app.initialize()
         await app.start()
-        await app.updater.start_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
-        
-        # Keep the bot running indefinitely
-        logger.info("Bot is running. Press Ctrl+C to stop.")
-        stop_event = asyncio.Event()
-        await stop_event.wait()
-        
+
+        # Run until SIGINT/SIGTERM; a failure in either task cancels the other
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(_start_updater(app))
+            tg.create_task(_wait_for_stop_signal())
+        logger.info("Bot shutdown requested")
+
     except (KeyboardInterrupt, SystemExit):
         logger.info("Bot shutdown requested")
     except Exception as e:
@@ -399,11 +709,72 @@ async def main():
         raise
     finally:
         if app:
-            await app.updater.stop()
-            await app.stop()
+            if app.updater.running:
+                await app.updater.stop()
+            if app.running:
+                await app.stop()
+            await app.shutdown()
+        if bot:
+            await bot.shutdown()
+
+
+async def _start_updater(app: Application) -> None:
+    """Start receiving updates via webhook or long polling.
+
+    Args:
+        app: Initialized and started Telegram application.
+    """
+    if config.use_webhook:
+        await app.updater.start_webhook(
+            listen="0.0.0.0",
+            port=config.webhook_port,
+            url_path=config.telegram_bot_token,
+            webhook_url=f"{config.public_url}/{config.telegram_bot_token}",
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=True,
+        )
+    else:
+        await app.updater.start_polling(
+            allowed_updates=Update.ALL_TYPES, drop_pending_updates=True
+        )
+    logger.info("Bot is running. Press Ctrl+C to stop.")
 
 
-if __name__ == "__main__":
-    import asyncio
+async def _wait_for_stop_signal() -> None:
+    """Wait until SIGINT or SIGTERM is received."""
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    signals = (signal.SIGINT, signal.SIGTERM)
+
+    try:
+        for sig in signals:
+            loop.add_signal_handler(sig, stop_event.set)
+    except NotImplementedError:
+        # Windows event loops lack add_signal_handler; Ctrl+C raises KeyboardInterrupt
+        pass
 
+    try:
+        await stop_event.wait()
+    finally:
+        for sig in signals:
+            try:
+                loop.remove_signal_handler(sig)
+            except NotImplementedError:
+                pass
+
+
+def install_event_loop_policy() -> None:
+    """Use uvloop for the asyncio event loop when it is installed."""
+    try:
+        import uvloop
+    except ImportError:
+        logger.debug("uvloop not installed, using default asyncio event loop")
+        return
+
+    uvloop.install()
+    logger.info("Using uvloop event loop")
+
+
+if __name__ == "__main__":
+    install_event_loop_policy()
     asyncio.run(main())
@@ -1,5 +1,6 @@
 # app/llm/__init__.py
 """LLM client module."""
 from app.llm.client import LLMClient
+from app.llm.semantic_cache import SemanticCache
 
-__all__ = ["LLMClient"]
+__all__ = ["LLMClient", "SemanticCache"]
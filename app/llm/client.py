@@ -3,13 +3,64 @@
 LLM client wrapper supporting OpenAI and Ollama.
 Provides unified interface for both providers.
 """
-from typing import Optional, Dict, Any
-import asyncio
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator
+import json
 import logging
 import time
 
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+from app.utils.batcher import MicroBatcher
+from app.llm.semantic_cache import SemanticCache
+
 logger = logging.getLogger(__name__)
 
+# Per-message framing overhead of the OpenAI chat format
+MESSAGE_TOKEN_OVERHEAD = 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoder(model: str) -> Optional[Any]:
+    """Load (once per model) the tiktoken encoder used for prompt length checks.
+
+    Args:
+        model: OpenAI model name.
+
+    Returns:
+        Encoder, or None if tiktoken or its vocabulary is unavailable.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoder unavailable, estimating prompt tokens: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Count tokens in text, falling back to the 1 token ≈ 4 characters heuristic.
+
+    Args:
+        text: Input text.
+        model: Model whose tokenizer to use.
+
+    Returns:
+        Token count.
+    """
+    encoder = _get_encoder(model)
+    if encoder is None:
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text))
+
 
 class LLMClient:
     """Unified LLM client supporting OpenAI and Ollama."""
@@ -19,6 +70,13 @@ class LLMClient:
         openai_api_key: Optional[str] = None,
         ollama_url: Optional[str] = None,
         timeout_seconds: int = 30,
+        embedder: Optional[Any] = None,
+        semantic_cache_size: int = 4096,
+        semantic_cache_threshold: float = 0.95,
+        batch_size: int = 8,
+        batch_wait_ms: float = 20.0,
+        executor: Optional[Executor] = None,
+        context_window: int = 4096,
     ):
         """Initialize LLM client.
 
@@ -26,11 +84,34 @@ class LLMClient:
             openai_api_key: OpenAI API key. If provided, uses OpenAI.
             ollama_url: Ollama service URL. If provided and no OpenAI key, uses Ollama.
             timeout_seconds: Request timeout in seconds.
+            embedder: Optional embedder enabling the semantic answer cache in generate_async.
+            semantic_cache_size: Maximum cached answers (0 disables the cache).
+            semantic_cache_threshold: Minimum cosine similarity for a cache hit.
+            batch_size: Maximum concurrent generate_async calls coalesced per batch
+                (1 disables batching).
+            batch_wait_ms: Maximum time to wait for a batch to fill.
+            executor: Executor for blocking semantic-cache embedding (default loop executor).
+            context_window: OpenAI model context size in tokens; longer prompts are
+                rejected locally instead of paying for a round trip (0 disables the check).
         """
         self.openai_api_key = openai_api_key
         self.ollama_url = ollama_url
         self.timeout_seconds = timeout_seconds
+        self.context_window = context_window
         self.provider = self._determine_provider()
+        self.semantic_cache: Optional[SemanticCache] = None
+        if embedder is not None and semantic_cache_size > 0:
+            self.semantic_cache = SemanticCache(
+                embedder,
+                max_entries=semantic_cache_size,
+                threshold=semantic_cache_threshold,
+                executor=executor,
+            )
+        self.batcher: Optional[MicroBatcher] = None
+        if batch_size > 1:
+            self.batcher = MicroBatcher(
+                self._dispatch_async, max_batch_size=batch_size, max_wait_ms=batch_wait_ms
+            )
 
         if self.provider == "openai":
             try:
@@ -38,13 +119,19 @@ class LLMClient:
 
                 openai.api_key = openai_api_key
                 self.openai_client = openai.OpenAI(api_key=openai_api_key, timeout=timeout_seconds)
+                self.aopenai_client = openai.AsyncOpenAI(
+                    api_key=openai_api_key, timeout=timeout_seconds
+                )
             except ImportError:
                 logger.warning("OpenAI library not installed, LLM calls will fail")
                 self.openai_client = None
+                self.aopenai_client = None
         elif self.provider == "ollama":
-            import requests
+            import httpx
 
-            self.session = requests.Session()
+            limits = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+            self.session = httpx.Client(http2=True, timeout=timeout_seconds, limits=limits)
+            self.aclient = httpx.AsyncClient(http2=True, timeout=timeout_seconds, limits=limits)
         else:
             logger.warning("No LLM provider configured")
 
@@ -64,18 +151,20 @@ class LLMClient:
 
     def generate(
         self,
-        prompt: str,
+        prompt: Optional[str] = None,
         max_tokens: int = 256,
         temperature: float = 0.0,
         model: Optional[str] = None,
+        messages: Optional[List[Dict[str, str]]] = None,
     ) -> Dict[str, Any]:
         """Generate text using configured LLM provider.
 
         Args:
-            prompt: Input prompt.
+            prompt: Input prompt (sent as a single user message).
             max_tokens: Maximum tokens to generate.
             temperature: Sampling temperature.
             model: Model name (uses defaults if not specified).
+            messages: Pre-built chat messages; takes precedence over prompt.
 
         Returns:
             Dict with keys: text, usage (dict with prompt_tokens, completion_tokens, total_tokens).
@@ -89,9 +178,11 @@ class LLMClient:
 
         try:
             if self.provider == "openai":
-                return self._generate_openai(prompt, max_tokens, temperature, model)
+                return self._generate_openai(prompt, max_tokens, temperature, model, messages)
             elif self.provider == "ollama":
-                return self._generate_ollama(prompt, max_tokens, temperature, model)
+                return self._generate_ollama_sync(
+                    prompt, max_tokens, temperature, model, messages
+                )
         except Exception as e:
             logger.error(f"Error generating text with {self.provider}: {e}")
             return {
@@ -99,8 +190,30 @@ class LLMClient:
                 "usage": {},
             }
 
+    @staticmethod
+    def _as_messages(
+        prompt: Optional[str], messages: Optional[List[Dict[str, str]]]
+    ) -> List[Dict[str, str]]:
+        """Normalize a bare prompt or pre-built messages into a chat message list.
+
+        Args:
+            prompt: Input prompt.
+            messages: Pre-built chat messages.
+
+        Returns:
+            List of {"role", "content"} dicts.
+        """
+        if messages:
+            return messages
+        return [{"role": "user", "content": prompt or ""}]
+
     def _generate_openai(
-        self, prompt: str, max_tokens: int, temperature: float, model: Optional[str]
+        self,
+        prompt: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        model: Optional[str],
+        messages: Optional[List[Dict[str, str]]] = None,
     ) -> Dict[str, Any]:
         """Generate using OpenAI API.
 
@@ -109,6 +222,7 @@ class LLMClient:
             max_tokens: Maximum tokens.
             temperature: Temperature.
             model: Model name (defaults to gpt-3.5-turbo).
+            messages: Pre-built chat messages.
 
         Returns:
             Generation result dict.
@@ -120,11 +234,56 @@ class LLMClient:
 
         response = self.openai_client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=self._as_messages(prompt, messages),
             max_tokens=max_tokens,
             temperature=temperature,
         )
 
+        return self._parse_openai_response(response)
+
+    async def _generate_openai_async(
+        self,
+        prompt: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        model: Optional[str],
+        messages: Optional[List[Dict[str, str]]] = None,
+    ) -> Dict[str, Any]:
+        """Generate using the async OpenAI client.
+
+        Args:
+            prompt: Input prompt.
+            max_tokens: Maximum tokens.
+            temperature: Temperature.
+            model: Model name (defaults to gpt-3.5-turbo).
+            messages: Pre-built chat messages.
+
+        Returns:
+            Generation result dict.
+        """
+        if not self.aopenai_client:
+            raise RuntimeError("OpenAI client not initialized")
+
+        model = model or "gpt-3.5-turbo"
+
+        response = await self.aopenai_client.chat.completions.create(
+            model=model,
+            messages=self._as_messages(prompt, messages),
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+
+        return self._parse_openai_response(response)
+
+    def _parse_openai_response(self, response: Any) -> Dict[str, Any]:
+        """Convert an OpenAI chat completion into a generation result dict.
+
+        Args:
+            response: ChatCompletion returned by the OpenAI client.
+
+        Returns:
+            Generation result dict.
+        """
         return {
             "text": response.choices[0].message.content,
             "usage": {
@@ -134,39 +293,62 @@ class LLMClient:
             },
         }
 
-    def _generate_ollama(
-        self, prompt: str, max_tokens: int, temperature: float, model: Optional[str]
-    ) -> Dict[str, Any]:
-        """Generate using Ollama API.
+    def _ollama_request(
+        self,
+        prompt: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        model: Optional[str],
+        messages: Optional[List[Dict[str, str]]] = None,
+        stream: bool = False,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build the URL and request body for an Ollama generation.
+
+        Bare prompts go to /api/generate; pre-built messages go to /api/chat so
+        Ollama can reuse the KV cache for an unchanged system prefix.
 
         Args:
             prompt: Input prompt.
             max_tokens: Maximum tokens.
             temperature: Temperature.
             model: Model name (defaults to mistral:latest).
+            messages: Pre-built chat messages.
+            stream: Request a JSONL token stream instead of a single response.
 
         Returns:
-            Generation result dict.
+            (url, payload) tuple.
         """
-        model = model or "mistral:latest"
-
-        url = f"{self.ollama_url}/api/generate"
-        payload = {
-            "model": model,
-            "prompt": prompt,
-            "stream": False,
+        payload: Dict[str, Any] = {
+            "model": model or "mistral:latest",
+            "stream": stream,
             "options": {
                 "temperature": temperature,
                 "num_predict": max_tokens,
             },
         }
+        if messages:
+            payload["messages"] = messages
+            return f"{self.ollama_url}/api/chat", payload
 
-        response = self.session.post(url, json=payload, timeout=self.timeout_seconds)
-        response.raise_for_status()
+        payload["prompt"] = prompt or ""
+        return f"{self.ollama_url}/api/generate", payload
+
+    def _parse_ollama_response(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert an Ollama response body into a generation result dict.
+
+        Args:
+            data: Decoded JSON response.
+
+        Returns:
+            Generation result dict.
+        """
+        if "message" in data:
+            text = data["message"].get("content", "")
+        else:
+            text = data.get("response", "")
 
-        data = response.json()
         return {
-            "text": data.get("response", "").strip(),
+            "text": text.strip(),
             "usage": {
                 "prompt_tokens": data.get("prompt_eval_count", 0),
                 "completion_tokens": data.get("eval_count", 0),
@@ -174,12 +356,106 @@ class LLMClient:
             },
         }
 
+    def _generate_ollama_sync(
+        self,
+        prompt: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        model: Optional[str],
+        messages: Optional[List[Dict[str, str]]] = None,
+    ) -> Dict[str, Any]:
+        """Generate using Ollama API (blocking).
+
+        Args:
+            prompt: Input prompt.
+            max_tokens: Maximum tokens.
+            temperature: Temperature.
+            model: Model name (defaults to mistral:latest).
+            messages: Pre-built chat messages.
+
+        Returns:
+            Generation result dict.
+        """
+        url, payload = self._ollama_request(prompt, max_tokens, temperature, model, messages)
+
+        response = self.session.post(url, json=payload)
+        response.raise_for_status()
+
+        return self._parse_ollama_response(response.json())
+
+    async def _generate_ollama_async(
+        self,
+        prompt: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        model: Optional[str],
+        messages: Optional[List[Dict[str, str]]] = None,
+    ) -> Dict[str, Any]:
+        """Generate using Ollama API over the shared async HTTP/2 client.
+
+        Args:
+            prompt: Input prompt.
+            max_tokens: Maximum tokens.
+            temperature: Temperature.
+            model: Model name (defaults to mistral:latest).
+            messages: Pre-built chat messages.
+
+        Returns:
+            Generation result dict.
+        """
+        url, payload = self._ollama_request(prompt, max_tokens, temperature, model, messages)
+
+        response = await self.aclient.post(url, json=payload)
+        response.raise_for_status()
+
+        return self._parse_ollama_response(response.json())
+
+    def _check_prompt_length(
+        self,
+        prompt: Optional[str],
+        max_tokens: int,
+        model: Optional[str],
+        messages: Optional[List[Dict[str, str]]],
+    ) -> Optional[Dict[str, Any]]:
+        """Reject prompts that cannot fit the context window alongside the completion.
+
+        Only applied to OpenAI; Ollama truncates to its own num_ctx server-side.
+
+        Args:
+            prompt: Input prompt.
+            max_tokens: Maximum tokens to generate.
+            model: Model name (defaults to gpt-3.5-turbo).
+            messages: Pre-built chat messages; take precedence over prompt.
+
+        Returns:
+            Error result dict if the prompt is too long, otherwise None.
+        """
+        if self.provider != "openai" or self.context_window <= 0:
+            return None
+
+        model = model or "gpt-3.5-turbo"
+        chat = self._as_messages(prompt, messages)
+        n_tokens = sum(
+            count_tokens(m["content"], model) + MESSAGE_TOKEN_OVERHEAD for m in chat
+        )
+        limit = self.context_window - max_tokens
+        if n_tokens <= limit:
+            return None
+
+        logger.warning(f"Prompt too long: {n_tokens} tokens (limit {limit})")
+        return {
+            "text": f"Error: Prompt too long ({n_tokens} tokens, limit {limit})",
+            "usage": {},
+        }
+
     async def generate_async(
         self,
-        prompt: str,
+        prompt: Optional[str] = None,
         max_tokens: int = 256,
         temperature: float = 0.0,
         model: Optional[str] = None,
+        messages: Optional[List[Dict[str, str]]] = None,
+        use_cache: bool = True,
     ) -> Dict[str, Any]:
         """Asynchronous version of generate.
 
@@ -188,12 +464,251 @@ class LLMClient:
             max_tokens: Maximum tokens.
             temperature: Temperature.
             model: Model name.
+            messages: Pre-built chat messages; takes precedence over prompt.
+            use_cache: Consult the semantic answer cache (if configured).
 
         Returns:
-            Generation result dict.
+            Generation result dict. Semantic cache hits carry usage={"cached": True}.
+        """
+        if self.provider == "none":
+            return {
+                "text": "Error: No LLM provider configured. Set OPENAI_API_KEY or OLLAMA_URL.",
+                "usage": {},
+            }
+
+        too_long = self._check_prompt_length(prompt, max_tokens, model, messages)
+        if too_long:
+            return too_long
+
+        if not self.semantic_cache or not use_cache:
+            return await self._submit_async(prompt, max_tokens, temperature, model, messages)
+
+        chat = self._as_messages(prompt, messages)
+        query = chat[-1]["content"]
+        context_key = SemanticCache.context_key(
+            chat, model=model, max_tokens=max_tokens, temperature=temperature
+        )
+
+        cached, query_vector = await self.semantic_cache.get(query, context_key)
+        if cached:
+            return cached
+
+        result = await self._submit_async(prompt, max_tokens, temperature, model, messages)
+        if result.get("text") and not result["text"].startswith("Error"):
+            await self.semantic_cache.put(query_vector, query, context_key, result)
+        return result
+
+    async def generate_stream(
+        self,
+        prompt: Optional[str] = None,
+        max_tokens: int = 256,
+        temperature: float = 0.0,
+        model: Optional[str] = None,
+        messages: Optional[List[Dict[str, str]]] = None,
+        use_cache: bool = True,
+    ) -> AsyncIterator[str]:
+        """Stream generated text as it is produced.
+
+        Args:
+            prompt: Input prompt.
+            max_tokens: Maximum tokens.
+            temperature: Temperature.
+            model: Model name.
+            messages: Pre-built chat messages; takes precedence over prompt.
+            use_cache: Consult the semantic answer cache (if configured).
+
+        Yields:
+            Text deltas. On failure before any text is produced, a single error
+                message (starting with "Error") is yielded instead; a failure after
+                that ends the stream with an "[answer interrupted]" marker.
+        """
+        if self.provider == "none":
+            yield "Error: No LLM provider configured. Set OPENAI_API_KEY or OLLAMA_URL."
+            return
+
+        too_long = self._check_prompt_length(prompt, max_tokens, model, messages)
+        if too_long:
+            yield too_long["text"]
+            return
+
+        cache = self.semantic_cache if use_cache else None
+        if cache:
+            chat = self._as_messages(prompt, messages)
+            query = chat[-1]["content"]
+            context_key = SemanticCache.context_key(
+                chat, model=model, max_tokens=max_tokens, temperature=temperature
+            )
+            cached, query_vector = await cache.get(query, context_key)
+            if cached:
+                yield cached["text"]
+                return
+
+        if self.provider == "openai":
+            chunks = self._stream_openai_async(prompt, max_tokens, temperature, model, messages)
+        else:
+            chunks = self._stream_ollama_async(prompt, max_tokens, temperature, model, messages)
+
+        parts: List[str] = []
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error streaming text with {self.provider}: {e}")
+            if parts:
+                # Mark the partial answer as cut off (and keep it out of the cache)
+                yield "\n\n[answer interrupted]"
+            else:
+                yield f"Error: Failed to generate text ({str(e)[:100]})"
+            return
+
+        if cache and parts:
+            text = "".join(parts).strip()
+            await cache.put(query_vector, query, context_key, {"text": text, "usage": {}})
+
+    async def _stream_openai_async(
+        self,
+        prompt: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        model: Optional[str],
+        messages: Optional[List[Dict[str, str]]],
+    ) -> AsyncIterator[str]:
+        """Stream text deltas from the async OpenAI client.
+
+        Args:
+            prompt: Input prompt.
+            max_tokens: Maximum tokens.
+            temperature: Temperature.
+            model: Model name (defaults to gpt-3.5-turbo).
+            messages: Pre-built chat messages.
+
+        Yields:
+            Text deltas.
+        """
+        if not self.aopenai_client:
+            raise RuntimeError("OpenAI client not initialized")
+
+        stream = await self.aopenai_client.chat.completions.create(
+            model=model or "gpt-3.5-turbo",
+            messages=self._as_messages(prompt, messages),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def _stream_ollama_async(
+        self,
+        prompt: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        model: Optional[str],
+        messages: Optional[List[Dict[str, str]]],
+    ) -> AsyncIterator[str]:
+        """Stream text deltas from Ollama's JSONL response.
+
+        Args:
+            prompt: Input prompt.
+            max_tokens: Maximum tokens.
+            temperature: Temperature.
+            model: Model name (defaults to mistral:latest).
+            messages: Pre-built chat messages.
+
+        Yields:
+            Text deltas.
         """
-        # Run in thread pool to avoid blocking
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None, lambda: self.generate(prompt, max_tokens, temperature, model)
+        url, payload = self._ollama_request(
+            prompt, max_tokens, temperature, model, messages, stream=True
         )
+
+        async with self.aclient.stream("POST", url, json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "message" in data:
+                    chunk = data["message"].get("content", "")
+                else:
+                    chunk = data.get("response", "")
+                if chunk:
+                    yield chunk
+                if data.get("done"):
+                    break
+
+    async def _submit_async(
+        self,
+        prompt: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        model: Optional[str],
+        messages: Optional[List[Dict[str, str]]],
+    ) -> Dict[str, Any]:
+        """Route a request through the micro-batcher when enabled.
+
+        Neither provider exposes a multi-prompt completion endpoint, so a batch is
+        fanned out concurrently over the shared pooled connection; this lets the
+        server's scheduler batch prefill for requests arriving together.
+
+        Args:
+            prompt: Input prompt.
+            max_tokens: Maximum tokens.
+            temperature: Temperature.
+            model: Model name.
+            messages: Pre-built chat messages.
+
+        Returns:
+            Generation result dict.
+        """
+        if self.batcher:
+            return await self.batcher.submit(prompt, max_tokens, temperature, model, messages)
+        return await self._dispatch_async(prompt, max_tokens, temperature, model, messages)
+
+    async def _dispatch_async(
+        self,
+        prompt: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        model: Optional[str],
+        messages: Optional[List[Dict[str, str]]],
+    ) -> Dict[str, Any]:
+        """Call the configured provider asynchronously, converting errors to results.
+
+        Args:
+            prompt: Input prompt.
+            max_tokens: Maximum tokens.
+            temperature: Temperature.
+            model: Model name.
+            messages: Pre-built chat messages.
+
+        Returns:
+            Generation result dict.
+        """
+        try:
+            if self.provider == "openai":
+                return await self._generate_openai_async(
+                    prompt, max_tokens, temperature, model, messages
+                )
+            elif self.provider == "ollama":
+                return await self._generate_ollama_async(
+                    prompt, max_tokens, temperature, model, messages
+                )
+        except Exception as e:
+            logger.error(f"Error generating text with {self.provider}: {e}")
+            return {
+                "text": f"Error: Failed to generate text ({str(e)[:100]})",
+                "usage": {},
+            }
+
+    async def aclose(self) -> None:
+        """Close pooled HTTP connections held by the client."""
+        if self.batcher:
+            await self.batcher.aclose()
+        if self.provider == "openai" and self.aopenai_client:
+            await self.aopenai_client.close()
+        elif self.provider == "ollama":
+            await self.aclient.aclose()
+            self.session.close()
@@ -0,0 +1,151 @@
+"""
+Semantic answer cache for LLM generations.
+Short-circuits repeated or near-identical questions using embedding similarity.
+"""
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Embedding-keyed LRU cache of generation results."""
+
+    def __init__(
+        self,
+        embedder: Any,
+        max_entries: int = 4096,
+        threshold: float = 0.95,
+        prefix_tokens: int = 4,
+        executor: Optional[Executor] = None,
+    ):
+        """Initialize semantic cache.
+
+        Args:
+            embedder: Object exposing embed_texts(List[str]) returning one normalized
+                vector per text (e.g. SentenceTransformerEmbedder). Its embed_query,
+                if present, is used instead so retrieval and the cache share one
+                query embedding.
+            max_entries: Maximum cached results before LRU eviction.
+            threshold: Minimum cosine similarity for a hit.
+            prefix_tokens: Number of leading query tokens that must match exactly,
+                guarding against unrelated prompts that happen to embed closely.
+            executor: Executor for the blocking embedding call (default loop executor).
+        """
+        self.embedder = embedder
+        self._embed_query = getattr(embedder, "embed_query", None) or (
+            lambda query: embedder.embed_texts([query])[0]
+        )
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.prefix_tokens = prefix_tokens
+        self.executor = executor
+
+        self.vectors: Optional[np.ndarray] = None  # shape (max_entries, D), allocated lazily
+        self.size = 0
+        # row -> (context_key, query_prefix, result); order tracks recency
+        self.entries: "OrderedDict[int, Tuple[str, Tuple[str, ...], Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def context_key(messages: List[Dict[str, str]], **params: Any) -> str:
+        """Hash everything except the final query that must match exactly for a hit.
+
+        Args:
+            messages: Chat messages; the last one is the query.
+            **params: Generation parameters (model, max_tokens, temperature).
+
+        Returns:
+            Hex digest identifying the prompt context.
+        """
+        h = hashlib.sha1()
+        for key in sorted(params):
+            h.update(f"{key}={params[key]}\x00".encode())
+        for message in messages[:-1]:
+            h.update(f"{message['role']}\x00{message['content']}\x00".encode())
+        return h.hexdigest()
+
+    def _prefix(self, query: str) -> Tuple[str, ...]:
+        """Get the normalized leading tokens of a query."""
+        return tuple(query.lower().split()[: self.prefix_tokens])
+
+    async def get(self, query: str, context_key: str) -> Tuple[Optional[Dict[str, Any]], np.ndarray]:
+        """Look up a cached result for a query.
+
+        Args:
+            query: Query text to embed.
+            context_key: Key from context_key() for the surrounding prompt.
+
+        Returns:
+            (result, query_vector). result is None on a miss; query_vector can be
+            passed to put() to avoid re-embedding.
+        """
+        loop = asyncio.get_running_loop()
+        query_vector = await loop.run_in_executor(self.executor, self._embed_query, query)
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+
+        async with self._lock:
+            if self.size == 0:
+                self.misses += 1
+                return None, query_vector
+
+            scores = self.vectors[: self.size] @ query_vector
+            prefix = self._prefix(query)
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for row in candidates[np.argsort(-scores[candidates])]:
+                row = int(row)
+                entry = self.entries.get(row)
+                if entry and entry[0] == context_key and entry[1] == prefix:
+                    self.entries.move_to_end(row)
+                    self.hits += 1
+                    logger.debug(f"Semantic cache hit (score {scores[row]:.3f}) for: {query[:50]}")
+                    return {"text": entry[2]["text"], "usage": {"cached": True}}, query_vector
+
+            self.misses += 1
+            return None, query_vector
+
+    async def put(
+        self, query_vector: np.ndarray, query: str, context_key: str, result: Dict[str, Any]
+    ) -> None:
+        """Store a generation result.
+
+        Args:
+            query_vector: Normalized query embedding returned by get().
+            query: Query text.
+            context_key: Key from context_key() for the surrounding prompt.
+            result: Generation result dict to cache.
+        """
+        async with self._lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, query_vector.shape[0]), dtype=np.float32)
+
+            if self.size < self.max_entries:
+                row = self.size
+                self.size += 1
+            else:
+                # Reuse the slot of the least recently used entry
+                row, _ = self.entries.popitem(last=False)
+
+            self.vectors[row] = query_vector
+            self.entries[row] = (context_key, self._prefix(query), result)
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics.
+
+        Returns:
+            Stats dict.
+        """
+        return {
+            "entries": self.size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
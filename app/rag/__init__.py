@@ -3,7 +3,7 @@
 from app.rag.extractor import DocumentExtractor
 from app.rag.embedder import EmbeddingCache, SentenceTransformerEmbedder
 from app.rag.vector_store import FAISSVectorStore
-from app.rag.rag_service import RAGService, truncate_context
+from app.rag.rag_service import RAGService, estimate_tokens, truncate_context
 
 __all__ = [
     "DocumentExtractor",
@@ -11,5 +11,6 @@ __all__ = [
     "SentenceTransformerEmbedder",
     "FAISSVectorStore",
     "RAGService",
+    "estimate_tokens",
     "truncate_context",
 ]
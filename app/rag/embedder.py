@@ -3,57 +3,342 @@
 Embedding generation and caching.
 Uses sentence-transformers for embeddings with SQLite caching.
 """
+import os
 import sqlite3
 import hashlib
 import pickle
-from typing import List, Tuple, Optional
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Version tag of _generate_id, recorded in the meta table
+ID_SCHEME = "blake2b-64"
+
+# Supported vector blob formats: raw float32, or int8 with a per-vector float32 scale
+VECTOR_FORMATS = ("float32", "int8")
+
+
+def quantize_int8(vector: np.ndarray) -> Tuple[np.float32, np.ndarray]:
+    """Symmetrically quantize a vector to int8 with a per-vector scale.
+
+    Args:
+        vector: Embedding vector.
+
+    Returns:
+        (scale, codes) such that codes * scale approximates the vector.
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    scale = np.float32(np.abs(vector).max() / 127.0) or np.float32(1.0)
+    codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return scale, codes
+
+
+def hash_content(chunk_text: str) -> str:
+    """Hash a chunk's text, the key its vector is stored under.
+
+    Args:
+        chunk_text: Chunk text.
+
+    Returns:
+        Hex digest of the text.
+    """
+    return hashlib.blake2b(chunk_text.encode(), digest_size=16).hexdigest()
+
+
+def hash_chunks(chunks: List[str]) -> str:
+    """Hash an ordered list of chunks without concatenating them.
+
+    Args:
+        chunks: Text chunks.
+
+    Returns:
+        Hex digest identifying the chunk set.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for chunk in chunks:
+        h.update(chunk.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
 
 class EmbeddingCache:
     """Manages embedding storage and retrieval from SQLite."""
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, vector_format: str = "float32"):
         """Initialize embedding cache.
 
         Args:
             db_path: Path to SQLite database file.
+            vector_format: Blob format, "float32" or "int8" (4x smaller, near-lossless
+                for normalized embeddings). Existing rows are converted on open.
         """
+        if vector_format not in VECTOR_FORMATS:
+            raise ValueError(f"Unsupported vector format: {vector_format}")
         self.db_path = db_path
+        self.vector_format = vector_format
+        # Decoded float32 matrix memory-mapped at load (see get_all_vectors_matrix)
+        self.snapshot_path = (
+            None if db_path == ":memory:" else os.path.splitext(db_path)[0] + ".f32.npy"
+        )
+        self.embedding_dim: Optional[int] = None
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Position -> (doc_name, chunk_text, chunk_index), built by find_chunk_by_index
+        self._chunk_table: Optional[List[Tuple[str, str, int]]] = None
         self._init_db()
 
     def _init_db(self) -> None:
-        """Initialize SQLite database with embeddings table."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Open the long-lived connection and initialize the cache tables.
 
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS embeddings (
-                id TEXT PRIMARY KEY,
-                doc_name TEXT NOT NULL,
-                chunk_index INTEGER NOT NULL,
-                chunk_text TEXT NOT NULL,
-                vector BLOB NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        Vectors are content-addressed: ``embeddings`` holds one vector per distinct
+        chunk text, and ``doc_chunks`` maps each (doc_name, chunk_index) to it, so
+        boilerplate shared between documents is embedded and stored once.
+
+        The connection runs in autocommit mode with explicit transactions for writes;
+        sqlite3's per-connection statement cache keeps the fixed queries prepared.
+        """
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute("PRAGMA cache_size=-65536")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._finalizer = weakref.finalize(self, self._conn.close)
+
+        with self._transaction() as cursor:
+            # Cache-wide settings (vector format, embedding dimension)
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+                """
+            )
+
+            # Per-document chunk-set hash, so change detection is a single row lookup
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS doc_meta (
+                    doc_name TEXT PRIMARY KEY,
+                    chunk_hash TEXT NOT NULL,
+                    n_chunks INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+
+            cursor.execute("SELECT key, value FROM meta")
+            meta = dict(cursor.fetchall())
+            # Caches without a recorded format predate it and hold pickled arrays
+            stored_format = meta.get("vector_format", "pickle")
+
+            cursor.execute("PRAGMA table_info(embeddings)")
+            legacy_rows = None
+            if "doc_name" in {column[1] for column in cursor.fetchall()}:
+                # Older caches stored a vector on every (doc_name, chunk_index) row
+                cursor.execute(
+                    "SELECT doc_name, chunk_index, chunk_text, vector FROM embeddings "
+                    "ORDER BY ROWID ASC"
+                )
+                legacy_rows = cursor.fetchall()
+                cursor.execute("DROP TABLE embeddings")
+
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    content_hash TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL
+                )
+                """
+            )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS doc_chunks (
+                    id TEXT PRIMARY KEY,
+                    doc_name TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    chunk_text TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+
+            # Indexes for efficient lookups
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_doc_name ON doc_chunks(doc_name)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_content_hash ON doc_chunks(content_hash)"
             )
-            """
-        )
 
-        # Index for efficient lookups
+            if legacy_rows is not None:
+                self._migrate_legacy_rows(cursor, legacy_rows, stored_format)
+            elif stored_format != self.vector_format:
+                self._convert_vectors(cursor, stored_format)
+
+            if meta.get("doc_meta") != "1":
+                self._backfill_doc_meta(cursor)
+
+            cursor.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [
+                    ("vector_format", self.vector_format),
+                    ("id_scheme", ID_SCHEME),
+                    ("doc_meta", "1"),
+                ],
+            )
+            if "embedding_dim" in meta:
+                self.embedding_dim = int(meta["embedding_dim"])
+            else:
+                # Migrated or converted caches never went through _insert_embeddings
+                self._record_embedding_dim(cursor)
+
+        logger.info(f"Initialized embedding cache at {self.db_path}")
+
+    def _record_embedding_dim(self, cursor: sqlite3.Cursor) -> None:
+        """Derive embedding_dim from a stored vector and record it in meta.
+
+        Args:
+            cursor: Cursor inside an open transaction.
+        """
+        cursor.execute("SELECT vector FROM embeddings LIMIT 1")
+        row = cursor.fetchone()
+        if row is None:
+            return
+        self.embedding_dim = int(self._blob_to_vector(row[0]).shape[-1])
         cursor.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('embedding_dim', ?)",
+            (str(self.embedding_dim),),
+        )
+
+    def _matrix_dim(self) -> int:
+        """Return the column count for matrix reads (0 for an empty cache).
+
+        Returns:
+            embedding_dim, derived from a stored vector if it was never recorded.
+        """
+        if self.embedding_dim is None:
+            with self._transaction() as cursor:
+                self._record_embedding_dim(cursor)
+        return self.embedding_dim or 0
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        """Run a block of statements in one transaction on the shared connection.
+
+        Yields:
+            Cursor to execute statements with; committed on success, rolled back on error.
+        """
+        with self._lock:
+            self._chunk_table = None
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN")
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        """Run a read-only query on the shared connection.
+
+        Args:
+            sql: SQL statement.
+            params: Statement parameters.
+
+        Returns:
+            All result rows.
+        """
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._finalizer()
+
+    def _convert_vectors(self, cursor: sqlite3.Cursor, stored_format: str) -> None:
+        """Rewrite stored vectors from another blob format into self.vector_format.
+
+        Args:
+            cursor: Cursor inside the initialization transaction.
+            stored_format: Format the rows were written in.
+        """
+        cursor.execute("SELECT content_hash, vector FROM embeddings")
+        rows = cursor.fetchall()
+        if not rows:
+            return
+
+        cursor.executemany(
+            "UPDATE embeddings SET vector = ? WHERE content_hash = ?",
+            [
+                (self._vector_to_blob(self._decode_blob(blob, stored_format)), content_hash)
+                for content_hash, blob in rows
+            ],
+        )
+        self._bump_generation(cursor)
+        logger.info(f"Converted {len(rows)} vectors from {stored_format} to {self.vector_format}")
+
+    def _migrate_legacy_rows(
+        self, cursor: sqlite3.Cursor, rows: List[Tuple[str, int, str, bytes]], stored_format: str
+    ) -> None:
+        """Move rows from the old one-vector-per-chunk table into the current schema.
+
+        IDs are regenerated with the current scheme and vectors re-encoded into
+        self.vector_format; identical chunk texts collapse onto one stored vector.
+
+        Args:
+            cursor: Cursor inside the initialization transaction.
+            rows: (doc_name, chunk_index, chunk_text, vector) rows in original order.
+            stored_format: Format the vectors were written in.
+        """
+        if not rows:
+            return
+
+        vectors: Dict[str, bytes] = {}
+        chunk_rows = []
+        for doc_name, chunk_index, chunk_text, blob in rows:
+            content_hash = hash_content(chunk_text)
+            if content_hash not in vectors:
+                vectors[content_hash] = self._vector_to_blob(self._decode_blob(blob, stored_format))
+            embedding_id = self._generate_id(doc_name, chunk_index)
+            chunk_rows.append((embedding_id, doc_name, chunk_index, content_hash, chunk_text))
+
+        cursor.executemany(
+            "INSERT OR IGNORE INTO embeddings (content_hash, vector) VALUES (?, ?)", vectors.items()
+        )
+        cursor.executemany(
             """
-            CREATE INDEX IF NOT EXISTS idx_doc_name ON embeddings(doc_name)
-            """
+            INSERT OR IGNORE INTO doc_chunks (id, doc_name, chunk_index, content_hash, chunk_text)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            chunk_rows,
         )
+        self._bump_generation(cursor)
+        logger.info(f"Migrated {len(rows)} cached chunks ({len(vectors)} distinct vectors)")
 
-        conn.commit()
-        conn.close()
-        logger.info(f"Initialized embedding cache at {self.db_path}")
+    def _backfill_doc_meta(self, cursor: sqlite3.Cursor) -> None:
+        """Compute doc_meta rows for documents cached before the table existed.
+
+        Args:
+            cursor: Cursor inside the initialization transaction.
+        """
+        cursor.execute("SELECT doc_name, chunk_text FROM doc_chunks ORDER BY doc_name, chunk_index")
+        docs: Dict[str, List[str]] = {}
+        for doc_name, chunk_text in cursor.fetchall():
+            docs.setdefault(doc_name, []).append(chunk_text)
+
+        cursor.executemany(
+            "INSERT OR REPLACE INTO doc_meta (doc_name, chunk_hash, n_chunks) VALUES (?, ?, ?)",
+            [(doc_name, hash_chunks(chunks), len(chunks)) for doc_name, chunks in docs.items()],
+        )
 
     def _generate_id(self, doc_name: str, chunk_index: int) -> str:
         """Generate unique ID for embedding.
@@ -66,7 +351,7 @@ class EmbeddingCache:
             Unique ID string.
         """
         key = f"{doc_name}#{chunk_index}".encode()
-        return hashlib.md5(key).hexdigest()
+        return hashlib.blake2b(key, digest_size=8).hexdigest()
 
     def _vector_to_blob(self, vector: np.ndarray) -> bytes:
         """Convert numpy vector to blob for storage.
@@ -75,9 +360,13 @@ class EmbeddingCache:
             vector: Numpy array.
 
         Returns:
-            Serialized bytes.
+            Raw float32 bytes, or for int8 a float32 scale followed by the int8 codes
+            (dimension is recorded once in the meta table).
         """
-        return pickle.dumps(vector)
+        if self.vector_format == "int8":
+            scale, codes = quantize_int8(vector)
+            return scale.tobytes() + codes.tobytes()
+        return np.ascontiguousarray(vector, dtype=np.float32).tobytes()
 
     def _blob_to_vector(self, blob: bytes) -> np.ndarray:
         """Convert blob back to numpy vector.
@@ -86,19 +375,38 @@ class EmbeddingCache:
             blob: Serialized bytes.
 
         Returns:
-            Numpy array.
+            float32 numpy array (a read-only view of the blob for float32 storage).
+        """
+        return self._decode_blob(blob, self.vector_format)
+
+    @staticmethod
+    def _decode_blob(blob: bytes, vector_format: str) -> np.ndarray:
+        """Decode a vector blob written in the given format.
+
+        Args:
+            blob: Serialized bytes.
+            vector_format: "float32", "int8", or "pickle" (legacy caches).
+
+        Returns:
+            float32 numpy array.
         """
-        return pickle.loads(blob)
+        if vector_format == "float32":
+            return np.frombuffer(blob, dtype=np.float32)
+        if vector_format == "int8":
+            scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+            return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * scale
+        return np.asarray(pickle.loads(blob), dtype=np.float32)
 
     def add_embeddings(
-        self, doc_name: str, chunks: List[str], vectors: List[np.ndarray]
+        self, doc_name: str, chunks: List[str], vectors: Sequence[Optional[np.ndarray]]
     ) -> int:
         """Add embeddings for chunks to cache.
 
         Args:
             doc_name: Document name.
             chunks: List of text chunks.
-            vectors: List of embedding vectors.
+            vectors: Embedding vectors, one per chunk; None for a chunk whose text is
+                already cached (see known_content_hashes).
 
         Returns:
             Number of embeddings added.
@@ -106,49 +414,308 @@ class EmbeddingCache:
         if len(chunks) != len(vectors):
             raise ValueError(f"Chunks and vectors length mismatch: {len(chunks)} vs {len(vectors)}")
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._transaction() as cursor:
+            added_count = self._insert_embeddings(cursor, doc_name, chunks, vectors)
+
+        logger.info(f"Added {added_count} embeddings for {doc_name}")
+        return added_count
+
+    def replace_documents(
+        self, documents: List[Tuple[str, List[str], Sequence[Optional[np.ndarray]]]]
+    ) -> int:
+        """Replace the cached chunks of several documents in a single transaction.
+
+        Args:
+            documents: List of (doc_name, chunks, vectors) tuples; as in add_embeddings,
+                a vector may be None when its chunk text is already cached.
+
+        Returns:
+            Number of embeddings written.
+        """
+        for doc_name, chunks, vectors in documents:
+            if len(chunks) != len(vectors):
+                raise ValueError(
+                    f"Chunks and vectors length mismatch for {doc_name}: "
+                    f"{len(chunks)} vs {len(vectors)}"
+                )
 
         added_count = 0
-        for chunk_idx, (chunk_text, vector) in enumerate(zip(chunks, vectors)):
-            embedding_id = self._generate_id(doc_name, chunk_idx)
+        with self._transaction() as cursor:
+            for doc_name, chunks, vectors in documents:
+                cursor.execute("DELETE FROM doc_chunks WHERE doc_name = ?", (doc_name,))
+                cursor.execute("DELETE FROM doc_meta WHERE doc_name = ?", (doc_name,))
+                added_count += self._insert_embeddings(cursor, doc_name, chunks, vectors)
+            self._delete_orphan_vectors(cursor)
+
+        logger.info(f"Stored {added_count} embeddings for {len(documents)} documents")
+        return added_count
 
-            # Check if already exists
-            cursor.execute("SELECT id FROM embeddings WHERE id = ?", (embedding_id,))
-            if cursor.fetchone():
-                logger.debug(f"Embedding {embedding_id} already exists, skipping")
-                continue
+    def known_content_hashes(self, content_hashes: Iterable[str]) -> Set[str]:
+        """Find which chunk texts already have a stored vector.
 
-            vector_blob = self._vector_to_blob(vector)
+        Args:
+            content_hashes: Hashes from hash_content().
+
+        Returns:
+            Subset of content_hashes present in the cache.
+        """
+        content_hashes = list(content_hashes)
+        known: Set[str] = set()
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(content_hashes), 500):
+            batch = content_hashes[start : start + 500]
+            rows = self._query(
+                "SELECT content_hash FROM embeddings WHERE content_hash IN "
+                f"({','.join('?' * len(batch))})",
+                tuple(batch),
+            )
+            known.update(row[0] for row in rows)
+        return known
+
+    def _insert_embeddings(
+        self,
+        cursor: sqlite3.Cursor,
+        doc_name: str,
+        chunks: List[str],
+        vectors: Sequence[Optional[np.ndarray]],
+    ) -> int:
+        """Insert a document's chunks and record its hash, inside a transaction.
+
+        Args:
+            cursor: Cursor inside an open transaction.
+            doc_name: Document name.
+            chunks: List of text chunks.
+            vectors: Embedding vectors, one per chunk (None if already stored).
+
+        Returns:
+            Number of embeddings added.
+        """
+        content_hashes = [hash_content(chunk_text) for chunk_text in chunks]
+        chunk_rows = [
+            (self._generate_id(doc_name, chunk_idx), doc_name, chunk_idx, content_hash, chunk_text)
+            for chunk_idx, (chunk_text, content_hash) in enumerate(zip(chunks, content_hashes))
+        ]
+        vector_rows = [
+            (content_hash, self._vector_to_blob(vector))
+            for content_hash, vector in zip(content_hashes, vectors)
+            if vector is not None
+        ]
+
+        if vector_rows and self.embedding_dim is None:
+            first = next(vector for vector in vectors if vector is not None)
+            self.embedding_dim = int(np.asarray(first).shape[-1])
             cursor.execute(
-                """
-                INSERT INTO embeddings (id, doc_name, chunk_index, chunk_text, vector)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (embedding_id, doc_name, chunk_idx, chunk_text, vector_blob),
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('embedding_dim', ?)",
+                (str(self.embedding_dim),),
             )
-            added_count += 1
 
-        conn.commit()
-        conn.close()
+        # Identical chunk texts share one vector row
+        cursor.executemany(
+            "INSERT OR IGNORE INTO embeddings (content_hash, vector) VALUES (?, ?)", vector_rows
+        )
 
-        logger.info(f"Added {added_count} embeddings for {doc_name}")
+        # Existing (doc_name, chunk_index) IDs are skipped by the primary key
+        changes_before = self._conn.total_changes
+        cursor.executemany(
+            """
+            INSERT OR IGNORE INTO doc_chunks (id, doc_name, chunk_index, content_hash, chunk_text)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            chunk_rows,
+        )
+        added_count = self._conn.total_changes - changes_before
+        self._bump_generation(cursor)
+
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO doc_meta (doc_name, chunk_hash, n_chunks, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            """,
+            (doc_name, hash_chunks(chunks), len(chunks)),
+        )
         return added_count
 
+    def _bump_generation(self, cursor: sqlite3.Cursor) -> None:
+        """Mark stored vectors as changed, invalidating the matrix snapshot.
+
+        Args:
+            cursor: Cursor inside an open transaction.
+        """
+        cursor.execute(
+            """
+            INSERT INTO meta (key, value) VALUES ('generation', '1')
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+            """
+        )
+
+    def _delete_orphan_vectors(self, cursor: sqlite3.Cursor) -> None:
+        """Drop vectors no longer referenced by any document chunk.
+
+        Args:
+            cursor: Cursor inside an open transaction.
+        """
+        cursor.execute(
+            "DELETE FROM embeddings WHERE content_hash NOT IN (SELECT content_hash FROM doc_chunks)"
+        )
+
     def get_all_vectors(self) -> List[Tuple[str, np.ndarray]]:
         """Get all embeddings and their IDs.
 
         Returns:
             List of (id, vector) tuples in order.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        results = self._query(
+            """
+            SELECT c.id, e.vector FROM doc_chunks c
+            JOIN embeddings e ON e.content_hash = c.content_hash
+            ORDER BY c.ROWID ASC
+            """
+        )
+        return [(row[0], self._blob_to_vector(row[1])) for row in results]
+
+    def get_all_vectors_matrix(self) -> Tuple[List[str], np.ndarray]:
+        """Get all embeddings as one float32 matrix.
+
+        The decoded matrix is kept in a .npy snapshot next to the database; while no
+        write has happened since it was taken, loading is a single read-only mmap.
+        Otherwise blobs are copied straight into a preallocated matrix and the
+        snapshot is refreshed.
+
+        Returns:
+            (ids, matrix) where matrix has shape (N, embedding_dim), in ROWID order.
+        """
+        dim = self._matrix_dim()
+        with self._lock:
+            # One read transaction so ids, vectors and generation agree
+            self._conn.execute("BEGIN")
+            try:
+                meta = dict(
+                    self._conn.execute(
+                        "SELECT key, value FROM meta WHERE key IN "
+                        "('generation', 'snapshot_generation')"
+                    ).fetchall()
+                )
+                generation = meta.get("generation", "0")
+                ids = [
+                    row[0]
+                    for row in self._conn.execute("SELECT id FROM doc_chunks ORDER BY ROWID ASC")
+                ]
+
+                if meta.get("snapshot_generation") == generation:
+                    matrix = self._load_snapshot((len(ids), dim))
+                    if matrix is not None:
+                        return ids, matrix
+
+                matrix = np.empty((len(ids), dim), dtype=np.float32)
+                cursor = self._conn.execute(
+                    """
+                    SELECT e.vector FROM doc_chunks c
+                    JOIN embeddings e ON e.content_hash = c.content_hash
+                    ORDER BY c.ROWID ASC
+                    """
+                )
+                self._fill_matrix(cursor, matrix)
+            finally:
+                self._conn.execute("COMMIT")
+
+            if self._save_snapshot(matrix):
+                # Recorded after the read, so a concurrent write leaves it stale
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('snapshot_generation', ?)",
+                    (generation,),
+                )
+
+        return ids, matrix
+
+    def _load_snapshot(self, shape: Tuple[int, int]) -> Optional[np.ndarray]:
+        """Memory-map the matrix snapshot if it exists and has the expected shape.
 
-        cursor.execute("SELECT id, vector FROM embeddings ORDER BY ROWID ASC")
-        results = cursor.fetchall()
-        conn.close()
+        Args:
+            shape: Expected (N, embedding_dim).
 
-        return [(row[0], self._blob_to_vector(row[1])) for row in results]
+        Returns:
+            Read-only memory-mapped matrix, or None if unusable.
+        """
+        if self.snapshot_path is None or shape[0] == 0:
+            return None
+        try:
+            matrix = np.load(self.snapshot_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.debug(f"Vector snapshot unavailable: {e}")
+            return None
+        if matrix.shape != shape or matrix.dtype != np.float32:
+            return None
+        logger.debug(f"Memory-mapped {shape[0]} vectors from {self.snapshot_path}")
+        return matrix
+
+    def _save_snapshot(self, matrix: np.ndarray) -> bool:
+        """Write the matrix snapshot atomically.
+
+        Args:
+            matrix: Decoded (N, embedding_dim) float32 matrix.
+
+        Returns:
+            True if the snapshot was written.
+        """
+        if self.snapshot_path is None or len(matrix) == 0:
+            return False
+        tmp_path = self.snapshot_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as fh:
+                np.save(fh, matrix)
+            os.replace(tmp_path, self.snapshot_path)
+            return True
+        except OSError as e:
+            logger.warning(f"Could not write vector snapshot {self.snapshot_path}: {e}")
+            return False
+
+    def get_vectors_by_doc(self, doc_name: str) -> np.ndarray:
+        """Get a document's embeddings as one float32 matrix.
+
+        Args:
+            doc_name: Document name.
+
+        Returns:
+            (n_chunks, embedding_dim) matrix in chunk_index order.
+        """
+        dim = self._matrix_dim()
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM doc_chunks WHERE doc_name = ?", (doc_name,)
+            ).fetchone()
+            matrix = np.empty((count, dim), dtype=np.float32)
+
+            cursor = self._conn.execute(
+                """
+                SELECT e.vector FROM doc_chunks c
+                JOIN embeddings e ON e.content_hash = c.content_hash
+                WHERE c.doc_name = ? ORDER BY c.chunk_index
+                """,
+                (doc_name,),
+            )
+            row_count = self._fill_matrix(cursor, matrix)
+
+        return matrix[:row_count]
+
+    def _fill_matrix(self, cursor: sqlite3.Cursor, matrix: np.ndarray) -> int:
+        """Decode vector blobs from a query straight into preallocated matrix rows.
+
+        Args:
+            cursor: Cursor over single-column (vector,) rows.
+            matrix: Destination matrix with at least as many rows as the query returns.
+
+        Returns:
+            Number of rows filled.
+        """
+        row_count = 0
+        while True:
+            rows = cursor.fetchmany(1024)
+            if not rows:
+                break
+            for (blob,) in rows:
+                matrix[row_count] = self._blob_to_vector(blob)
+                row_count += 1
+        return row_count
 
     def get_all_metadata(self) -> List[Tuple[str, str, int, str]]:
         """Get all embedding metadata.
@@ -156,38 +723,34 @@ class EmbeddingCache:
         Returns:
             List of (id, doc_name, chunk_index, chunk_text) tuples.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "SELECT id, doc_name, chunk_index, chunk_text FROM embeddings ORDER BY ROWID ASC"
+        return self._query(
+            "SELECT id, doc_name, chunk_index, chunk_text FROM doc_chunks ORDER BY ROWID ASC"
         )
-        results = cursor.fetchall()
-        conn.close()
-
-        return results
 
     def find_chunk_by_index(self, global_index: int) -> Optional[Tuple[str, str, int]]:
         """Find chunk metadata by global index.
 
+        Served from an in-memory table loaded on first use and dropped on writes,
+        so repeated lookups never touch SQLite.
+
         Args:
-            global_index: Global index (based on database row order).
+            global_index: Global index (position in database row order, matching the
+                vector store rebuilt from get_all_vectors_matrix).
 
         Returns:
             (doc_name, chunk_text, chunk_index) or None.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # SQLite ROWID starts from 1
-        cursor.execute(
-            "SELECT doc_name, chunk_text, chunk_index FROM embeddings WHERE ROWID = ?",
-            (global_index + 1,),
-        )
-        result = cursor.fetchone()
-        conn.close()
-
-        return result
+        with self._lock:
+            if self._chunk_table is None:
+                self._chunk_table = [
+                    (doc_name, chunk_text, chunk_index)
+                    for _, doc_name, chunk_index, chunk_text in self.get_all_metadata()
+                ]
+            table = self._chunk_table
+
+        if 0 <= global_index < len(table):
+            return table[global_index]
+        return None
 
     def get_doc_hash(self, doc_name: str) -> Optional[str]:
         """Get hash of all chunks for a document.
@@ -196,20 +759,10 @@ class EmbeddingCache:
             doc_name: Document name.
 
         Returns:
-            Hash of combined chunk text or None if not found.
+            Hash of the document's chunks (see hash_chunks) or None if not found.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT chunk_text FROM embeddings WHERE doc_name = ? ORDER BY chunk_index", (doc_name,))
-        chunks = [row[0] for row in cursor.fetchall()]
-        conn.close()
-
-        if not chunks:
-            return None
-
-        combined = "".join(chunks).encode()
-        return hashlib.md5(combined).hexdigest()
+        rows = self._query("SELECT chunk_hash FROM doc_meta WHERE doc_name = ?", (doc_name,))
+        return rows[0][0] if rows else None
 
     def delete_doc(self, doc_name: str) -> int:
         """Delete all embeddings for a document.
@@ -220,44 +773,112 @@ class EmbeddingCache:
         Returns:
             Number of deleted records.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("DELETE FROM embeddings WHERE doc_name = ?", (doc_name,))
-        deleted_count = cursor.rowcount
-
-        conn.commit()
-        conn.close()
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM doc_chunks WHERE doc_name = ?", (doc_name,))
+            deleted_count = cursor.rowcount
+            cursor.execute("DELETE FROM doc_meta WHERE doc_name = ?", (doc_name,))
+            self._delete_orphan_vectors(cursor)
+            self._bump_generation(cursor)
 
         logger.info(f"Deleted {deleted_count} embeddings for {doc_name}")
         return deleted_count
 
     def clear_all(self) -> None:
         """Clear all embeddings from cache."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM embeddings")
-        conn.commit()
-        conn.close()
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM doc_chunks")
+            cursor.execute("DELETE FROM embeddings")
+            cursor.execute("DELETE FROM doc_meta")
+            self._bump_generation(cursor)
         logger.info("Cleared all embeddings from cache")
 
 
 class SentenceTransformerEmbedder:
     """Generates embeddings using sentence-transformers."""
 
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", cache: Optional[EmbeddingCache] = None):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        cache: Optional[EmbeddingCache] = None,
+        backend: str = "torch",
+        onnx_file_name: Optional[str] = None,
+        query_cache_size: int = 1024,
+        device: Optional[str] = None,
+    ):
         """Initialize embedder.
 
         Args:
             model_name: HuggingFace model name.
             cache: Optional EmbeddingCache instance for persistent storage.
+            backend: "torch", or "onnx" for ONNX Runtime inference (needs
+                sentence-transformers>=3.2 with optimum[onnxruntime]).
+            onnx_file_name: ONNX file within the model repo, e.g. a quantized
+                "onnx/model_qint8_avx512_vnni.onnx" (default: the FP32 export).
+            query_cache_size: Maximum query embeddings kept by embed_query (0 disables).
+            device: Torch device ("cpu", "cuda", "mps"); autodetected if None. The
+                model runs in FP16 on accelerators.
         """
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
+        self.device = device or self._detect_device()
+        self.model = self._load_model(model_name, backend, onnx_file_name)
         self.cache = cache
-        logger.info(f"Loaded embedding model: {model_name}")
+        self.query_cache_size = query_cache_size
+        # query -> read-only normalized vector; order tracks recency
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        logger.info(
+            f"Loaded embedding model: {model_name} ({self.backend} backend on {self.device})"
+        )
+
+    @staticmethod
+    def _detect_device() -> str:
+        """Pick the fastest available torch device.
 
-    def embed_texts(self, texts: List[str], batch_size: int = 32) -> List[np.ndarray]:
+        Returns:
+            "cuda", "mps", or "cpu".
+        """
+        try:
+            import torch
+
+            if torch.cuda.is_available():
+                return "cuda"
+            if torch.backends.mps.is_available():
+                return "mps"
+        except (ImportError, AttributeError):
+            pass
+        return "cpu"
+
+    def _load_model(
+        self, model_name: str, backend: str, onnx_file_name: Optional[str]
+    ) -> SentenceTransformer:
+        """Load the model, falling back to torch if the ONNX backend is unavailable.
+
+        Args:
+            model_name: HuggingFace model name.
+            backend: Requested backend.
+            onnx_file_name: Optional ONNX file within the model repo.
+
+        Returns:
+            Loaded SentenceTransformer (self.backend records the backend in use).
+        """
+        if backend == "onnx":
+            model_kwargs = {"file_name": onnx_file_name} if onnx_file_name else None
+            try:
+                model = SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+                self.backend = "onnx"
+                self.device = "cpu"
+                return model
+            except Exception as e:
+                logger.warning(f"ONNX backend unavailable for {model_name}, using torch: {e}")
+
+        self.backend = "torch"
+        model = SentenceTransformer(model_name, device=self.device)
+        if self.device != "cpu":
+            # Half precision on accelerators; outputs are cast back to float32
+            model = model.half()
+        return model
+
+    def embed_texts(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
         """Generate embeddings for texts.
 
         Args:
@@ -265,15 +886,120 @@ class SentenceTransformerEmbedder:
             batch_size: Batch size for processing.
 
         Returns:
-            List of embedding vectors (normalized for cosine similarity).
+            (len(texts), D) float32 matrix of embeddings, one row per text
+                (normalized for cosine similarity).
+        """
+        # Normalized inside encode, on the model's output tensor before conversion
+        embeddings = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return embeddings.astype(np.float32, copy=False)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a single query, reusing the vector for recently seen queries.
+
+        Args:
+            query: Query text.
+
+        Returns:
+            Normalized, read-only embedding vector.
         """
-        embeddings = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        return self.embed_queries([query])[0]
 
-        # Normalize for cosine similarity
-        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-        normalized_embeddings = embeddings / (norms + 1e-9)
+    def embed_queries(self, queries: List[str], batch_size: int = 64) -> np.ndarray:
+        """Embed several queries, encoding only those not in the LRU in one batch.
 
-        return [vec for vec in normalized_embeddings]
+        Args:
+            queries: Query texts.
+            batch_size: Batch size for the uncached queries.
+
+        Returns:
+            (len(queries), D) matrix of normalized embeddings.
+        """
+        vectors: List[Optional[np.ndarray]] = [None] * len(queries)
+        with self._query_cache_lock:
+            for i, query in enumerate(queries):
+                vector = self._query_cache.get(query)
+                if vector is not None:
+                    self._query_cache.move_to_end(query)
+                    vectors[i] = vector
+
+        missing = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+        if missing:
+            fresh = dict(zip(missing, self.embed_texts(missing, batch_size)))
+            for i, query in enumerate(queries):
+                if vectors[i] is None:
+                    vectors[i] = fresh[query]
+
+            if self.query_cache_size > 0:
+                with self._query_cache_lock:
+                    for query, vector in fresh.items():
+                        vector.flags.writeable = False
+                        self._query_cache[query] = vector
+                        self._query_cache.move_to_end(query)
+                    while len(self._query_cache) > self.query_cache_size:
+                        self._query_cache.popitem(last=False)
+
+        if len(vectors) == 1:
+            # Single query: hand back the cached vector itself (a read-only row view)
+            return vectors[0][None, :]
+        return np.vstack(vectors)
+
+    def embed_and_cache_documents(
+        self, documents: Dict[str, List[str]], batch_size: int = 256
+    ) -> int:
+        """Embed every new or changed document in one encode call and cache the results.
+
+        Args:
+            documents: Mapping of doc_name to its ordered chunks.
+            batch_size: Batch size for processing.
+
+        Returns:
+            Number of documents that were (re-)embedded.
+        """
+        if not self.cache:
+            raise ValueError("embed_and_cache_documents requires an EmbeddingCache")
+
+        stale = [
+            (doc_name, chunks)
+            for doc_name, chunks in documents.items()
+            if chunks and self.cache.get_doc_hash(doc_name) != hash_chunks(chunks)
+        ]
+        if not stale:
+            logger.debug(f"All {len(documents)} documents already cached")
+            return 0
+
+        # Only chunk texts without a stored vector go through the model
+        all_hashes = [hash_content(chunk) for _, chunks in stale for chunk in chunks]
+        known = self.cache.known_content_hashes(set(all_hashes))
+        pending: Dict[str, str] = {}
+        for content_hash, chunk in zip(
+            all_hashes, (chunk for _, chunks in stale for chunk in chunks)
+        ):
+            if content_hash not in known:
+                pending.setdefault(content_hash, chunk)
+
+        new_vectors: Dict[str, np.ndarray] = {}
+        if pending:
+            embeddings = self.embed_texts(list(pending.values()), batch_size)
+            new_vectors = dict(zip(pending, embeddings))
+
+        entries = []
+        offset = 0
+        for doc_name, chunks in stale:
+            hashes = all_hashes[offset : offset + len(chunks)]
+            entries.append((doc_name, chunks, [new_vectors.get(h) for h in hashes]))
+            offset += len(chunks)
+        self.cache.replace_documents(entries)
+
+        logger.info(
+            f"Embedded {len(pending)} of {len(all_hashes)} chunks from {len(stale)} documents"
+        )
+        return len(stale)
 
     def embed_and_cache(
         self, doc_name: str, chunks: List[str], batch_size: int = 32
@@ -291,29 +1017,24 @@ class SentenceTransformerEmbedder:
         """
         if not self.cache:
             # No cache, just embed
-            return self.embed_texts(chunks, batch_size), True
+            return list(self.embed_texts(chunks, batch_size)), True
 
         # Check if document already cached
         doc_hash = self.cache.get_doc_hash(doc_name)
-        combined_hash = hashlib.md5("".join(chunks).encode()).hexdigest()
+        combined_hash = hash_chunks(chunks)
 
         if doc_hash == combined_hash:
             logger.debug(f"Using cached embeddings for {doc_name}")
-            # Load from cache - need to fetch by doc_name
-            conn = sqlite3.connect(self.cache.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT vector FROM embeddings WHERE doc_name = ? ORDER BY chunk_index",
-                (doc_name,),
-            )
-            vectors = [self.cache._blob_to_vector(row[0]) for row in cursor.fetchall()]
-            conn.close()
-            return vectors, False
+            return list(self.cache.get_vectors_by_doc(doc_name)), False
 
         # Generate embeddings
         embeddings = self.embed_texts(chunks, batch_size)
 
+        # Drop stale chunks of a changed document; inserts never overwrite existing IDs
+        if doc_hash is not None:
+            self.cache.delete_doc(doc_name)
+
         # Cache them
         self.cache.add_embeddings(doc_name, chunks, embeddings)
 
-        return embeddings, True
+        return list(embeddings), True
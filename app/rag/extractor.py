@@ -4,12 +4,40 @@ Document extraction and chunking.
 Loads documents from files and performs semantic chunking with overlap.
 """
 import re
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
 
+_PARAGRAPH_RE = re.compile(r"\n\n+")
+
+# Loaded file types, in load order (all .md files, then all .txt files)
+DOCUMENT_SUFFIXES = (".md", ".txt")
+
+# Concurrent file reads in load_documents (I/O bound, so threads overlap well)
+LOAD_WORKERS = 8
+
+
+def _read_document(file_path: Path) -> Optional[Tuple[str, str]]:
+    """Read one document, logging (not raising) on failure.
+
+    Args:
+        file_path: File to read.
+
+    Returns:
+        (filename, content) or None if the file could not be read.
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        logger.info(f"Loaded document: {file_path.name}")
+        return file_path.name, content
+    except Exception as e:
+        logger.error(f"Error loading {file_path.name}: {e}")
+        return None
+
 
 class DocumentExtractor:
     """Extracts and chunks documents from files."""
@@ -34,22 +62,21 @@ class DocumentExtractor:
             List of (filename, content) tuples.
         """
         data_path = Path(data_dir)
-        documents = []
 
         if not data_path.exists():
             logger.warning(f"Data directory {data_dir} does not exist")
-            return documents
+            return []
 
-        for file_path in sorted(data_path.glob("*.md")) + sorted(data_path.glob("*.txt")):
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                documents.append((file_path.name, content))
-                logger.info(f"Loaded document: {file_path.name}")
-            except Exception as e:
-                logger.error(f"Error loading {file_path.name}: {e}")
+        # One directory scan; sorted by type, then name
+        files = sorted(
+            (p for p in data_path.iterdir() if p.suffix in DOCUMENT_SUFFIXES),
+            key=lambda p: (DOCUMENT_SUFFIXES.index(p.suffix), p),
+        )
+        if not files:
+            return []
 
-        return documents
+        with ThreadPoolExecutor(max_workers=min(LOAD_WORKERS, len(files))) as executor:
+            return [doc for doc in executor.map(_read_document, files) if doc is not None]
 
     def chunk_text(
         self, text: str, chunk_size_tokens: int = None, overlap_tokens: int = None
@@ -75,10 +102,23 @@ class DocumentExtractor:
         overlap_chars = overlap_tokens * 4
 
         # Split on double newlines (paragraphs) first
-        paragraphs = re.split(r"\n\n+", text.strip())
+        paragraphs = _PARAGRAPH_RE.split(text.strip())
+
+        chunks: List[str] = []
+        prev_chunk = None
+
+        def emit(chunk: str) -> None:
+            # Overlap (deterministic): prefix the tail of the previous chunk
+            nonlocal prev_chunk
+            if prev_chunk is not None and overlap_chars > 0:
+                chunks.append(prev_chunk[-overlap_chars:] + "\n\n" + chunk)
+            else:
+                chunks.append(chunk)
+            prev_chunk = chunk
 
-        chunks = []
-        current_chunk = ""
+        # Paragraphs of the chunk being built; joined once when it is emitted
+        parts: List[str] = []
+        current_len = 0
 
         for para in paragraphs:
             para = para.strip()
@@ -86,32 +126,29 @@ class DocumentExtractor:
                 continue
 
             # If current chunk + para fits, add it
-            if len(current_chunk) + len(para) + 1 <= chunk_size_chars:
-                if current_chunk:
-                    current_chunk += "\n\n" + para
-                else:
-                    current_chunk = para
+            if current_len + len(para) + 1 <= chunk_size_chars:
+                current_len += len(para) + (2 if parts else 0)
+                parts.append(para)
+                continue
+
+            # Save current chunk if not empty
+            if parts:
+                emit("\n\n".join(parts))
+                parts = []
+                current_len = 0
+
+            # If para is longer than chunk_size, split it further
+            if len(para) > chunk_size_chars:
+                # Character-based chunking for long paragraphs
+                for sub_chunk in self._chunk_long_text(para, chunk_size_chars, overlap_chars):
+                    emit(sub_chunk)
             else:
-                # Save current chunk if not empty
-                if current_chunk:
-                    chunks.append(current_chunk)
-
-                # If para is longer than chunk_size, split it further
-                if len(para) > chunk_size_chars:
-                    # Character-based chunking for long paragraphs
-                    sub_chunks = self._chunk_long_text(para, chunk_size_chars, overlap_chars)
-                    chunks.extend(sub_chunks)
-                else:
-                    current_chunk = para
+                parts.append(para)
+                current_len = len(para)
 
         # Add remaining chunk
-        if current_chunk:
-            chunks.append(current_chunk)
-
-        # Add overlap between chunks (deterministic)
-        if len(chunks) > 1:
-            overlapped_chunks = self._add_overlap(chunks, overlap_chars)
-            return overlapped_chunks
+        if parts:
+            emit("\n\n".join(parts))
 
         return chunks
 
@@ -126,44 +163,30 @@ class DocumentExtractor:
         Returns:
             List of overlapped chunks.
         """
-        chunks = []
-        start = 0
-
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
-            chunks.append(chunk)
-
-            # Move start forward by (chunk_size - overlap)
-            start += chunk_size - overlap
+        # Move start forward by (chunk_size - overlap); a full step if overlap is too large
+        step = chunk_size - overlap if chunk_size > overlap else chunk_size
+        return [text[start : start + chunk_size] for start in range(0, len(text), step)]
 
-        return chunks
-
-    def _add_overlap(self, chunks: List[str], overlap_chars: int) -> List[str]:
-        """Add overlap between chunks deterministically.
+    def extract_and_chunk_by_document(self, data_dir: str = "data") -> Dict[str, List[str]]:
+        """Load documents and chunk them, keeping chunks grouped per document.
 
         Args:
-            chunks: List of chunks.
-            overlap_chars: Number of characters to overlap.
+            data_dir: Directory containing documents.
 
         Returns:
-            List of chunks with overlap appended.
+            Mapping of doc_name to its chunks in chunk_index order.
         """
-        if len(chunks) <= 1:
-            return chunks
+        grouped: Dict[str, List[str]] = {}
+        total = 0
 
-        result = [chunks[0]]
-
-        for i in range(1, len(chunks)):
-            prev_chunk = chunks[i - 1]
-            curr_chunk = chunks[i]
-
-            # Add tail of previous chunk to current chunk
-            overlap_tail = prev_chunk[-overlap_chars:] if len(prev_chunk) >= overlap_chars else prev_chunk
-            overlapped = overlap_tail + "\n\n" + curr_chunk
-            result.append(overlapped)
+        for doc_name, content in self.load_documents(data_dir):
+            chunks = self.chunk_text(content)
+            grouped[doc_name] = chunks
+            total += len(chunks)
+            logger.debug(f"Chunked {doc_name}: {len(chunks)} chunks")
 
-        return result
+        logger.info(f"Total chunks created: {total}")
+        return grouped
 
     def extract_and_chunk_documents(
         self, data_dir: str = "data"
@@ -176,14 +199,8 @@ class DocumentExtractor:
         Returns:
             List of (doc_name, chunk_index, chunk_text) tuples.
         """
-        documents = self.load_documents(data_dir)
-        chunked = []
-
-        for doc_name, content in documents:
-            chunks = self.chunk_text(content)
-            for chunk_idx, chunk in enumerate(chunks):
-                chunked.append((doc_name, chunk_idx, chunk))
-                logger.debug(f"Chunked {doc_name}: chunk {chunk_idx} ({len(chunk)} chars)")
-
-        logger.info(f"Total chunks created: {len(chunked)}")
-        return chunked
+        return [
+            (doc_name, chunk_idx, chunk)
+            for doc_name, chunks in self.extract_and_chunk_by_document(data_dir).items()
+            for chunk_idx, chunk in enumerate(chunks)
+        ]
@@ -3,17 +3,33 @@
 RAG (Retrieval-Augmented Generation) service.
 Orchestrates document retrieval and prompt building for LLM generation.
 """
+from concurrent.futures import Executor
 from typing import List, Tuple, Dict, Optional
+import asyncio
 import numpy as np
 import logging
 
 from app.rag.extractor import DocumentExtractor
 from app.rag.embedder import SentenceTransformerEmbedder, EmbeddingCache
 from app.rag.vector_store import FAISSVectorStore
+from app.rag.vector_store_fallback import NumpyVectorStore
+from app.utils.batcher import MicroBatcher
 
 logger = logging.getLogger(__name__)
 
 
+def estimate_tokens(text: str) -> int:
+    """Estimate token count using the same 1 token ≈ 4 characters heuristic.
+
+    Args:
+        text: Text to measure.
+
+    Returns:
+        Approximate token count.
+    """
+    return (len(text) + 3) // 4
+
+
 def truncate_context(context_text: str, max_tokens: int = 3000) -> str:
     """Truncate context to fit token limit.
 
@@ -30,8 +46,11 @@ def truncate_context(context_text: str, max_tokens: int = 3000) -> str:
     if len(context_text) <= max_chars:
         return context_text
 
-    # Truncate and add ellipsis
-    truncated = context_text[:max_chars].rsplit(" ", 1)[0] + "..."
+    # Truncate at the last word boundary and add ellipsis (single slice, no split copies)
+    cut = context_text.rfind(" ", 0, max_chars)
+    if cut == -1:
+        cut = max_chars
+    truncated = context_text[:cut] + "..."
     logger.debug(f"Truncated context from {len(context_text)} to {len(truncated)} characters")
     return truncated
 
@@ -39,6 +58,24 @@ def truncate_context(context_text: str, max_tokens: int = 3000) -> str:
 class RAGService:
     """Retrieval-Augmented Generation service."""
 
+    # Static prompt segments, joined around the per-request parts in one pass
+    _PROMPT_INSTRUCTIONS = (
+        "You are a helpful assistant. Use ONLY the provided context to answer the user's question."
+    )
+    _PROMPT_RULES = """
+If the answer is not found in the context, say "I don't know" and show the retrieved sources.
+Always cite your sources.
+
+## Context:
+
+"""
+    _PROMPT_HEAD = _PROMPT_INSTRUCTIONS + " " + _PROMPT_RULES  # keeps build_prompt byte-identical
+    _SYSTEM_HEAD = _PROMPT_INSTRUCTIONS + _PROMPT_RULES
+    _PROMPT_SOURCES = "\n\n## Sources:\n\n"
+    _PROMPT_QUESTION = "\n\n## Question:\n\n"
+    _PROMPT_ANSWER = "\n\n## Answer:\n\n"
+    _CONTEXT_SEPARATOR = "\n\n---\n\n"
+
     def __init__(
         self,
         embedding_model: str = "all-MiniLM-L6-v2",
@@ -48,6 +85,17 @@ class RAGService:
         chunk_overlap_tokens: int = 100,
         top_k: int = 3,
         max_context_tokens: int = 3000,
+        embedding_backend: str = "torch",
+        embedding_onnx_file: Optional[str] = None,
+        vector_quantization: str = "none",
+        vector_store_backend: str = "faiss",
+        vector_index_type: str = "flat",
+        vector_search_threads: Optional[int] = None,
+        query_cache_size: int = 1024,
+        embedding_device: Optional[str] = None,
+        executor: Optional[Executor] = None,
+        batch_size: int = 16,
+        batch_wait_ms: float = 10.0,
     ):
         """Initialize RAG service.
 
@@ -59,21 +107,62 @@ class RAGService:
             chunk_overlap_tokens: Chunk overlap in tokens.
             top_k: Number of results to retrieve.
             max_context_tokens: Maximum context tokens for LLM.
+            embedding_backend: Embedding inference backend ("torch" or "onnx").
+            embedding_onnx_file: ONNX model file to load with the onnx backend.
+            vector_quantization: "none", "fp16" half-precision index, "int8" scalar
+                quantization of the stored embeddings and the FAISS index, or "pq" product
+                quantization of the index.
+            vector_store_backend: "faiss", or "numpy" for the dependency-free flat store
+                (fp16/int8 storage with those quantizations; fine for small corpora).
+            vector_index_type: FAISS index structure: "flat", "hnsw" or "ivf".
+            vector_search_threads: Shards a large flat index is scanned with in parallel
+                (CPU count if None).
+            query_cache_size: Number of recent query embeddings to keep in memory.
+            embedding_device: Torch device for the embedder (autodetected if None).
+            executor: Executor for blocking retrieval in retrieve_async (default loop executor).
+            batch_size: Maximum concurrent queries embedded and searched together.
+            batch_wait_ms: Maximum time to wait for a retrieval batch to fill.
         """
         self.embedding_model = embedding_model
         self.db_path = db_path
         self.faiss_index_path = faiss_index_path
         self.top_k = top_k
         self.max_context_tokens = max_context_tokens
+        self.executor = executor
+        self._batcher = MicroBatcher(
+            self._retrieve_batch_async,
+            max_batch_size=batch_size,
+            max_wait_ms=batch_wait_ms,
+            batched=True,
+        )
 
         # Initialize components
         self.extractor = DocumentExtractor(chunk_size_tokens, chunk_overlap_tokens)
-        self.cache = EmbeddingCache(db_path)
-        self.embedder = SentenceTransformerEmbedder(embedding_model, cache=self.cache)
+        self.cache = EmbeddingCache(
+            db_path, vector_format="int8" if vector_quantization == "int8" else "float32"
+        )
+        self.embedder = SentenceTransformerEmbedder(
+            embedding_model,
+            cache=self.cache,
+            backend=embedding_backend,
+            onnx_file_name=embedding_onnx_file,
+            query_cache_size=query_cache_size,
+            device=embedding_device,
+        )
 
         # FAISS index dimension for all-MiniLM-L6-v2 is 384
         embedding_dim = 384 if embedding_model == "all-MiniLM-L6-v2" else 768
-        self.vector_store = FAISSVectorStore(embedding_dim=embedding_dim, index_path=faiss_index_path)
+        store_class = NumpyVectorStore if vector_store_backend == "numpy" else FAISSVectorStore
+        self.vector_store = store_class(
+            embedding_dim=embedding_dim,
+            index_path=faiss_index_path,
+            quantization=vector_quantization,
+            index_type=vector_index_type,
+            search_threads=vector_search_threads,
+        )
+
+        # (doc_name, chunk_index) -> token count, computed once at ingestion
+        self._token_counts: Dict[Tuple[str, int], int] = {}
 
         self._initialized = False
 
@@ -85,32 +174,50 @@ class RAGService:
         """
         logger.info("Initializing RAG service...")
 
-        # Extract and chunk documents
-        chunked_docs = self.extractor.extract_and_chunk_documents(data_dir)
+        # Extract and chunk documents, already grouped per document in chunk order
+        documents = self.extractor.extract_and_chunk_by_document(data_dir)
 
-        if not chunked_docs:
+        if not any(documents.values()):
             logger.warning("No documents found to index")
             self._initialized = True
             return
 
-        # Embed and cache
-        doc_names = list(set(doc[0] for doc in chunked_docs))
-        for doc_name in doc_names:
-            chunks = [chunk[2] for chunk in chunked_docs if chunk[0] == doc_name]
-            embeddings, newly_created = self.embedder.embed_and_cache(doc_name, chunks)
+        # Embed and cache, encoding all new chunks together
+        self.embedder.embed_and_cache_documents(documents)
 
-        # Rebuild FAISS index from cache
-        embeddings = self.cache.get_all_vectors()
         metadata = self.cache.get_all_metadata()
 
-        if embeddings:
-            self.vector_store.rebuild_from_cache(embeddings, metadata)
-            if self.faiss_index_path:
-                self.vector_store.save(self.faiss_index_path)
+        self._token_counts = {
+            (doc_name, chunk_index): estimate_tokens(chunk_text)
+            for _, doc_name, chunk_index, chunk_text in metadata
+        }
+
+        # Rebuild FAISS index from cache, unless the one loaded from disk already matches it
+        if self._index_is_current(metadata):
+            logger.info("Loaded vector index matches the embedding cache; skipping rebuild")
+        else:
+            ids, vectors = self.cache.get_all_vectors_matrix()
+            if ids:
+                self.vector_store.rebuild_from_matrix(ids, vectors, metadata)
+                if self.faiss_index_path:
+                    self.vector_store.save(self.faiss_index_path)
 
         logger.info(f"RAG service initialized with {len(metadata)} chunks")
         self._initialized = True
 
+    def _index_is_current(self, metadata: List[Tuple[str, str, int, str]]) -> bool:
+        """Check whether the vector store holds exactly the cached chunks, in cache order.
+
+        Args:
+            metadata: (id, doc_name, chunk_index, chunk_text) rows from the cache.
+
+        Returns:
+            True if the store's rows match the cache row for row.
+        """
+        if not metadata or self.vector_store.embedding_ids != [row[0] for row in metadata]:
+            return False
+        return self.vector_store.metadata == [tuple(row[1:]) for row in metadata]
+
     def retrieve(self, query: str, k: Optional[int] = None) -> List[Dict]:
         """Retrieve relevant chunks for a query.
 
@@ -119,84 +226,188 @@ class RAGService:
             k: Number of results (uses self.top_k if None).
 
         Returns:
-            List of dicts with keys: chunk_text, doc_name, chunk_index, score.
+            List of dicts with keys: chunk_text, doc_name, chunk_index, score, token_count,
+                preview (first 100 characters, for source listings).
+        """
+        return self.retrieve_many([query], k)[0]
+
+    def retrieve_many(self, queries: List[str], k: Optional[int] = None) -> List[List[Dict]]:
+        """Retrieve relevant chunks for several queries with one encode and one search.
+
+        Args:
+            queries: Query strings.
+            k: Number of results per query (uses self.top_k if None).
+
+        Returns:
+            One list of result dicts (as returned by retrieve) per query.
         """
         if not self._initialized:
             logger.error("RAG service not initialized")
+            return [[] for _ in queries]
+        if not queries:
             return []
 
         k = k or self.top_k
 
-        # Embed query
-        query_embedding = self.embedder.embed_texts([query])[0]
+        # Embed queries together (repeat queries hit the embedder's LRU)
+        query_embeddings = self.embedder.embed_queries(queries)
 
         # Search FAISS
-        results = self.vector_store.search(query_embedding, k=k)
+        batch_results = self.vector_store.search_batch(query_embeddings, k=k)
 
         # Format results
-        retrieved = []
-        for index, score, doc_name, chunk_index, chunk_text in results:
-            retrieved.append(
-                {
-                    "chunk_text": chunk_text,
-                    "doc_name": doc_name,
-                    "chunk_index": chunk_index,
-                    "score": score,
-                }
-            )
-
-        logger.debug(f"Retrieved {len(retrieved)} chunks for query: {query[:50]}")
-        return retrieved
+        all_retrieved = []
+        for query, results in zip(queries, batch_results):
+            retrieved = []
+            for index, score, doc_name, chunk_index, chunk_text in results:
+                retrieved.append(
+                    {
+                        "chunk_text": chunk_text,
+                        "doc_name": doc_name,
+                        "chunk_index": chunk_index,
+                        "score": score,
+                        "token_count": self._token_counts.get((doc_name, chunk_index))
+                        or estimate_tokens(chunk_text),
+                        "preview": chunk_text[:100],
+                    }
+                )
+            logger.debug(f"Retrieved {len(retrieved)} chunks for query: {query[:50]}")
+            all_retrieved.append(retrieved)
+
+        return all_retrieved
+
+    async def retrieve_async(self, query: str, k: Optional[int] = None) -> List[Dict]:
+        """Retrieve off the event loop, coalescing concurrent queries into one batch.
 
-    def build_prompt(self, query: str, retrieved: List[Dict], include_sources: bool = True) -> str:
-        """Build a prompt with safety instructions and retrieved context.
+        Args:
+            query: Query string.
+            k: Number of results (uses self.top_k if None).
+
+        Returns:
+            Result dicts, as returned by retrieve.
+        """
+        return await self._batcher.submit(query, k or self.top_k)
+
+    async def _retrieve_batch_async(self, batch: List[Tuple[str, int]]) -> List[List[Dict]]:
+        """Run a micro-batch of queries on the retrieval executor.
 
         Args:
-            query: Original query.
-            retrieved: List of retrieved chunks.
-            include_sources: Include source information.
+            batch: List of (query, k) argument tuples from the batcher.
 
         Returns:
-            Formatted prompt for LLM.
+            Result lists in batch order.
         """
-        # Build sources section
-        sources = []
-        for i, result in enumerate(retrieved, 1):
-            source_line = (
-                f"{i}) {result['doc_name']} (chunk {result['chunk_index']}): "
-                f'"{result["chunk_text"][:100]}..." (similarity: {result["score"]:.2f})'
-            )
-            sources.append(source_line)
+        loop = asyncio.get_running_loop()
+        queries = [query for query, _ in batch]
+        # One search at the largest k, trimmed per query
+        max_k = max(k for _, k in batch)
+        results = await loop.run_in_executor(self.executor, self.retrieve_many, queries, max_k)
+        return [retrieved[:k] for retrieved, (_, k) in zip(results, batch)]
 
-        sources_section = "\n".join(sources)
+    async def aclose(self) -> None:
+        """Stop the retrieval micro-batcher."""
+        await self._batcher.aclose()
 
-        # Build context section
-        context_chunks = "\n\n---\n\n".join([r["chunk_text"] for r in retrieved])
+    def _select_context(self, retrieved: List[Dict]) -> List[Dict]:
+        """Greedily pick retrieved chunks (in score order) that fit the context budget.
 
-        # Truncate context if needed
-        context_chunks = truncate_context(context_chunks, self.max_context_tokens)
+        Uses precomputed token counts, so no text is measured or joined per request
+        except a final partial chunk, which is truncated to the remaining budget.
 
-        # Build prompt with safety instructions
-        prompt = f"""You are a helpful assistant. Use ONLY the provided context to answer the user's question. 
-If the answer is not found in the context, say "I don't know" and show the retrieved sources.
-Always cite your sources.
+        Args:
+            retrieved: List of retrieved chunks, best first.
 
-## Context:
+        Returns:
+            Chunks to include; a partial chunk has its chunk_text truncated.
+        """
+        separator_tokens = estimate_tokens(self._CONTEXT_SEPARATOR)
+        budget = self.max_context_tokens
+        selected = []
+
+        for result in retrieved:
+            cost = result.get("token_count") or estimate_tokens(result["chunk_text"])
+            if selected:
+                cost += separator_tokens
+            if cost <= budget:
+                selected.append(result)
+                budget -= cost
+                continue
+
+            remaining = budget - (separator_tokens if selected else 0)
+            if remaining > 0:
+                partial = dict(result)
+                partial["chunk_text"] = truncate_context(result["chunk_text"], remaining)
+                selected.append(partial)
+            break
+
+        return selected
 
-{context_chunks}
+    def build_prompt(self, query: str, retrieved: List[Dict], include_sources: bool = True) -> str:
+        """Build a prompt with safety instructions and retrieved context.
 
-## Sources:
+        Args:
+            query: Original query.
+            retrieved: List of retrieved chunks.
+            include_sources: Include source information.
 
-{sources_section}
+        Returns:
+            Formatted prompt for LLM.
+        """
+        # Build sources section
+        sources_section = "\n".join(
+            f"{i}) {result['doc_name']} (chunk {result['chunk_index']}): "
+            f'"{result.get("preview", result["chunk_text"][:100])}..." '
+            f"(similarity: {result['score']:.2f})"
+            for i, result in enumerate(retrieved, 1)
+        )
 
-## Question:
+        # Build context section within the token budget
+        selected = self._select_context(retrieved)
+        context_chunks = self._CONTEXT_SEPARATOR.join([r["chunk_text"] for r in selected])
 
-{query}
+        # Build prompt with safety instructions
+        return "".join(
+            [
+                self._PROMPT_HEAD,
+                context_chunks,
+                self._PROMPT_SOURCES,
+                sources_section,
+                self._PROMPT_QUESTION,
+                query,
+                self._PROMPT_ANSWER,
+            ]
+        )
+
+    def build_messages(self, query: str, retrieved: List[Dict]) -> List[Dict[str, str]]:
+        """Build chat messages with retrieved context in a cacheable system prefix.
+
+        Chunks are ordered by (doc_name, chunk_index) and scores are left out, so the
+        same retrieval set always yields a byte-identical system message and
+        provider-side prompt prefix caching can reuse it across queries.
 
-## Answer:
+        Args:
+            query: Original query.
+            retrieved: List of retrieved chunks.
 
-"""
-        return prompt
+        Returns:
+            List of chat messages: [system (instructions + context), user (query)].
+        """
+        ordered = sorted(
+            self._select_context(retrieved), key=lambda r: (r["doc_name"], r["chunk_index"])
+        )
+
+        sources_section = "\n".join(
+            f"{i}) {r['doc_name']} (chunk {r['chunk_index']})" for i, r in enumerate(ordered, 1)
+        )
+        context_chunks = self._CONTEXT_SEPARATOR.join([r["chunk_text"] for r in ordered])
+
+        system_prompt = "".join(
+            [self._SYSTEM_HEAD, context_chunks, self._PROMPT_SOURCES, sources_section, "\n"]
+        )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": query},
+        ]
 
     def get_stats(self) -> Dict:
         """Get service statistics.
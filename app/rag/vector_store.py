@@ -3,200 +3,742 @@
 FAISS-based vector store.
 Manages FAISS index and metadata mapping for efficient similarity search.
 
-Auto-detects faiss availability. If faiss is not installed, we alias
-FAISSVectorStore to the NumPy fallback provided in
-`app.rag.vector_store_fallback.NumpyVectorStore` so the rest of the codebase
-can continue to import `FAISSVectorStore` unchanged.
+faiss is imported on first use, not with this module, so processes that never
+search skip its (BLAS/OpenMP) start-up cost. If faiss is not installed,
+constructing FAISSVectorStore returns the NumPy fallback
+`app.rag.vector_store_fallback.NumpyVectorStore` instead, so the rest of the
+codebase can continue to use `FAISSVectorStore` unchanged.
 """
 from __future__ import annotations
 
+import functools
 import logging
+import math
 import os
-from typing import List, Tuple, Optional
+from typing import List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 
-logger = logging.getLogger(__name__)
+from app.rag.vector_store_fallback import NumpyVectorStore, as_float32_matrix
 
-# Try to import faiss. If available, use the FAISS-backed implementation.
-# If not, fall back to the numpy-based implementation in vector_store_fallback.py.
-try:
-    import faiss  # type: ignore
-
-    HAS_FAISS = True
-except Exception:
-    faiss = None  # type: ignore
-    HAS_FAISS = False
-
-
-if HAS_FAISS:
-    # --- FAISS-backed implementation (unchanged) ---
-    class FAISSVectorStore:
-        """FAISS-based vector store for similarity search."""
-
-        def __init__(self, embedding_dim: int = 384, index_path: Optional[str] = None):
-            """Initialize FAISS vector store.
-
-            Args:
-                embedding_dim: Dimension of embeddings (384 for all-MiniLM-L6-v2).
-                index_path: Path to save/load FAISS index.
-            """
-            self.embedding_dim = embedding_dim
-            self.index_path = index_path
-            # Use IndexFlatIP (inner product) and ensure vectors are normalized before adding.
-            self.index = faiss.IndexFlatIP(embedding_dim)  # type: ignore
-            self.metadata: List[Tuple[str, int, str]] = []  # (doc_name, chunk_index, chunk_text)
-            self.embedding_ids: List[str] = []  # IDs from cache
-
-            if index_path and os.path.exists(index_path):
-                try:
-                    self.load(index_path)
-                except Exception:
-                    logger.exception("Failed to load FAISS index from path; starting with empty index.")
-
-        def add_vectors(
-            self, vectors: List[np.ndarray], metadata: List[Tuple[str, int, str]], ids: List[str]
-        ) -> None:
-            """Add vectors to index with metadata.
-
-            Args:
-                vectors: List of normalized embedding vectors.
-                metadata: List of (doc_name, chunk_index, chunk_text) tuples.
-                ids: List of embedding IDs from cache.
-            """
-            if len(vectors) != len(metadata) or len(vectors) != len(ids):
-                raise ValueError("Vectors, metadata, and IDs length mismatch")
-
-            # Stack vectors into matrix
-            vectors_array = np.vstack(vectors).astype(np.float32)
-
-            # Add to index
-            self.index.add(vectors_array)
-            self.metadata.extend(metadata)
-            self.embedding_ids.extend(ids)
+logger = logging.getLogger(__name__)
 
-            logger.info(f"Added {len(vectors)} vectors to FAISS index (total: {self.index.ntotal})")
+# The faiss module once imported by _import_faiss (stays None until then, or without faiss)
+faiss = None  # type: ignore
 
-        def search(self, query_vector: np.ndarray, k: int = 3) -> List[Tuple[int, float, str, int, str]]:
-            """Search for similar vectors.
 
-            Args:
-                query_vector: Query embedding vector (should be normalized).
-                k: Number of results to return.
+@functools.lru_cache(maxsize=None)
+def _import_faiss():
+    """Import faiss on first use and log the SIMD kernels it runs with.
 
-            Returns:
-                List of (index, score, doc_name, chunk_index, chunk_text) tuples.
-            """
+    Returns:
+        The faiss module, or None if it is not installed.
+    """
+    global faiss
+    try:
+        import faiss as faiss_module  # type: ignore
+    except Exception:
+        logger.info("faiss not available — using NumPy fallback vector store.")
+        return None
+
+    faiss = faiss_module
+    level = _faiss_simd_level()
+    logger.info(f"Using faiss {faiss.__version__} ({level} kernels)")
+    if level == "generic":
+        logger.warning("faiss loaded without AVX2 kernels; vector search will be slower")
+    return faiss
+
+
+def _faiss_simd_level() -> str:
+    """Report which SIMD kernels faiss runs its inner products with.
+
+    Older faiss-cpu wheels (<=1.8) ship generic, AVX2 and AVX-512 builds and load one at
+    import from the CPU flags (override with FAISS_OPT_LEVEL); newer ones dispatch at
+    runtime and expose the chosen level through SIMDConfig.
+
+    Returns:
+        SIMD level name (e.g. "AVX2", "AVX512"), "generic", or "unavailable" without faiss.
+    """
+    if faiss is None:
+        return "unavailable"
+    simd_config = getattr(faiss, "SIMDConfig", None)
+    if simd_config is not None:
+        try:
+            return simd_config.get_level_name()
+        except Exception:
+            pass
+    options = faiss.get_compile_options().split()  # type: ignore
+    for level in ("AVX512", "AVX2"):
+        if level in options:
+            return level
+    return "generic"
+
+
+# Index types: exact flat scan, HNSW graph, or IVF lists with an HNSW coarse quantizer
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+
+# HNSW graph degree and beam widths (build / query)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# IVF lists probed per query
+IVF_NPROBE = 8
+
+# Flat indexes at least this large are split into per-thread shards, so a single query's
+# scan runs on every core (FAISS otherwise parallelizes flat search only across queries)
+SHARD_MIN_VECTORS = 50_000
+
+# Quantization of stored vectors: float32, half precision, 8-bit scalar, or 4-bit fast-scan PQ
+QUANTIZATIONS = ("none", "fp16", "int8", "pq")
+
+# PQ uses one 4-bit sub-quantizer per PQ_DIMS_PER_CODE dimensions (d=384: 48 bytes/vector)
+PQ_DIMS_PER_CODE = 4
+PQ_NBITS = 4
+
+# Smaller corpora fall back to the unquantized index (too few points to train PQ codebooks)
+PQ_MIN_TRAIN_VECTORS = 1024
+
+
+def _pack_strings(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack strings into one UTF-8 byte buffer plus end offsets (no pickled objects).
+
+    Args:
+        strings: Strings to pack.
+
+    Returns:
+        (uint8 buffer, int64 end offset of each string) arrays.
+    """
+    encoded = [text.encode("utf-8") for text in strings]
+    offsets = np.cumsum([len(data) for data in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(buffer: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """Inverse of _pack_strings.
+
+    Args:
+        buffer: uint8 UTF-8 byte buffer.
+        offsets: int64 end offset of each string.
+
+    Returns:
+        Unpacked strings.
+    """
+    data = buffer.tobytes()
+    ends = offsets.tolist()
+    return [data[start:end].decode("utf-8") for start, end in zip([0] + ends[:-1], ends)]
+
+
+def _replace_durably(tmp_path: str, path: str) -> None:
+    """Flush a fully written temp file to disk, then atomically move it over path.
+
+    A crash leaves either the old file or the new one, never a torn write.
+
+    Args:
+        tmp_path: Completely written temporary file in the same directory as path.
+        path: Destination path.
+    """
+    with open(tmp_path, "rb") as fh:
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+    # Persist the rename itself (directories cannot be opened for fsync on Windows)
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class FAISSVectorStore:
+    """FAISS-based vector store for similarity search."""
+
+    def __new__(cls, *args, **kwargs):
+        """Import faiss on first construction; without it, return a NumpyVectorStore."""
+        if _import_faiss() is None:
+            return NumpyVectorStore(*args, **kwargs)
+        return super().__new__(cls)
+
+    def __init__(
+        self,
+        embedding_dim: int = 384,
+        index_path: Optional[str] = None,
+        quantization: str = "none",
+        index_type: str = "flat",
+        search_threads: Optional[int] = None,
+    ):
+        """Initialize FAISS vector store.
+
+        Args:
+            embedding_dim: Dimension of embeddings (384 for all-MiniLM-L6-v2).
+            index_path: Path to save/load FAISS index.
+            quantization: "none" for float32 vectors, "fp16" for half precision
+                (2x less memory scanned, scores accumulated in float32), "int8" for
+                8-bit scalar quantization (4x less memory), or "pq" for 4-bit fast-scan
+                product quantization (~32x less memory, flat or ivf only). Quantized indexes
+                are trained on the vectors they are built from.
+            index_type: "flat" (exact O(N) scan), "hnsw" (graph search, O(log N)
+                distance evaluations) or "ivf" (sqrt(N) inverted lists, for very
+                large corpora; trained on the vectors it is built from).
+            search_threads: Shards a flat index of SHARD_MIN_VECTORS or more rows is
+                split into, each scanned by its own thread (default: CPU count).
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        if quantization == "pq" and (
+            index_type == "hnsw" or embedding_dim % PQ_DIMS_PER_CODE != 0
+        ):
+            raise ValueError(
+                f"pq quantization needs a flat or ivf index and a dimension divisible "
+                f"by {PQ_DIMS_PER_CODE}"
+            )
+        self.embedding_dim = embedding_dim
+        self.index_path = index_path
+        self.quantization = quantization
+        self.index_type = index_type
+        self.search_threads = search_threads or os.cpu_count() or 1
+        self.index = self._new_index()
+        # Per-row metadata as parallel columns, gathered with one fancy index per search.
+        # FAISS labels are the row positions (no IndexIDMap), so hits index these
+        # columns directly; embedding_ids maps rows back to cache IDs for save/compare.
+        self._doc_names = np.empty(0, dtype=object)
+        self._chunk_indices = np.empty(0, dtype=np.int32)
+        self._chunk_texts: List[str] = []
+        self.embedding_ids: List[str] = []  # IDs from cache
+
+        if index_path and os.path.exists(index_path):
+            try:
+                self.load(index_path)
+            except Exception:
+                logger.exception("Failed to load FAISS index from path; starting with empty index.")
+
+    @property
+    def metadata(self) -> List[Tuple[str, int, str]]:
+        """(doc_name, chunk_index, chunk_text) tuples, one per index row."""
+        return list(
+            zip(self._doc_names.tolist(), self._chunk_indices.tolist(), self._chunk_texts)
+        )
+
+    def _extend_metadata(self, metadata: Sequence[Tuple[str, int, str]]) -> None:
+        """Append (doc_name, chunk_index, chunk_text) rows to the metadata columns.
+
+        Args:
+            metadata: One tuple per added index row.
+        """
+        if not metadata:
+            return
+        doc_names, chunk_indices, chunk_texts = zip(*metadata)
+        doc_names_array = np.empty(len(doc_names), dtype=object)
+        doc_names_array[:] = doc_names
+        self._doc_names = np.concatenate([self._doc_names, doc_names_array])
+        self._chunk_indices = np.concatenate(
+            [self._chunk_indices, np.asarray(chunk_indices, dtype=np.int32)]
+        )
+        self._chunk_texts.extend(chunk_texts)
+
+    def _set_metadata_columns(
+        self, ids: Sequence[str], metadata: Sequence[Tuple[str, str, int, str]]
+    ) -> None:
+        """Fill the metadata columns for index rows ids from cache metadata rows.
+
+        Cache metadata normally comes in the same order as the ids, and is then
+        split into columns directly; otherwise rows are gathered by position, with
+        ("unknown", -1, "") for ids that have no metadata.
+
+        Args:
+            ids: Embedding ID of each index row.
+            metadata: (id, doc_name, chunk_index, chunk_text) rows from the cache.
+        """
+        metadata_ids, doc_names, chunk_indices, chunk_texts = (
+            zip(*metadata) if metadata else ((), (), (), ())
+        )
+        doc_names_array = np.empty(len(doc_names) + 1, dtype=object)
+        doc_names_array[:-1] = doc_names
+        doc_names_array[-1] = "unknown"
+        chunk_indices_array = np.append(np.asarray(chunk_indices, dtype=np.int32), -1)
+
+        if list(metadata_ids) == list(ids):
+            self._doc_names = doc_names_array[:-1]
+            self._chunk_indices = chunk_indices_array[:-1]
+            self._chunk_texts = list(chunk_texts)
+            return
+
+        # Position of each id's metadata row; -1 picks the trailing "unknown" entry
+        id_to_row = {metadata_id: i for i, metadata_id in enumerate(metadata_ids)}
+        order = np.fromiter(
+            (id_to_row.get(embedding_id, -1) for embedding_id in ids),
+            dtype=np.int64,
+            count=len(ids),
+        )
+        self._doc_names = doc_names_array[order]
+        self._chunk_indices = chunk_indices_array[order]
+        texts = list(chunk_texts) + [""]
+        self._chunk_texts = [texts[i] for i in order.tolist()]
+
+    def _clear_metadata(self) -> None:
+        """Drop all row metadata and embedding IDs."""
+        self._doc_names = np.empty(0, dtype=object)
+        self._chunk_indices = np.empty(0, dtype=np.int32)
+        self._chunk_texts = []
+        self.embedding_ids.clear()
+
+    def _new_index(self, n_vectors: int = 0):
+        """Create an empty inner-product index (vectors are normalized before adding).
+
+        Args:
+            n_vectors: Number of vectors the index will be built from (sizes IVF lists).
+
+        Returns:
+            Index for the configured index_type and quantization; all but the plain
+            flat and HNSW ones need training before vectors are added.
+        """
+        d = self.embedding_dim
+        ip = faiss.METRIC_INNER_PRODUCT  # type: ignore
+        quantization = self.quantization
+        if quantization == "pq" and 0 < n_vectors < PQ_MIN_TRAIN_VECTORS:
+            logger.info(f"Only {n_vectors} vectors, building an unquantized index, not PQ")
+            quantization = "none"
+        sq_type = self._scalar_quantizer_type(quantization)
+        pq_m = d // PQ_DIMS_PER_CODE
+
+        if self.index_type == "hnsw":
+            if sq_type is not None:
+                index = faiss.IndexHNSWSQ(d, sq_type, HNSW_M, ip)  # type: ignore
+            else:
+                index = faiss.IndexHNSWFlat(d, HNSW_M, ip)  # type: ignore
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        elif self.index_type == "ivf":
+            quantizer = faiss.IndexHNSWFlat(d, HNSW_M, ip)  # type: ignore
+            nlist = max(1, int(math.sqrt(n_vectors)))
+            if sq_type is not None:
+                index = faiss.IndexIVFScalarQuantizer(  # type: ignore
+                    quantizer, d, nlist, sq_type, ip
+                )
+            elif quantization == "pq":
+                index = faiss.IndexIVFPQFastScan(  # type: ignore
+                    quantizer, d, nlist, pq_m, PQ_NBITS, ip
+                )
+            else:
+                index = faiss.IndexIVFFlat(quantizer, d, nlist, ip)  # type: ignore
+        elif self.search_threads > 1 and n_vectors >= SHARD_MIN_VECTORS:
+            # threaded=True: one thread per shard; successive_ids keeps row positions
+            index = faiss.IndexShards(d, True, True)  # type: ignore
+            for _ in range(self.search_threads):
+                # The faiss wrapper keeps a reference to each added shard
+                index.add_shard(self._new_flat_index(quantization))
+        else:
+            index = self._new_flat_index(quantization)
+        self._configure_search(index)
+        return index
+
+    @staticmethod
+    def _scalar_quantizer_type(quantization: str) -> Optional[int]:
+        """Map a quantization name to its FAISS scalar quantizer type.
+
+        Args:
+            quantization: Quantization name.
+
+        Returns:
+            ScalarQuantizer.QT_fp16 or QT_8bit, or None if not scalar-quantized.
+        """
+        if quantization == "fp16":
+            return faiss.ScalarQuantizer.QT_fp16  # type: ignore
+        if quantization == "int8":
+            return faiss.ScalarQuantizer.QT_8bit  # type: ignore
+        return None
+
+    def _new_flat_index(self, quantization: str):
+        """Create an empty flat (exhaustive scan) inner-product index.
+
+        Args:
+            quantization: "none", "fp16", "int8" or "pq".
+
+        Returns:
+            IndexFlatIP, IndexScalarQuantizer or IndexPQFastScan.
+        """
+        d = self.embedding_dim
+        ip = faiss.METRIC_INNER_PRODUCT  # type: ignore
+        sq_type = self._scalar_quantizer_type(quantization)
+        if sq_type is not None:
+            return faiss.IndexScalarQuantizer(d, sq_type, ip)  # type: ignore
+        if quantization == "pq":
+            return faiss.IndexPQFastScan(  # type: ignore
+                d, d // PQ_DIMS_PER_CODE, PQ_NBITS, ip
+            )
+        return faiss.IndexFlatIP(d)  # type: ignore
+
+    def _normalized(self, vectors: Union[np.ndarray, Sequence[np.ndarray]]) -> np.ndarray:
+        """L2-normalize rows into a float32 matrix with faiss's vectorized normalize_L2.
+
+        Normalizes in place, copying first only when the matrix is the caller's memory
+        (e.g. a read-only cached query vector or memory-mapped cache matrix).
+
+        Args:
+            vectors: (N, D) matrix or list of rows.
+
+        Returns:
+            Unit-norm (N, D) float32 matrix (zero rows stay zero).
+        """
+        vectors_array = as_float32_matrix(vectors, self.embedding_dim)
+        if isinstance(vectors, np.ndarray) and np.may_share_memory(vectors_array, vectors):
+            vectors_array = vectors_array.copy()
+        faiss.normalize_L2(vectors_array)  # type: ignore
+        return vectors_array
+
+    def _configure_search(self, index) -> None:
+        """Apply query-time search parameters (not all are kept by write_index).
+
+        Args:
+            index: FAISS index.
+        """
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        if hasattr(index, "nprobe"):
+            index.nprobe = min(IVF_NPROBE, index.nlist)
+
+    @staticmethod
+    def _merged(index):
+        """Merge a sharded index into one flat index (other indexes are returned as-is).
+
+        Args:
+            index: FAISS index.
+
+        Returns:
+            A single index holding every shard's vectors in row order.
+        """
+        if not isinstance(index, faiss.IndexShards):  # type: ignore
+            return index
+        merged = faiss.clone_index(index.at(0))  # type: ignore
+        for i in range(1, index.count()):
+            merged.merge_from(index.at(i))
+        return merged
+
+    def _sharded(self, index):
+        """Split a flat index into search_threads shards once it is large enough.
+
+        Args:
+            index: Unsharded FAISS index.
+
+        Returns:
+            IndexShards over empty copies of index (trained, so quantizer codebooks
+            are kept), or index itself if _new_index would not shard at its size.
+        """
+        if (
+            self.index_type != "flat"
+            or self.search_threads <= 1
+            or index.ntotal < SHARD_MIN_VECTORS
+        ):
+            return index
+        vectors = index.reconstruct_n(0, index.ntotal)
+        # Copy the stored vectors once; each shard is a copy of the emptied clone
+        empty = faiss.clone_index(index)  # type: ignore
+        empty.reset()
+        sharded = faiss.IndexShards(self.embedding_dim, True, True)  # type: ignore
+        for _ in range(self.search_threads):
+            sharded.add_shard(faiss.clone_index(empty))  # type: ignore
+        sharded.add(vectors)
+        self._configure_search(sharded)
+        return sharded
+
+    def _is_memory_mapped(self) -> bool:
+        """Return whether the index's inverted lists are mapped read-only from disk (see load)."""
+        invlists = getattr(self.index, "invlists", None)
+        return invlists is not None and isinstance(
+            faiss.downcast_InvertedLists(invlists), faiss.OnDiskInvertedLists  # type: ignore
+        )
+
+    def add_vectors(
+        self,
+        vectors: Union[np.ndarray, Sequence[np.ndarray]],
+        metadata: List[Tuple[str, int, str]],
+        ids: List[str],
+    ) -> None:
+        """Add vectors to index with metadata.
+
+        A memory-mapped IVF index (see load) is read-only, so a ValueError is raised
+        for it; rebuild it with rebuild_from_matrix instead.
+
+        Args:
+            vectors: Embedding vectors, as an (N, D) matrix or a list of rows
+                (L2-normalized here, so inner product is cosine similarity).
+            metadata: List of (doc_name, chunk_index, chunk_text) tuples.
+            ids: List of embedding IDs from cache.
+        """
+        if len(vectors) != len(metadata) or len(vectors) != len(ids):
+            raise ValueError("Vectors, metadata, and IDs length mismatch")
+        if self._is_memory_mapped():
+            raise ValueError(
+                "Index is memory-mapped read-only from disk; rebuild it with "
+                "rebuild_from_matrix instead of adding to it"
+            )
+
+        # One unit-norm float32 matrix (no stacked float64 intermediate)
+        vectors_array = self._normalized(vectors)
+
+        # Add to index (a quantized or IVF index is trained on the first batch)
+        if not self.index.is_trained:
             if self.index.ntotal == 0:
-                logger.warning("FAISS index is empty")
-                return []
-
-            query_array = np.array([query_vector], dtype=np.float32)
-
-            # FAISS returns distances and indices
-            distances, indices = self.index.search(query_array, min(k, self.index.ntotal))
-
-            results = []
-            for i, (distance, index) in enumerate(zip(distances[0], indices[0])):
-                if index == -1:  # Invalid result
-                    continue
-
-                doc_name, chunk_index, chunk_text = self.metadata[index]
-                results.append((index, float(distance), doc_name, chunk_index, chunk_text))
-
-            return results
-
-        def rebuild_from_cache(self, embeddings: List[Tuple[str, np.ndarray]], metadata: List[Tuple[str, str, int, str]]) -> None:
-            """Rebuild index from cache data.
-
-            Args:
-                embeddings: List of (id, vector) tuples from cache.
-                metadata: List of (id, doc_name, chunk_index, chunk_text) tuples from cache.
-            """
-            # Clear existing index
-            self.index.reset()
-            self.metadata.clear()
-            self.embedding_ids.clear()
-
-            if not embeddings:
-                logger.info("No embeddings to rebuild index")
-                return
-
-            # Extract vectors and IDs
-            ids = [em[0] for em in embeddings]
-            vectors = [em[1] for em in embeddings]
-
-            # Build metadata lookup
-            metadata_map = {row[0]: row[1:] for row in metadata}
-
-            # Add vectors with corresponding metadata
-            vectors_array = np.vstack(vectors).astype(np.float32)
+                self.index = self._new_index(len(vectors_array))
+            self.index.train(vectors_array)
+        if isinstance(self.index, faiss.IndexShards):  # type: ignore
+            # successive_ids shards take a single add; appending to the last shard keeps
+            # row positions (labels are offset by the shard sizes before it)
+            self.index.at(self.index.count() - 1).add(vectors_array)
+            self.index.syncWithSubIndexes()
+        else:
             self.index.add(vectors_array)
-
-            for embedding_id, vector in embeddings:
-                if embedding_id in metadata_map:
-                    doc_name, chunk_index, chunk_text = metadata_map[embedding_id]
-                    self.metadata.append((doc_name, chunk_index, chunk_text))
-                    self.embedding_ids.append(embedding_id)
-
-            logger.info(f"Rebuilt FAISS index with {self.index.ntotal} vectors")
-
-        def save(self, path: str) -> None:
-            """Save FAISS index to disk.
-
-            Args:
-                path: Path to save index.
-            """
-            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-            faiss.write_index(self.index, path)  # type: ignore
-            logger.info(f"Saved FAISS index to {path}")
-
-        def load(self, path: str) -> None:
-            """Load FAISS index from disk.
-
-            Args:
-                path: Path to load index.
-            """
-            if not os.path.exists(path):
-                logger.warning(f"Index file not found: {path}")
+        self._extend_metadata(metadata)
+        self.embedding_ids.extend(ids)
+
+        logger.info(f"Added {len(vectors)} vectors to FAISS index (total: {self.index.ntotal})")
+
+    def search(self, query_vector: np.ndarray, k: int = 3) -> List[Tuple[int, float, str, int, str]]:
+        """Search for similar vectors.
+
+        Args:
+            query_vector: Query embedding vector of embedding_dim values (normalized
+                here); a float32 vector, as the embedder returns, is passed on as a
+                (1, D) view without a copy.
+            k: Number of results to return.
+
+        Returns:
+            List of (index, score, doc_name, chunk_index, chunk_text) tuples.
+        """
+        query_array = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        return self.search_batch(query_array, k)[0]
+
+    def search_batch(
+        self, query_vectors: Union[np.ndarray, Sequence[np.ndarray]], k: int = 3
+    ) -> List[List[Tuple[int, float, str, int, str]]]:
+        """Search for several queries in one FAISS call.
+
+        A single (B, D) search lets FAISS score the whole batch with one blocked
+        matrix product instead of B matrix-vector passes over the index.
+
+        Args:
+            query_vectors: Query embeddings, a (B, D) matrix or list of rows (normalized
+                here).
+            k: Number of results per query.
+
+        Returns:
+            One list of (index, score, doc_name, chunk_index, chunk_text) tuples per query.
+        """
+        if self.index.ntotal == 0:
+            logger.warning("FAISS index is empty")
+            return [[] for _ in range(len(query_vectors))]
+
+        query_array = self._normalized(query_vectors)
+
+        # FAISS returns distances and indices, one row per query
+        distances, indices = self.index.search(query_array, min(k, self.index.ntotal))
+
+        # Gather metadata for every valid hit at once (-1 marks a missing result)
+        valid = indices != -1
+        hit_indices = indices[valid]
+        positions = hit_indices.tolist()
+        hits = list(
+            zip(
+                positions,
+                distances[valid].tolist(),
+                self._doc_names[hit_indices].tolist(),
+                self._chunk_indices[hit_indices].tolist(),
+                [self._chunk_texts[i] for i in positions],
+            )
+        )
+
+        # Split the hits back into one list per query
+        ends = np.cumsum(valid.sum(axis=1)).tolist()
+        return [hits[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+    def rebuild_from_cache(self, embeddings: List[Tuple[str, np.ndarray]], metadata: List[Tuple[str, str, int, str]]) -> None:
+        """Rebuild index from cache data.
+
+        Args:
+            embeddings: List of (id, vector) tuples from cache.
+            metadata: List of (id, doc_name, chunk_index, chunk_text) tuples from cache.
+        """
+        if not embeddings:
+            self.reset()
+            logger.info("No embeddings to rebuild index")
+            return
+
+        # One pass splits the pairs into the ID list and the rows packed into the matrix
+        ids, rows = zip(*embeddings)
+        self.rebuild_from_matrix(
+            list(ids), as_float32_matrix(rows, self.embedding_dim), metadata
+        )
+
+    def rebuild_from_matrix(
+        self,
+        ids: List[str],
+        vectors: Union[np.ndarray, Sequence[np.ndarray]],
+        metadata: List[Tuple[str, str, int, str]],
+    ) -> None:
+        """Rebuild index from an (N, D) vector matrix, adding it in one call.
+
+        Args:
+            ids: Embedding IDs, one per matrix row.
+            vectors: Embedding matrix (see EmbeddingCache.get_all_vectors_matrix); rows
+                are normalized into a copy, the caller's matrix is not modified.
+            metadata: List of (id, doc_name, chunk_index, chunk_text) tuples from cache.
+        """
+        # Start from a fresh index so a quantized or IVF one is trained on the full corpus
+        self.index = self._new_index(len(ids))
+        self._clear_metadata()
+
+        if len(ids) == 0:
+            logger.info("No embeddings to rebuild index")
+            return
+
+        # Add vectors with corresponding metadata (one entry per row keeps them aligned)
+        vectors_array = self._normalized(vectors)
+        if not self.index.is_trained:
+            self.index.train(vectors_array)
+        self.index.add(vectors_array)
+        self._set_metadata_columns(ids, metadata)
+        self.embedding_ids.extend(ids)
+
+        logger.info(f"Rebuilt FAISS index with {self.index.ntotal} vectors")
+
+    @staticmethod
+    def _file_stamp(path: str) -> np.ndarray:
+        """(size, mtime in ns) of a file, identifying one written version of it."""
+        stat = os.stat(path)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    @staticmethod
+    def metadata_path(path: str) -> str:
+        """Path of the row metadata file saved beside an index file.
+
+        Args:
+            path: Index path.
+
+        Returns:
+            "<base>_meta.npz" path.
+        """
+        return os.path.splitext(path)[0] + "_meta.npz"
+
+    def save(self, path: str) -> None:
+        """Save FAISS index to disk, with its row metadata and embedding IDs beside it.
+
+        Args:
+            path: Path to save index.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Shards cannot be serialized; write them merged into one flat index
+        index = self._merged(self.index)
+        # Write beside and swap in, so a memory-mapped copy of the old file stays valid
+        tmp_path = f"{path}.tmp"
+        faiss.write_index(index, tmp_path)  # type: ignore
+        _replace_durably(tmp_path, path)
+
+        # Columnar metadata (strings packed as UTF-8 buffers), so load needs no rebuild
+        doc_names, doc_name_ends = _pack_strings(self._doc_names.tolist())
+        chunk_texts, chunk_text_ends = _pack_strings(self._chunk_texts)
+        ids, id_ends = _pack_strings(self.embedding_ids)
+        meta_path = self.metadata_path(path)
+        with open(f"{meta_path}.tmp", "wb") as fh:
+            np.savez(
+                fh,
+                doc_names=doc_names,
+                doc_name_ends=doc_name_ends,
+                chunk_indices=self._chunk_indices,
+                chunk_texts=chunk_texts,
+                chunk_text_ends=chunk_text_ends,
+                ids=ids,
+                id_ends=id_ends,
+                config=np.array([self.index_type, self.quantization]),
+                index_stamp=self._file_stamp(path),
+            )
+        _replace_durably(f"{meta_path}.tmp", meta_path)
+        logger.info(f"Saved FAISS index to {path}")
+
+    def load(self, path: str) -> None:
+        """Load FAISS index from disk.
+
+        IVF inverted lists are memory-mapped read-only, so the OS pages them in on
+        demand and several workers share one copy; such an index must be rebuilt
+        (rebuild_from_matrix) rather than added to (add_vectors raises ValueError).
+        Flat and HNSW indexes cannot be mapped and are read into memory; a flat index
+        large enough to shard is split across search_threads again, as
+        rebuild_from_matrix would build it.
+
+        Row metadata and embedding IDs are restored from the file written by save; an
+        index saved with another index_type or quantization is not loaded.
+
+        Args:
+            path: Path to load index.
+        """
+        if not os.path.exists(path):
+            logger.warning(f"Index file not found: {path}")
+            return
+
+        meta_path = self.metadata_path(path)
+        meta = None
+        if os.path.exists(meta_path):
+            with np.load(meta_path) as data:
+                meta = {name: data[name] for name in data.files}
+            if meta["config"].tolist() != [self.index_type, self.quantization]:
+                logger.warning(
+                    f"Index at {path} was built as {meta['config'].tolist()}; not loading it"
+                )
                 return
 
+        try:
+            self.index = faiss.read_index(  # type: ignore
+                path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY  # type: ignore
+            )
+        except Exception:
+            logger.debug(f"Cannot memory-map {path}, reading it into memory")
             self.index = faiss.read_index(path)  # type: ignore
-            logger.info(f"Loaded FAISS index from {path} (ntotal: {self.index.ntotal})")
-
-        def get_stats(self) -> dict:
-            """Get index statistics.
-
-            Returns:
-                Dictionary with index stats.
-            """
-            return {
-                "total_vectors": self.index.ntotal,
-                "embedding_dim": self.embedding_dim,
-                "metadata_count": len(self.metadata),
-            }
-
-        def reset(self) -> None:
-            """Reset index and clear all data."""
-            self.index.reset()
-            self.metadata.clear()
-            self.embedding_ids.clear()
-            logger.info("Reset FAISS vector store")
-
-
-else:
-    # --- Faiss not available: use the full fallback implementation from file ---
-    try:
-        # Import the full fallback implementation you added earlier.
-        from app.rag.vector_store_fallback import NumpyVectorStore  # type: ignore
-
-        # Make the name FAISSVectorStore alias the fallback to keep external imports unchanged.
-        FAISSVectorStore = NumpyVectorStore  # type: ignore
-        logger.info("faiss not available — using NumPy fallback vector store (FAISSVectorStore -> NumpyVectorStore).")
-    except Exception as e:
-        # If import fails, raise a clear error so the developer can add the fallback file.
-        logger.exception("Failed to import fallback vector store. Please ensure app/rag/vector_store_fallback.py exists.")
-        raise ImportError("Missing fallback vector store (app.rag.vector_store_fallback)") from e
+        self._configure_search(self.index)
+        # save merged the shards, so split a large flat index again for threaded search
+        self.index = self._sharded(self.index)
+
+        self._clear_metadata()
+        # The stamp ties the metadata to this exact index file (a crash between the
+        # two writes leaves a new index with the old metadata, or the reverse)
+        stamp = meta.get("index_stamp") if meta is not None else None
+        if (
+            stamp is not None
+            and len(meta["chunk_indices"]) == self.index.ntotal
+            and stamp.tolist() == self._file_stamp(path).tolist()
+        ):
+            self._doc_names = np.array(
+                _unpack_strings(meta["doc_names"], meta["doc_name_ends"]), dtype=object
+            )
+            self._chunk_indices = meta["chunk_indices"]
+            self._chunk_texts = _unpack_strings(meta["chunk_texts"], meta["chunk_text_ends"])
+            self.embedding_ids = _unpack_strings(meta["ids"], meta["id_ends"])
+        elif meta is not None:
+            logger.warning(f"Metadata at {meta_path} does not match the index; ignoring it")
+        logger.info(f"Loaded FAISS index from {path} (ntotal: {self.index.ntotal})")
+
+    def get_stats(self) -> dict:
+        """Get index statistics.
+
+        Returns:
+            Dictionary with index stats.
+        """
+        return {
+            "total_vectors": self.index.ntotal,
+            "embedding_dim": self.embedding_dim,
+            "metadata_count": len(self._chunk_texts),
+            "quantization": self.quantization,
+            "index_type": self.index_type,
+            "simd": _faiss_simd_level(),
+            "shards": (
+                self.index.count() if isinstance(self.index, faiss.IndexShards) else 1  # type: ignore
+            ),
+        }
+
+    def reset(self) -> None:
+        """Reset index and clear all data."""
+        self.index = self._new_index()
+        self._clear_metadata()
+        logger.info("Reset FAISS vector store")
 
 
 
@@ -4,57 +4,205 @@ Simple NumPy-based vector store fallback.
 This implements the same minimal interface used by the FAISSVectorStore:
 - add_vectors(vectors, metadata, ids)
 - search(query_vector, k=3)
-- rebuild_from_cache(embeddings, metadata)
-- save(path) / load(path) (no-op or simple serialization)
+- rebuild_from_cache(embeddings, metadata) / rebuild_from_matrix(ids, vectors, metadata)
+- save(path) / load(path) (.npy arrays, memory-mapped on load, + json metadata)
 - get_stats()
 - reset()
 """
 
 from __future__ import annotations
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import List, Optional, Sequence, Tuple, Union
 import os
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+# Optional SimSIMD kernels: fp16 / int8 dot products without widening to float32
+try:
+    import simsimd  # type: ignore
+except Exception:
+    simsimd = None  # type: ignore
+
+
+def as_float32_matrix(
+    vectors: Union[np.ndarray, Sequence[np.ndarray]], embedding_dim: int
+) -> np.ndarray:
+    """Return vectors as a C-contiguous (N, D) float32 matrix with at most one copy.
+
+    A 2-D float32 array is passed through as is; anything else is written row by row
+    into a single preallocated matrix (no intermediate float64 or stacked copy).
+    Raises ValueError if a matrix does not have embedding_dim columns.
+    """
+    if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+        if vectors.shape[1] != embedding_dim:
+            raise ValueError(
+                f"Expected {embedding_dim}-dimensional vectors, got {vectors.shape[1]}"
+            )
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+    out = np.empty((len(vectors), embedding_dim), dtype=np.float32)
+    for i, vector in enumerate(vectors):
+        np.copyto(out[i], vector, casting="unsafe")
+    return out
+
+
+def _unit_rows(vectors_array: np.ndarray, in_place: bool) -> np.ndarray:
+    """L2-normalize the rows of a float32 matrix (zero rows stay zero).
+
+    Squared norms come from one einsum reduction, so no (N, D) temporary is made
+    (np.linalg.norm squares into a full-size copy first), and clamping the norms
+    replaces the zero-row mask.
+    """
+    norms = np.sqrt(np.einsum("ij,ij->i", vectors_array, vectors_array))[:, None]
+    np.maximum(norms, np.finfo(np.float32).tiny, out=norms)
+    if in_place:
+        return np.divide(vectors_array, norms, out=vectors_array)
+    return vectors_array / norms
+
+
+def _reserve(
+    buffer: Optional[np.ndarray], size: int, needed: int, row_shape: Tuple[int, ...], dtype
+) -> np.ndarray:
+    """Return buffer if it holds needed rows, else a copy of its first size rows with more room.
+
+    Capacity at least doubles on each reallocation (like list), so a sequence of
+    appends copies O(N) rows in total instead of re-stacking the matrix every time.
+    """
+    if buffer is not None and needed <= len(buffer):
+        return buffer
+    capacity = max(needed, 2 * len(buffer)) if buffer is not None else needed
+    grown = np.empty((capacity,) + row_shape, dtype=dtype)
+    if buffer is not None:
+        grown[:size] = buffer[:size]
+    return grown
+
+
+def _quantize_rows(vectors_array: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization, same scheme as embedder.quantize_int8."""
+    scales = np.abs(vectors_array).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors_array / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+# Rows scored per block, bounding the score buffer (and, in fp16/int8 mode, the
+# float32 copy made for BLAS) while the running top-k is kept
+SCORE_BLOCK_ROWS = 4096
+
+# Largest query batch scored with SimSIMD in fp16/int8 mode; bigger batches amortize
+# the float32 widening over one BLAS matrix product and are faster that way
+SIMSIMD_MAX_BATCH = 8
+
 
 class NumpyVectorStore:
     """Lightweight in-memory vector store using NumPy (cosine similarity)."""
 
-    def __init__(self, embedding_dim: int = 384, index_path: Optional[str] = None):
+    def __init__(
+        self,
+        embedding_dim: int = 384,
+        index_path: Optional[str] = None,
+        quantization: str = "none",
+        index_type: str = "flat",
+        search_threads: Optional[int] = None,
+    ):
+        # quantization="fp16" stores half-precision rows (2x less memory), "int8" keeps
+        # int8 codes plus a per-row scale (4x less memory); index_type and search_threads
+        # are accepted for interface parity: search is always an exact scan, threaded by
+        # the BLAS library's matrix product
         self.embedding_dim = embedding_dim
         self.index_path = index_path
-        self.vectors: Optional[np.ndarray] = None  # shape (N, D)
+        self.quantization = quantization
+        self.index_type = index_type
+        self._vector_dtype = np.float16 if quantization == "fp16" else np.float32
+        self.vectors: Optional[np.ndarray] = None  # shape (N, D) float32 (float16 in fp16 mode)
+        self.codes: Optional[np.ndarray] = None  # shape (N, D) int8, int8 mode only
+        self.scales: Optional[np.ndarray] = None  # shape (N,) float32, int8 mode only
+        # Growable storage behind vectors / codes / scales (which are views of its first
+        # _size rows); spare capacity takes later batches without re-copying stored rows
+        self._vector_buffer: Optional[np.ndarray] = None
+        self._code_buffer: Optional[np.ndarray] = None
+        self._scale_buffer: Optional[np.ndarray] = None
+        self._size = 0
+        # Normalized batches added since the last search, merged in one copy by _consolidate
+        self._pending: List[np.ndarray] = []
         self.metadata: List[Tuple[str, int, str]] = []  # (doc_name, chunk_index, chunk_text)
         self.embedding_ids: List[str] = []  # IDs from cache
 
-        # Try to load saved index if available
-        if index_path and os.path.exists(index_path):
+        # Try to load saved index if available (save writes beside index_path, not to it)
+        if index_path and self._is_saved(index_path):
             try:
                 self.load(index_path)
             except Exception:
                 logger.warning("Failed to load fallback index; starting empty store.")
 
+    def _append(self, vectors_array: np.ndarray) -> None:
+        """Queue normalized float32 rows; they are stored on the next _consolidate."""
+        self._pending.append(vectors_array)
+
+    def _consolidate(self) -> None:
+        """Copy queued batches into the stored matrix, once each.
+
+        Appending with vstack on every add would copy the whole matrix each time
+        (O(N^2) bytes over an ingestion); batches are instead merged on first use,
+        into a buffer whose capacity grows geometrically (see _reserve).
+        """
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = []
+        start = self._size
+        end = start + sum(len(batch) for batch in pending)
+        dim = (self.embedding_dim,)
+
+        if self.quantization == "int8":
+            self._code_buffer = _reserve(self._code_buffer, start, end, dim, np.int8)
+            self._scale_buffer = _reserve(self._scale_buffer, start, end, (), np.float32)
+            for batch in pending:
+                stop = start + len(batch)
+                self._code_buffer[start:stop], self._scale_buffer[start:stop] = (
+                    _quantize_rows(batch)
+                )
+                start = stop
+        elif self._vector_buffer is None and len(pending) == 1:
+            # A first single batch (e.g. a rebuild) is adopted without a copy
+            self._vector_buffer = pending[0].astype(self._vector_dtype, copy=False)
+        else:
+            self._vector_buffer = _reserve(
+                self._vector_buffer, start, end, dim, self._vector_dtype
+            )
+            for batch in pending:
+                self._vector_buffer[start : start + len(batch)] = batch
+                start += len(batch)
+        self._size = end
+        self._sync_views()
+
+    def _sync_views(self) -> None:
+        """Point vectors / codes / scales at the first _size rows of their buffers."""
+        size = self._size
+        self.vectors = self._vector_buffer[:size] if self._vector_buffer is not None else None
+        self.codes = self._code_buffer[:size] if self._code_buffer is not None else None
+        self.scales = self._scale_buffer[:size] if self._scale_buffer is not None else None
+
+    def _normalized(self, vectors: Union[np.ndarray, Sequence[np.ndarray]]) -> np.ndarray:
+        """L2-normalize rows into a float32 matrix, in place unless it is the caller's memory."""
+        vectors_array = as_float32_matrix(vectors, self.embedding_dim)
+        shared = isinstance(vectors, np.ndarray) and np.may_share_memory(vectors_array, vectors)
+        return _unit_rows(vectors_array, in_place=not shared)
+
     def add_vectors(
-        self, vectors: List[np.ndarray], metadata: List[Tuple[str, int, str]], ids: List[str]
+        self,
+        vectors: Union[np.ndarray, Sequence[np.ndarray]],
+        metadata: List[Tuple[str, int, str]],
+        ids: List[str],
     ) -> None:
-        """Add vectors with corresponding metadata and ids."""
+        """Add vectors (an (N, D) array or a list of rows) with metadata and ids."""
         if len(vectors) != len(metadata) or len(vectors) != len(ids):
             raise ValueError("Vectors, metadata, and IDs length mismatch")
 
-        vectors_array = np.vstack(vectors).astype(np.float32)
-        # Normalize vectors for cosine similarity
-        norms = np.linalg.norm(vectors_array, axis=1, keepdims=True)
-        norms[norms == 0] = 1.0
-        vectors_array = vectors_array / norms
-
-        if self.vectors is None:
-            self.vectors = vectors_array
-        else:
-            self.vectors = np.vstack([self.vectors, vectors_array])
+        vectors_array = self._normalized(vectors)
 
+        self._append(vectors_array)
         self.metadata.extend(metadata)
         self.embedding_ids.extend(ids)
 
@@ -62,31 +210,108 @@ class NumpyVectorStore:
 
     def search(self, query_vector: np.ndarray, k: int = 3) -> List[Tuple[int, float, str, int, str]]:
         """
-        Search for similar vectors using cosine similarity.
+        Search for similar vectors using cosine similarity. A float32 query (as the
+        embedder returns) is used as a (1, D) view without copying.
         Returns list of (index, score, doc_name, chunk_index, chunk_text).
         """
-        if self.vectors is None or self.vectors.shape[0] == 0:
+        return self.search_batch(np.asarray(query_vector, dtype=np.float32).reshape(1, -1), k)[0]
+
+    def search_batch(
+        self, query_vectors: Union[np.ndarray, Sequence[np.ndarray]], k: int = 3
+    ) -> List[List[Tuple[int, float, str, int, str]]]:
+        """
+        Search several queries (a (B, D) matrix or list of rows) with one (B, D) x (D, N)
+        matrix product. Returns one list of (index, score, doc_name, chunk_index,
+        chunk_text) per query.
+        """
+        self._consolidate()
+        if self.count() == 0:
             logger.warning("Fallback vector store is empty")
-            return []
+            return [[] for _ in range(len(query_vectors))]
+        if k <= 0:
+            return [[] for _ in range(len(query_vectors))]
 
-        q = np.asarray(query_vector, dtype=np.float32)
-        q_norm = np.linalg.norm(q)
-        if q_norm == 0:
-            q_norm = 1.0
-        q = q / q_norm
+        q = self._normalized(query_vectors)
 
         # vectors are normalized, so dot product is cosine similarity
-        scores = (self.vectors @ q).squeeze()
-        if scores.ndim == 0:
-            scores = np.array([float(scores)])
-        idx_sorted = np.argsort(-scores)[:k]
-
-        results = []
-        for idx in idx_sorted:
-            score = float(scores[int(idx)])
-            doc_name, chunk_index, chunk_text = self.metadata[int(idx)]
-            results.append((int(idx), score, doc_name, int(chunk_index), chunk_text))
-        return results
+        top_idx, top_scores = self._top_k(q, min(k, self.count()))
+
+        # tolist() converts indices and scores to Python ints / floats in one pass each
+        metadata = self.metadata
+        return [
+            [(idx, score, *metadata[idx]) for idx, score in zip(row_idx, row_scores)]
+            for row_idx, row_scores in zip(top_idx.tolist(), top_scores.tolist())
+        ]
+
+    def _top_k(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k rows per normalized (B, D) query, scanning SCORE_BLOCK_ROWS rows at a time.
+
+        Each block's scores are merged into a running (B, k) top-k by partial O(rows)
+        selection, so at most a (B, k + SCORE_BLOCK_ROWS) score buffer exists instead
+        of the full (B, N) matrix; only the final k per query are sorted.
+        Returns (indices, scores), both (B, k), best first.
+        """
+        best_idx = np.empty((len(q), 0), dtype=np.int64)
+        best_scores = np.empty((len(q), 0), dtype=np.float32)
+        for start in range(0, self.count(), SCORE_BLOCK_ROWS):
+            block_scores = self._block_scores(q, start, start + SCORE_BLOCK_ROWS)
+            block_idx, block_scores = self._select_top_k(
+                np.arange(start, start + block_scores.shape[1]), block_scores, k
+            )
+            best_idx, best_scores = self._select_top_k(
+                np.concatenate([best_idx, block_idx], axis=1),
+                np.concatenate([best_scores, block_scores], axis=1),
+                k,
+            )
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_idx, order, axis=1), np.take_along_axis(
+            best_scores, order, axis=1
+        )
+
+    @staticmethod
+    def _select_top_k(
+        idx: np.ndarray, scores: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Keep the k largest scores per row (unordered), with their indices.
+
+        idx is (B, M) or a (M,) index shared by every row; partial O(M) selection,
+        no negated copy of the scores.
+        """
+        m = scores.shape[1]
+        if m <= k:
+            return np.broadcast_to(idx, scores.shape), scores
+        part = np.argpartition(scores, m - k, axis=1)[:, m - k :]
+        top_idx = idx[part] if idx.ndim == 1 else np.take_along_axis(idx, part, axis=1)
+        return top_idx, np.take_along_axis(scores, part, axis=1)
+
+    def _block_scores(self, q: np.ndarray, start: int, end: int) -> np.ndarray:
+        """Score normalized (B, D) queries against stored rows [start, end).
+
+        In fp16 and int8 mode the block is widened to float32 so the dot products
+        still run through BLAS (int8 scores are then rescaled per row); with SimSIMD
+        installed, small batches are scored by its native f16 / i8 kernels instead
+        (int8 queries are quantized like the stored rows), reading 2-4x fewer bytes
+        and skipping the widening copy.
+        """
+        use_simsimd = simsimd is not None and len(q) <= SIMSIMD_MAX_BATCH
+        if self.quantization == "int8":
+            if use_simsimd:
+                q_codes, q_scales = _quantize_rows(q)
+                dots = np.asarray(
+                    simsimd.cdist(q_codes, self.codes[start:end], metric="dot", out_dtype="float32")
+                )
+                return dots * q_scales[:, None] * self.scales[start:end]
+            block = self.codes[start:end].astype(np.float32)
+            return (q @ block.T) * self.scales[start:end]
+        block = self.vectors[start:end]
+        if block.dtype == np.float16 and use_simsimd:
+            return np.asarray(
+                simsimd.cdist(q.astype(np.float16), block, metric="dot", out_dtype="float32")
+            )
+        if block.dtype != np.float32:
+            block = block.astype(np.float32)
+        return q @ block.T
 
     def rebuild_from_cache(self, embeddings: List[Tuple[str, np.ndarray]], metadata: List[Tuple[str, str, int, str]]) -> None:
         """
@@ -101,67 +326,160 @@ class NumpyVectorStore:
             logger.info("No embeddings available to rebuild fallback store")
             return
 
-        ids = [em[0] for em in embeddings]
-        vectors = [em[1] for em in embeddings]
+        # Rows are copied once, straight into the preallocated matrix (as_float32_matrix)
+        ids, rows = zip(*embeddings)
+        self.rebuild_from_matrix(list(ids), rows, metadata)
+
+    def rebuild_from_matrix(
+        self,
+        ids: List[str],
+        vectors: Union[np.ndarray, Sequence[np.ndarray]],
+        metadata: List[Tuple[str, str, int, str]],
+    ) -> None:
+        """
+        Rebuild index from an (N, D) vector matrix without per-vector stacking.
+        ids: one embedding id per matrix row
+        metadata: list of (id, doc_name, chunk_index, chunk_text)
+        """
+        self.reset()
+
+        if len(ids) == 0:
+            logger.info("No embeddings available to rebuild fallback store")
+            return
 
         # Build metadata map
         metadata_map = {row[0]: (row[1], row[2], row[3]) for row in metadata}
+        metas_list = [metadata_map.get(embedding_id, ("unknown", -1, "")) for embedding_id in ids]
 
-        # Add them
-        metas_list = []
-        for embedding_id, vec in zip(ids, vectors):
-            if embedding_id in metadata_map:
-                doc_name, chunk_index, chunk_text = metadata_map[embedding_id]
-            else:
-                doc_name, chunk_index, chunk_text = ("unknown", -1, "")
-            metas_list.append((doc_name, chunk_index, chunk_text))
+        self._append(self._normalized(vectors))
+        self.metadata.extend(metas_list)
+        self.embedding_ids.extend(ids)
+        logger.info(f"Rebuilt fallback store with {self.count()} vectors")
 
-        self.add_vectors(vectors, metas_list, ids)
+    @staticmethod
+    def _array_paths(path: str) -> dict:
+        """Return the .npy file for each stored array (vectors, or int8 codes and scales)."""
+        base = os.path.splitext(path)[0]
+        return {name: f"{base}_{name}.npy" for name in ("vectors", "codes", "scales")}
+
+    @classmethod
+    def _is_saved(cls, path: str) -> bool:
+        """Return whether save (or an older version of it) has written files for path."""
+        base = os.path.splitext(path)[0]
+        saved_paths = [*cls._array_paths(path).values(), base + "_vectors.npz", base + "_meta.json"]
+        return any(os.path.exists(saved_path) for saved_path in saved_paths)
 
     def save(self, path: str) -> None:
-        """Save minimal index (vectors and metadata) to disk as npz + json."""
+        """Save vectors (uncompressed .npy, one file per array) and metadata (json) to disk."""
+        self._consolidate()
         try:
             os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
             base = os.path.splitext(path)[0]
-            vec_path = base + "_vectors.npz"
             meta_path = base + "_meta.json"
-            if self.vectors is not None:
-                np.savez_compressed(vec_path, vectors=self.vectors)
+            arrays = {"vectors": self.vectors, "codes": self.codes, "scales": self.scales}
+            for name, arr_path in self._array_paths(path).items():
+                arr = arrays[name]
+                if arr is None:
+                    # Drop a file left by a store saved in the other quantization mode
+                    if os.path.exists(arr_path):
+                        os.remove(arr_path)
+                    continue
+                # Write aside and rename: the loaded arrays may be memory-mapped from arr_path
+                tmp_path = arr_path + ".tmp"
+                with open(tmp_path, "wb") as fh:
+                    np.save(fh, arr, allow_pickle=False)
+                os.replace(tmp_path, arr_path)
             with open(meta_path, "w", encoding="utf-8") as fh:
-                json.dump({"metadata": self.metadata, "ids": self.embedding_ids}, fh)
-            logger.info(f"Saved fallback index to {vec_path} and {meta_path}")
+                json.dump(
+                    {
+                        "metadata": self.metadata,
+                        "ids": self.embedding_ids,
+                        "quantization": self.quantization,
+                        "embedding_dim": self.embedding_dim,
+                    },
+                    fh,
+                )
+            logger.info(f"Saved fallback index to {base}_*.npy and {meta_path}")
         except Exception:
             logger.exception("Failed to save fallback index")
 
     def load(self, path: str) -> None:
-        """Load saved vectors + metadata if present (expects same naming convention as save)."""
+        """Load saved vectors + metadata if present (expects same naming convention as save).
+
+        The .npy files are memory-mapped read-only, so loading does not read the vectors
+        into memory; the first add copies them into a growable buffer (see _reserve).
+        Vectors saved by older versions as a compressed _vectors.npz are still read.
+        Files saved with another quantization or embedding_dim are not loaded.
+        """
         base = os.path.splitext(path)[0]
-        vec_path = base + "_vectors.npz"
+        paths = self._array_paths(path)
+        legacy_path = base + "_vectors.npz"
         meta_path = base + "_meta.json"
-        if os.path.exists(vec_path):
-            arr = np.load(vec_path)
-            self.vectors = arr["vectors"].astype(np.float32)
+        data = {}
         if os.path.exists(meta_path):
             with open(meta_path, "r", encoding="utf-8") as fh:
                 data = json.load(fh)
-                self.metadata = [tuple(x) for x in data.get("metadata", [])]
-                self.embedding_ids = data.get("ids", [])
+        saved_quantization = data.get("quantization")
+        if saved_quantization is None:
+            # Older files record no config; only int8 codes and float rows are told apart
+            compatible = os.path.exists(paths["codes"]) == (self.quantization == "int8")
+        else:
+            compatible = saved_quantization == self.quantization
+        if not compatible or data.get("embedding_dim", self.embedding_dim) != self.embedding_dim:
+            logger.warning(
+                f"Fallback index at {path} was not saved with quantization="
+                f"{self.quantization}, embedding_dim={self.embedding_dim}; not loading it"
+            )
+            return
+        arrays = None
+        if os.path.exists(paths["codes"]) and os.path.exists(paths["scales"]):
+            arrays = {
+                name: np.load(paths[name], mmap_mode="r", allow_pickle=False)
+                for name in ("codes", "scales")
+            }
+        elif os.path.exists(paths["vectors"]):
+            arrays = {"vectors": np.load(paths["vectors"], mmap_mode="r", allow_pickle=False)}
+        elif os.path.exists(legacy_path):
+            with np.load(legacy_path, allow_pickle=False) as arr:
+                arrays = {name: arr[name] for name in arr.files}
+        if arrays is not None:
+            self._pending = []
+            if "codes" in arrays:
+                self._code_buffer = arrays["codes"]
+                self._scale_buffer = arrays["scales"].astype(np.float32, copy=False)
+                self._size = len(self._code_buffer)
+            else:
+                self._vector_buffer = arrays["vectors"].astype(self._vector_dtype, copy=False)
+                self._size = len(self._vector_buffer)
+            self._sync_views()
+        if data:
+            self.metadata = [tuple(x) for x in data.get("metadata", [])]
+            self.embedding_ids = data.get("ids", [])
 
     def count(self) -> int:
-        """Return the number of vectors in the store."""
+        """Return the number of vectors in the store (including not yet merged batches)."""
+        pending = sum(len(batch) for batch in self._pending)
+        if self.codes is not None:
+            return self.codes.shape[0] + pending
         if self.vectors is None:
-            return 0
-        return self.vectors.shape[0]
+            return pending
+        return self.vectors.shape[0] + pending
 
     def get_stats(self) -> dict:
         return {
             "total_vectors": self.count(),
             "embedding_dim": self.embedding_dim,
             "metadata_count": len(self.metadata),
+            "quantization": self.quantization,
         }
 
     def reset(self) -> None:
-        self.vectors = None
+        self._pending = []
+        self._vector_buffer = None
+        self._code_buffer = None
+        self._scale_buffer = None
+        self._size = 0
+        self._sync_views()
         self.metadata.clear()
         self.embedding_ids.clear()
         logger.info("Reset fallback vector store")
@@ -75,3 +75,25 @@ class TestDocumentChunking:
 
         assert len(chunks) == 1
         assert chunks[0] == text
+
+    def test_long_paragraph_does_not_repeat_previous_chunk(self):
+        """Test text before a long paragraph is emitted once, not re-added after it."""
+        text = "Intro paragraph.\n\n" + " ".join(["word"] * 300) + "\n\nOutro paragraph."
+        chunks = self.extractor.chunk_text(text, chunk_size_tokens=100, overlap_tokens=10)
+
+        assert chunks[-1].endswith("Outro paragraph.")
+        assert "Intro paragraph." not in chunks[-1]
+
+    def test_long_text_split_terminates_when_overlap_exceeds_size(self):
+        """Test character splitting advances even if overlap is not smaller than chunk size."""
+        assert self.extractor._chunk_long_text("abcdefghij", 4, 1) == ["abcd", "defg", "ghij", "j"]
+        assert self.extractor._chunk_long_text("abcdefghij", 4, 4) == ["abcd", "efgh", "ij"]
+
+    def test_load_documents_order(self, tmp_path):
+        """Test markdown files load before text files, each sorted by name."""
+        for name in ["b.txt", "a.txt", "z.md", "c.md", "ignored.pdf"]:
+            (tmp_path / name).write_text(name, encoding="utf-8")
+
+        documents = self.extractor.load_documents(str(tmp_path))
+        assert [name for name, _ in documents] == ["c.md", "z.md", "a.txt", "b.txt"]
+        assert documents[0][1] == "c.md"
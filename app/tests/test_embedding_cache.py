@@ -6,7 +6,7 @@ import tempfile
 import os
 import numpy as np
 import pytest
-from app.rag.embedder import EmbeddingCache
+from app.rag.embedder import EmbeddingCache, hash_content
 
 
 class TestEmbeddingCache:
@@ -20,8 +20,10 @@ class TestEmbeddingCache:
 
     def teardown_method(self):
         """Clean up test fixtures."""
-        if os.path.exists(self.temp_db.name):
-            os.unlink(self.temp_db.name)
+        self.cache.close()
+        for path in (self.temp_db.name, self.cache.snapshot_path):
+            if os.path.exists(path):
+                os.unlink(path)
 
     def test_cache_initialization(self):
         """Test cache is initialized properly."""
@@ -54,6 +56,45 @@ class TestEmbeddingCache:
             assert isinstance(vector, np.ndarray)
             assert vector.shape == (384,)
 
+    def test_get_all_vectors_matrix(self):
+        """Test bulk vector loading into a single float32 matrix."""
+        chunks = ["chunk1", "chunk2", "chunk3"]
+        vectors = [np.random.randn(384) for _ in chunks]
+        self.cache.add_embeddings("test.md", chunks, vectors)
+
+        ids, matrix = self.cache.get_all_vectors_matrix()
+        assert ids == [row[0] for row in self.cache.get_all_vectors()]
+        assert matrix.shape == (3, 384)
+        assert matrix.dtype == np.float32
+        np.testing.assert_array_almost_equal(matrix, np.vstack(vectors))
+
+    def test_get_vectors_by_doc(self):
+        """Test a document's vectors load as one matrix in chunk order."""
+        vectors = [np.random.randn(384) for _ in range(3)]
+        self.cache.add_embeddings("test.md", ["chunk1", "chunk2", "chunk3"], vectors)
+        self.cache.add_embeddings("other.md", ["chunk4"], [np.random.randn(384)])
+
+        matrix = self.cache.get_vectors_by_doc("test.md")
+        assert matrix.shape == (3, 384)
+        np.testing.assert_array_almost_equal(matrix, np.vstack(vectors))
+        assert self.cache.get_vectors_by_doc("missing.md").shape == (0, 384)
+
+    def test_matrix_snapshot_memory_mapped(self):
+        """Test reloads mmap the matrix snapshot until a write invalidates it."""
+        vectors = [np.random.randn(384) for _ in range(2)]
+        self.cache.add_embeddings("test.md", ["chunk1", "chunk2"], vectors)
+        _, first = self.cache.get_all_vectors_matrix()
+        assert not isinstance(first, np.memmap)
+
+        _, mapped = EmbeddingCache(self.temp_db.name).get_all_vectors_matrix()
+        assert isinstance(mapped, np.memmap)
+        np.testing.assert_array_equal(mapped, first)
+
+        self.cache.add_embeddings("other.md", ["chunk3"], [np.random.randn(384)])
+        ids, matrix = self.cache.get_all_vectors_matrix()
+        assert not isinstance(matrix, np.memmap)
+        assert matrix.shape == (3, 384) and len(ids) == 3
+
     def test_vector_serialization(self):
         """Test vector to blob conversion and back."""
         vector = np.random.randn(384)
@@ -115,6 +156,34 @@ class TestEmbeddingCache:
         all_vectors = self.cache.get_all_vectors()
         assert len(all_vectors) == 0
 
+    def test_doc_hash_stored_per_document(self):
+        """Test the chunk-set hash is recorded on insert and dropped on delete."""
+        from app.rag.embedder import hash_chunks
+
+        chunks = ["chunk1", "chunk2"]
+        self.cache.add_embeddings("test.md", chunks, [np.random.randn(384) for _ in chunks])
+
+        assert self.cache.get_doc_hash("test.md") == hash_chunks(chunks)
+        assert self.cache.get_doc_hash("other.md") is None
+
+        self.cache.delete_doc("test.md")
+        assert self.cache.get_doc_hash("test.md") is None
+
+    def test_replace_documents(self):
+        """Test several documents are replaced together, dropping stale chunks."""
+        self.cache.add_embeddings("doc1.md", ["old1", "old2"], [np.random.randn(384)] * 2)
+
+        added = self.cache.replace_documents(
+            [
+                ("doc1.md", ["new1"], [np.random.randn(384)]),
+                ("doc2.md", ["chunk1", "chunk2"], [np.random.randn(384)] * 2),
+            ]
+        )
+
+        assert added == 3
+        texts = [row[3] for row in self.cache.get_all_metadata()]
+        assert sorted(texts) == ["chunk1", "chunk2", "new1"]
+
     def test_duplicate_embedding_prevention(self):
         """Test that duplicate embeddings are not added."""
         doc_name = "test.md"
@@ -140,3 +209,97 @@ class TestEmbeddingCache:
         assert result is not None
         doc_name, chunk_text, chunk_index = result
         assert chunk_text == "chunk1"
+
+        # Positions follow row order after a document is removed
+        self.cache.delete_doc("doc1.md")
+        assert self.cache.find_chunk_by_index(0) == ("doc2.md", "chunk3", 0)
+        assert self.cache.find_chunk_by_index(1) is None
+
+    def test_vectors_stored_as_raw_float32(self):
+        """Test vectors are stored without pickle framing and the dimension is recorded."""
+        vector = np.random.randn(384)
+        assert len(self.cache._vector_to_blob(vector)) == 384 * 4
+
+        self.cache.add_embeddings("test.md", ["chunk1"], [vector])
+        assert self.cache.embedding_dim == 384
+        assert EmbeddingCache(self.temp_db.name).embedding_dim == 384
+
+        _, recovered = self.cache.get_all_vectors()[0]
+        assert recovered.dtype == np.float32
+        np.testing.assert_array_almost_equal(vector, recovered)
+
+    def test_int8_vector_format(self):
+        """Test int8 storage is 4x smaller and converts existing float32 rows."""
+        vectors = [np.random.randn(384) for _ in range(2)]
+        vectors = [v / np.linalg.norm(v) for v in vectors]
+        self.cache.add_embeddings("test.md", ["chunk1", "chunk2"], vectors)
+        self.cache.close()
+
+        self.cache = EmbeddingCache(self.temp_db.name, vector_format="int8")
+        assert len(self.cache._vector_to_blob(vectors[0])) == 4 + 384
+
+        _, matrix = self.cache.get_all_vectors_matrix()
+        np.testing.assert_allclose(matrix, np.vstack(vectors), atol=0.01)
+
+    def test_migrates_pickled_vectors(self):
+        """Test caches from the old per-chunk schema with pickled vectors are migrated."""
+        import pickle
+        import sqlite3
+
+        self.cache.close()
+        os.unlink(self.temp_db.name)
+
+        vector = np.random.randn(384)
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute(
+            "CREATE TABLE embeddings (id TEXT PRIMARY KEY, doc_name TEXT, chunk_index INTEGER, "
+            "chunk_text TEXT, vector BLOB, created_at TIMESTAMP)"
+        )
+        conn.executemany(
+            "INSERT INTO embeddings (id, doc_name, chunk_index, chunk_text, vector) "
+            "VALUES (?, ?, 0, 'chunk', ?)",
+            [
+                ("legacy1", "old.md", pickle.dumps(vector)),
+                ("legacy2", "copy.md", pickle.dumps(vector)),
+            ],
+        )
+        conn.commit()
+        conn.close()
+
+        self.cache = EmbeddingCache(self.temp_db.name)
+        embedding_id, recovered = self.cache.get_all_vectors()[0]
+        np.testing.assert_array_almost_equal(vector, recovered)
+        assert embedding_id == self.cache._generate_id("old.md", 0)
+        assert self.cache._query("SELECT COUNT(*) FROM embeddings")[0][0] == 1
+        assert self.cache.get_doc_hash("copy.md") is not None
+        assert self.cache._query("SELECT value FROM meta WHERE key = 'embedding_dim'") == [
+            ("384",)
+        ]
+
+        # A reopened migrated cache reads matrices without any new rows being inserted
+        self.cache.close()
+        self.cache = EmbeddingCache(self.temp_db.name)
+        assert self.cache.embedding_dim == 384
+        ids, matrix = self.cache.get_all_vectors_matrix()
+        assert matrix.shape == (2, 384)
+        np.testing.assert_array_almost_equal(matrix[0], vector)
+        doc_matrix = self.cache.get_vectors_by_doc("copy.md")
+        assert doc_matrix.shape == (1, 384)
+        np.testing.assert_array_almost_equal(doc_matrix[0], vector)
+
+    def test_shared_chunks_stored_once(self):
+        """Test chunk text shared by documents keeps one vector until its last reference goes."""
+        vector = np.random.randn(384)
+        self.cache.add_embeddings("a.md", ["footer"], [vector])
+        self.cache.add_embeddings("b.md", ["footer"], [None])
+
+        assert self.cache.known_content_hashes([hash_content("footer")]) == {hash_content("footer")}
+        assert self.cache._query("SELECT COUNT(*) FROM embeddings")[0][0] == 1
+        ids, matrix = self.cache.get_all_vectors_matrix()
+        assert len(ids) == 2
+        np.testing.assert_array_almost_equal(matrix[0], matrix[1])
+
+        self.cache.delete_doc("a.md")
+        assert len(self.cache.get_all_vectors()) == 1
+        self.cache.delete_doc("b.md")
+        assert self.cache._query("SELECT COUNT(*) FROM embeddings")[0][0] == 0
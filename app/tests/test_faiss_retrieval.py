@@ -6,7 +6,18 @@ import tempfile
 import os
 import numpy as np
 import pytest
+from app.rag import vector_store
 from app.rag.vector_store import FAISSVectorStore
+from app.rag.vector_store_fallback import NumpyVectorStore, as_float32_matrix
+
+
+def _corpus(n, dim, seed=0):
+    """Seeded unit-norm (N, D) vectors with ids and rebuild metadata, one per row."""
+    vectors = np.random.default_rng(seed).standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"id{i}" for i in range(n)]
+    metadata = [(f"id{i}", "doc.md", i, f"chunk{i}") for i in range(n)]
+    return ids, vectors, metadata
 
 
 class TestFAISSVectorStore:
@@ -67,6 +78,47 @@ class TestFAISSVectorStore:
         assert chunk_text == "chunk1"
         assert score > 0.9  # High similarity to itself
 
+    def test_search_batch(self):
+        """Test a batched search returns the same results as per-query searches."""
+        _, vectors, _ = _corpus(5, self.embedding_dim)
+        metadata = [("doc.md", i, f"chunk{i}") for i in range(5)]
+        self.vector_store.add_vectors(list(vectors), metadata, [f"id{i}" for i in range(5)])
+
+        batch = self.vector_store.search_batch(vectors[[3, 1]], k=2)
+        assert len(batch) == 2
+        assert batch[0] == self.vector_store.search(vectors[3], k=2)
+        assert batch[1][0][4] == "chunk1"
+
+    def test_rebuild_from_matrix(self):
+        """Test rebuilding the index from an (N, D) matrix keeps metadata aligned."""
+        vectors = np.eye(3, self.embedding_dim, dtype=np.float32)
+        ids = ["id1", "id2", "id3"]
+        metadata = [("id1", "doc1.md", 0, "chunk1"), ("id3", "doc2.md", 0, "chunk3")]
+
+        self.vector_store.rebuild_from_matrix(ids, vectors, metadata)
+
+        assert self.vector_store.get_stats()["total_vectors"] == 3
+        assert self.vector_store.metadata[1] == ("unknown", -1, "")
+        _, _, doc_name, _, chunk_text = self.vector_store.search(vectors[2], k=1)[0]
+        assert (doc_name, chunk_text) == ("doc2.md", "chunk3")
+
+        # Metadata in another order than the ids is matched up by id
+        self.vector_store.rebuild_from_cache(
+            [("id3", vectors[2]), ("id1", vectors[0])], metadata
+        )
+        assert self.vector_store.metadata == [("doc2.md", 0, "chunk3"), ("doc1.md", 0, "chunk1")]
+
+    def test_int8_quantized_index(self):
+        """Test the 8-bit scalar-quantized index ranks like the exact one."""
+        ids, vectors, metadata = _corpus(50, self.embedding_dim)
+
+        store = FAISSVectorStore(embedding_dim=self.embedding_dim, quantization="int8")
+        store.rebuild_from_matrix(ids, vectors, metadata)
+
+        _, score, _, chunk_index, _ = store.search(vectors[7], k=1)[0]
+        assert chunk_index == 7
+        assert score == pytest.approx(1.0, abs=0.05)
+
     def test_search_empty_store(self):
         """Test searching in empty store."""
         query_vector = np.random.randn(self.embedding_dim)
@@ -106,6 +158,22 @@ class TestFAISSVectorStore:
             # Create new store and load
             new_store = FAISSVectorStore(embedding_dim=self.embedding_dim, index_path=index_path)
             assert new_store.index.ntotal == 3
+            assert new_store.metadata == metadata
+            assert new_store.embedding_ids == ids
+            assert new_store.search(vectors[2], k=1)[0][4] == "chunk2"
+
+            # Metadata written for another version of the index file is ignored
+            stat = os.stat(index_path)
+            os.utime(index_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            stale_store = FAISSVectorStore(embedding_dim=self.embedding_dim, index_path=index_path)
+            assert stale_store.index.ntotal == 3 and stale_store.embedding_ids == []
+            assert not os.path.exists(index_path + ".tmp")
+
+            # An index saved with another configuration is not loaded
+            hnsw_store = FAISSVectorStore(
+                embedding_dim=self.embedding_dim, index_path=index_path, index_type="hnsw"
+            )
+            assert hnsw_store.index.ntotal == 0
 
     def test_get_stats(self):
         """Test getting vector store statistics."""
@@ -143,3 +211,359 @@ class TestFAISSVectorStore:
         # v1 and v3 should have highest similarity, v2 should be different
         scores = [r[1] for r in results]
         assert scores[0] > scores[1]  # v1 similar to itself
+
+    def test_vectors_normalized_by_store(self):
+        """Test unnormalized inputs score as cosine similarity and callers' arrays are untouched."""
+        vectors = _corpus(5, self.embedding_dim)[1] * 10
+        original = vectors.copy()
+        self.vector_store.add_vectors(
+            vectors, [("doc.md", i, f"c{i}") for i in range(5)], [f"id{i}" for i in range(5)]
+        )
+        query = np.ascontiguousarray(vectors[2] * 3)
+        query.flags.writeable = False
+
+        _, score, _, chunk_index, _ = self.vector_store.search(query, k=1)[0]
+        assert chunk_index == 2
+        assert score == pytest.approx(1.0, abs=1e-5)
+        np.testing.assert_array_equal(vectors, original)
+
+    @pytest.mark.parametrize("index_type", ["hnsw", "ivf"])
+    def test_approximate_index_types(self, index_type):
+        """Test HNSW and IVF indexes find each stored vector as its own nearest neighbour."""
+        ids, vectors, metadata = _corpus(200, self.embedding_dim)
+
+        store = FAISSVectorStore(embedding_dim=self.embedding_dim, index_type=index_type)
+        store.rebuild_from_matrix(ids, vectors, metadata)
+
+        assert store.get_stats()["index_type"] == index_type
+        assert store.index.ntotal == 200
+        for i in (0, 57, 199):
+            assert store.search(vectors[i], k=1)[0][3] == i
+
+    @pytest.mark.parametrize(
+        "index_type,quantization",
+        [
+            ("flat", "pq"),
+            ("ivf", "pq"),
+            ("hnsw", "int8"),
+            ("ivf", "int8"),
+            ("flat", "fp16"),
+            ("hnsw", "fp16"),
+        ],
+    )
+    def test_quantized_index_types(self, index_type, quantization):
+        """Test quantized indexes train on rebuild and keep stored vectors near the top."""
+        ids, vectors, metadata = _corpus(2048, self.embedding_dim)
+
+        store = FAISSVectorStore(
+            embedding_dim=self.embedding_dim, index_type=index_type, quantization=quantization
+        )
+        store.rebuild_from_matrix(ids, vectors, metadata)
+
+        assert store.index.is_trained and store.index.ntotal == 2048
+        for i in (0, 1000):
+            assert i in [hit[3] for hit in store.search(vectors[i], k=10)]
+
+    def test_sharded_flat_index(self, monkeypatch):
+        """Test large flat indexes are sharded across threads, saved merged and re-sharded."""
+        monkeypatch.setattr(vector_store, "SHARD_MIN_VECTORS", 10)
+        ids, vectors, metadata = _corpus(40, self.embedding_dim)
+
+        store = FAISSVectorStore(embedding_dim=self.embedding_dim, search_threads=4)
+        store.rebuild_from_matrix(ids, vectors, metadata)
+        assert store.get_stats()["shards"] == 4
+        assert [store.search(vectors[i], k=1)[0][3] for i in (0, 15, 39)] == [0, 15, 39]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "index.bin")
+            store.save(path)
+            reloaded = FAISSVectorStore(embedding_dim=self.embedding_dim)
+            reloaded.load(path)
+            assert reloaded.index.ntotal == 40
+            assert int(reloaded.index.search(vectors[15:16], 1)[1][0][0]) == 15
+
+            resharded = FAISSVectorStore(embedding_dim=self.embedding_dim, search_threads=4)
+            resharded.load(path)
+            assert resharded.get_stats()["shards"] == 4
+            assert [resharded.search(vectors[i], k=1)[0][3] for i in (0, 15, 39)] == [0, 15, 39]
+
+    def test_add_after_sharded_rebuild(self, monkeypatch):
+        """Test vectors can be added to an index rebuilt as shards."""
+        monkeypatch.setattr(vector_store, "SHARD_MIN_VECTORS", 10)
+        ids, vectors, metadata = _corpus(50, self.embedding_dim)
+
+        store = FAISSVectorStore(embedding_dim=self.embedding_dim, search_threads=4)
+        store.rebuild_from_matrix(ids[:40], vectors[:40], metadata[:40])
+        store.add_vectors(
+            vectors[40:],
+            [("new.md", i, f"new{i}") for i in range(10)],
+            [f"new{i}" for i in range(10)],
+        )
+
+        assert store.index.ntotal == 50
+        assert store.get_stats()["shards"] == 4
+        # Only the last shard is added to; the others keep their rows
+        assert [store.index.at(i).ntotal for i in range(4)] == [10, 10, 10, 20]
+        assert [store.search(vectors[i], k=1)[0][3] for i in (0, 15, 39)] == [0, 15, 39]
+        assert store.search(vectors[45], k=1)[0][2:4] == ("new.md", 5)
+
+    @pytest.mark.parametrize("quantization", ["none", "fp16", "int8"])
+    def test_ivf_index_memory_mapped_on_load(self, quantization):
+        """Test a saved IVF index is loaded memory-mapped, refuses adds and can be saved over."""
+        ids, vectors, metadata = _corpus(1024, self.embedding_dim)
+        store = FAISSVectorStore(
+            embedding_dim=self.embedding_dim, index_type="ivf", quantization=quantization
+        )
+        store.rebuild_from_matrix(ids, vectors, metadata)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "index.bin")
+            store.save(path)
+            mapped = FAISSVectorStore(
+                embedding_dim=self.embedding_dim,
+                index_path=path,
+                index_type="ivf",
+                quantization=quantization,
+            )
+            assert mapped.index.ntotal == 1024
+            invlists = vector_store.faiss.downcast_InvertedLists(mapped.index.invlists)
+            assert isinstance(invlists, vector_store.faiss.OnDiskInvertedLists)
+            mapped._extend_metadata(store.metadata)
+            assert mapped.search(vectors[5], k=1)[0][3] == 5
+
+            # The mapped lists are read-only, so adding to them is refused
+            with pytest.raises(ValueError, match="rebuild_from_matrix"):
+                mapped.add_vectors(vectors[:1], [("new.md", 0, "new")], ["n0"])
+            assert mapped.index.ntotal == 1024
+
+            # Overwrite the file the loaded index is still mapped from
+            store.save(path)
+            assert mapped.search(vectors[5], k=1)[0][3] == 5
+
+    def test_falls_back_to_numpy_without_faiss(self, monkeypatch):
+        """Test constructing the store without faiss installed gives the NumPy store."""
+        monkeypatch.setattr(vector_store, "_import_faiss", lambda: None)
+        store = FAISSVectorStore(embedding_dim=8, quantization="int8")
+        assert isinstance(store, NumpyVectorStore) and store.quantization == "int8"
+
+    def test_pq_small_corpus_falls_back(self):
+        """Test corpora too small to train PQ codebooks get an unquantized index."""
+        store = FAISSVectorStore(embedding_dim=self.embedding_dim, quantization="pq")
+        vectors = np.eye(3, self.embedding_dim, dtype=np.float32)
+        store.rebuild_from_matrix(
+            ["a", "b", "c"], vectors, [("a", "d", 0, "x"), ("b", "d", 1, "y"), ("c", "d", 2, "z")]
+        )
+        assert store.search(vectors[1], k=1)[0][4] == "y"
+
+        with pytest.raises(ValueError):
+            FAISSVectorStore(embedding_dim=self.embedding_dim, index_type="hnsw", quantization="pq")
+
+
+class TestNumpyVectorStore:
+    """Tests for the NumPy fallback vector store."""
+
+    def test_as_float32_matrix(self):
+        """Test float32 matrices pass through uncopied and row lists are packed once."""
+        matrix = np.random.randn(4, 8).astype(np.float32)
+        assert as_float32_matrix(matrix, 8) is matrix
+
+        packed = as_float32_matrix([np.random.randn(8) for _ in range(3)], 8)
+        assert packed.shape == (3, 8) and packed.dtype == np.float32
+        assert packed.flags.c_contiguous
+        assert as_float32_matrix([], 8).shape == (0, 8)
+        with pytest.raises(ValueError):
+            as_float32_matrix(matrix, 16)
+
+    def test_search_rejects_wrong_dimension(self):
+        """Test a query of the wrong dimension raises instead of being reshaped."""
+        for store_class in (NumpyVectorStore, FAISSVectorStore):
+            store = store_class(embedding_dim=8)
+            store.add_vectors([np.ones(8, dtype=np.float32)], [("d", 0, "t")], ["id0"])
+            assert store.search(np.ones(8, dtype=np.float32), k=1)[0][4] == "t"
+            with pytest.raises(ValueError):
+                store.search(np.ones(16, dtype=np.float32), k=1)
+
+    def test_search_batch_matches_faiss(self):
+        """Test the fallback's batched search ranks like the FAISS store, given a row list."""
+        ids, vectors, metadata = _corpus(20, 8)
+        fallback = NumpyVectorStore(embedding_dim=8)
+        fallback.rebuild_from_matrix(ids, vectors, metadata)
+        faiss_store = FAISSVectorStore(embedding_dim=8)
+        faiss_store.rebuild_from_matrix(ids, vectors, metadata)
+
+        queries = [vectors[3], vectors[11]]
+        for ours, theirs in zip(
+            fallback.search_batch(queries, k=4), faiss_store.search_batch(queries, k=4)
+        ):
+            assert [hit[0] for hit in ours] == [int(hit[0]) for hit in theirs]
+
+        # k past the corpus size returns every row, best first
+        scores = [hit[1] for hit in fallback.search(vectors[3], k=25)]
+        assert len(scores) == 20 and scores == sorted(scores, reverse=True)
+        assert fallback.search(vectors[3], k=0) == []
+
+    def test_rebuild_does_not_modify_caller_matrix(self):
+        """Test normalization never writes into the caller's (possibly read-only) matrix."""
+        vectors = _corpus(5, 8)[1] * 3
+        vectors.flags.writeable = False
+        store = NumpyVectorStore(embedding_dim=8)
+        store.rebuild_from_matrix(
+            [f"id{i}" for i in range(5)], vectors, [(f"id{i}", "d", i, "t") for i in range(5)]
+        )
+        assert store.search(vectors[2], k=1)[0][0] == 2
+        np.testing.assert_allclose(np.linalg.norm(store.vectors, axis=1), 1.0, rtol=1e-5)
+
+    @pytest.mark.parametrize("use_simsimd", [False, True])
+    def test_int8_search_matches_float32(self, monkeypatch, use_simsimd):
+        """Test int8 storage ranks like exact float32 search and round-trips through save."""
+        if use_simsimd:
+            pytest.importorskip("simsimd")
+        else:
+            monkeypatch.setattr("app.rag.vector_store_fallback.simsimd", None)
+        ids, vectors, metadata = _corpus(50, 64)
+
+        exact = NumpyVectorStore(embedding_dim=64)
+        exact.rebuild_from_matrix(ids, vectors, metadata)
+        quantized = NumpyVectorStore(embedding_dim=64, quantization="int8")
+        quantized.rebuild_from_matrix(ids, vectors, metadata)
+
+        queries = vectors[[7, 21]]
+        for exact_hits, int8_hits in zip(
+            exact.search_batch(queries, k=5), quantized.search_batch(queries, k=5)
+        ):
+            assert int8_hits[0][0] == exact_hits[0][0]
+            assert abs(int8_hits[0][1] - exact_hits[0][1]) < 0.02
+        assert quantized.codes.dtype == np.int8 and quantized.vectors is None
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "index.bin")
+            quantized.save(path)
+            reloaded = NumpyVectorStore(embedding_dim=64, quantization="int8")
+            reloaded.load(path)
+            assert reloaded.count() == 50
+            assert reloaded.search(vectors[7], k=1)[0][3] == 7
+
+    def test_numpy_store_memory_maps_saved_vectors(self):
+        """Test fallback vectors are saved as .npy, memory-mapped on load and copied on add."""
+        ids, vectors, metadata = _corpus(20, 16)
+        store = NumpyVectorStore(embedding_dim=16)
+        store.rebuild_from_matrix(ids, vectors, metadata)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "index.bin")
+            store.save(path)
+            vec_path = os.path.join(tmp_dir, "index_vectors.npy")
+            saved = np.load(vec_path)
+
+            assert not os.path.exists(path)
+            reloaded = NumpyVectorStore(embedding_dim=16, index_path=path)
+            assert reloaded.count() == 20 and reloaded.embedding_ids == ids
+            assert isinstance(reloaded.vectors, np.memmap)
+            assert reloaded.search(vectors[3], k=1)[0][3] == 3
+
+            reloaded.add_vectors(
+                vectors[:2], [("new.md", i, "new") for i in range(2)], ["n0", "n1"]
+            )
+            assert reloaded.search(vectors[0], k=2)[1][2] == "new.md"
+            assert not isinstance(reloaded.vectors, np.memmap)
+            np.testing.assert_array_equal(np.load(vec_path), saved)
+            reloaded.save(path)
+            assert np.load(vec_path).shape == (22, 16)
+
+            # Vectors written by older versions as a compressed npz still load
+            os.remove(vec_path)
+            np.savez_compressed(os.path.join(tmp_dir, "index_vectors.npz"), vectors=saved)
+            legacy = NumpyVectorStore(embedding_dim=16)
+            legacy.load(path)
+            assert legacy.count() == 20
+
+    @pytest.mark.parametrize("saved,loaded", [("none", "int8"), ("int8", "none"), ("int8", "fp16")])
+    def test_load_refuses_other_quantization(self, saved, loaded):
+        """Test files saved in another quantization mode are not loaded (nor then searched)."""
+        ids, vectors, metadata = _corpus(20, 16)
+        store = NumpyVectorStore(embedding_dim=16, quantization=saved)
+        store.rebuild_from_matrix(ids, vectors, metadata)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "index.bin")
+            store.save(path)
+            other = NumpyVectorStore(embedding_dim=16, quantization=loaded)
+            other.load(path)
+            assert other.count() == 0 and other.embedding_ids == []
+            assert other.search(vectors[3], k=1) == []
+
+            other.add_vectors(vectors[:2], [("new.md", i, "new") for i in range(2)], ["n0", "n1"])
+            assert other.search(vectors[1], k=1)[0][:1] == (1,)
+
+            wider = NumpyVectorStore(embedding_dim=32, quantization=saved)
+            wider.load(path)
+            assert wider.count() == 0
+
+    @pytest.mark.parametrize("use_simsimd", [False, True])
+    def test_fp16_search_matches_float32(self, monkeypatch, use_simsimd):
+        """Test fp16 storage halves memory and scores like float32 across score blocks."""
+        if use_simsimd:
+            pytest.importorskip("simsimd")
+        else:
+            monkeypatch.setattr("app.rag.vector_store_fallback.simsimd", None)
+        monkeypatch.setattr("app.rag.vector_store_fallback.SCORE_BLOCK_ROWS", 64)
+        ids, vectors, metadata = _corpus(300, 32)
+
+        exact = NumpyVectorStore(embedding_dim=32)
+        exact.rebuild_from_matrix(ids, vectors, metadata)
+        half = NumpyVectorStore(embedding_dim=32, quantization="fp16")
+        half.rebuild_from_matrix(ids[:200], vectors[:200], metadata)
+        half.add_vectors(vectors[200:], [m[1:] for m in metadata[200:]], ids[200:])
+
+        queries = vectors[[7, 250]]
+        for exact_hits, half_hits in zip(
+            exact.search_batch(queries, k=3), half.search_batch(queries, k=3)
+        ):
+            assert [hit[0] for hit in half_hits] == [hit[0] for hit in exact_hits]
+            assert half_hits[0][1] == pytest.approx(exact_hits[0][1], abs=1e-3)
+        assert half.vectors.dtype == np.float16 and half.vectors.shape == (300, 32)
+
+    def test_blockwise_top_k_matches_full_sort(self, monkeypatch):
+        """Test the running top-k over score blocks equals a full sort of all scores."""
+        monkeypatch.setattr("app.rag.vector_store_fallback.SCORE_BLOCK_ROWS", 7)
+        ids, vectors, metadata = _corpus(50, 16)
+        store = NumpyVectorStore(embedding_dim=16)
+        store.rebuild_from_matrix(ids, vectors, metadata)
+
+        _, queries, _ = _corpus(3, 16, seed=1)
+        for query, hits in zip(queries, store.search_batch(queries, k=10)):
+            expected = np.argsort(-(vectors @ query))[:10].tolist()
+            assert [hit[0] for hit in hits] == expected
+
+    def test_added_batches_merged_on_first_search(self):
+        """Test add_vectors queues batches and the first search merges them once."""
+        store = NumpyVectorStore(embedding_dim=16)
+        _, vectors, _ = _corpus(9, 16)
+        for start in range(0, 9, 3):
+            rows = range(start, start + 3)
+            store.add_vectors(
+                list(vectors[start : start + 3]),
+                [("doc.md", i, f"chunk{i}") for i in rows],
+                [f"id{i}" for i in rows],
+            )
+
+        assert store.count() == 9 and store.vectors is None
+        assert store.search(vectors[8], k=1)[0][0] == 8
+        assert store.vectors.shape == (9, 16) and store.count() == 9
+
+    @pytest.mark.parametrize("quantization", ["none", "int8"])
+    def test_interleaved_adds_grow_capacity_geometrically(self, quantization):
+        """Test adds between searches reuse spare capacity instead of re-copying rows."""
+        store = NumpyVectorStore(embedding_dim=16, quantization=quantization)
+        _, vectors, _ = _corpus(64, 16)
+        buffer, reallocations = None, 0
+        for i in range(64):
+            store.add_vectors([vectors[i]], [("doc.md", i, f"chunk{i}")], [f"id{i}"])
+            assert store.search(vectors[i], k=1)[0][0] == i
+            stored = store.codes if quantization == "int8" else store.vectors
+            assert stored.shape == (i + 1, 16)
+            if stored.base is not buffer:
+                buffer, reallocations = stored.base, reallocations + 1
+        # One allocation per doubling (1, 2, 4, ..., 64), not one per add
+        assert reallocations <= 7
+        assert store.search(vectors[5], k=1)[0][0] == 5
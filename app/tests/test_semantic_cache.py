@@ -0,0 +1,82 @@
+"""
+Unit tests for the semantic answer cache.
+"""
+import asyncio
+
+import numpy as np
+from app.llm.semantic_cache import SemanticCache
+
+
+class FakeEmbedder:
+    """Deterministic bag-of-words embedder for tests."""
+
+    vocab = ["what", "is", "the", "refund", "policy", "vacation", "days", "?"]
+
+    def embed_texts(self, texts):
+        vectors = []
+        for text in texts:
+            vec = np.zeros(len(self.vocab), dtype=np.float32)
+            for word in text.lower().replace("?", " ?").split():
+                if word in self.vocab:
+                    vec[self.vocab.index(word)] += 1.0
+            vectors.append(vec / (np.linalg.norm(vec) + 1e-9))
+        return vectors
+
+
+class TestSemanticCache:
+    """Tests for semantic cache."""
+
+    def setup_method(self):
+        """Set up test fixtures."""
+        self.cache = SemanticCache(FakeEmbedder(), max_entries=2, threshold=0.95)
+        self.result = {"text": "30 days", "usage": {"total_tokens": 10}}
+
+    def _store(self, query, context_key="ctx", result=None):
+        async def run():
+            _, vector = await self.cache.get(query, context_key)
+            await self.cache.put(vector, query, context_key, result or self.result)
+
+        asyncio.run(run())
+
+    def _get(self, query, context_key="ctx"):
+        return asyncio.run(self.cache.get(query, context_key))[0]
+
+    def test_miss_on_empty_cache(self):
+        """Test lookup on an empty cache."""
+        assert self._get("What is the refund policy?") is None
+
+    def test_hit_on_similar_query(self):
+        """Test near-identical queries are served from cache."""
+        self._store("What is the refund policy?")
+
+        cached = self._get("what is the refund policy?")
+        assert cached is not None
+        assert cached["text"] == "30 days"
+        assert cached["usage"] == {"cached": True}
+
+    def test_context_must_match(self):
+        """Test hits require identical prompt context."""
+        self._store("What is the refund policy?", context_key="ctx-a")
+        assert self._get("What is the refund policy?", context_key="ctx-b") is None
+
+    def test_dissimilar_query_misses(self):
+        """Test unrelated queries are not served."""
+        self._store("What is the refund policy?")
+        assert self._get("vacation days") is None
+
+    def test_lru_eviction(self):
+        """Test least recently used entry is evicted at capacity."""
+        self._store("What is the refund policy?", result={"text": "a", "usage": {}})
+        self._store("vacation days", result={"text": "b", "usage": {}})
+        self._store("the policy", result={"text": "c", "usage": {}})
+
+        assert self.cache.get_stats()["entries"] == 2
+        assert self._get("What is the refund policy?") is None
+        assert self._get("vacation days")["text"] == "b"
+
+    def test_context_key_includes_params(self):
+        """Test generation parameters are part of the context key."""
+        messages = [{"role": "system", "content": "docs"}, {"role": "user", "content": "q"}]
+        key_a = SemanticCache.context_key(messages, max_tokens=256)
+        key_b = SemanticCache.context_key(messages, max_tokens=100)
+        assert key_a != key_b
@@ -69,3 +69,20 @@ class TestVisionService:
         assert isinstance(result["caption"], str)
         assert isinstance(result["tags"], list)
         assert len(result["tags"]) == 3
+
+    def test_pixel_cache_key(self, temp_image):
+        """Test preprocessing cache keys follow image content, not object identity."""
+        from io import BytesIO
+        from app.vision.blip_service import BLIPCaptioningService
+
+        with open(temp_image, "rb") as f:
+            data = f.read()
+        key = BLIPCaptioningService._pixel_cache_key(BytesIO(data))
+        assert key == BLIPCaptioningService._pixel_cache_key(BytesIO(data))
+        assert key != BLIPCaptioningService._pixel_cache_key(BytesIO(data + b"\0"))
+
+        path_key = BLIPCaptioningService._pixel_cache_key(temp_image)
+        stat = os.stat(temp_image)
+        os.utime(temp_image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert BLIPCaptioningService._pixel_cache_key(temp_image) != path_key
+        assert BLIPCaptioningService._pixel_cache_key("/nonexistent/image.jpg") is None
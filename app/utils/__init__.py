@@ -3,5 +3,6 @@
 from app.utils.config import config
 from app.utils.logging import setup_logging, get_logger
 from app.utils.history import HistoryManager
+from app.utils.batcher import MicroBatcher
 
-__all__ = ["config", "setup_logging", "get_logger", "HistoryManager"]
+__all__ = ["config", "setup_logging", "get_logger", "HistoryManager", "MicroBatcher"]
@@ -0,0 +1,130 @@
+"""
+Micro-batching for concurrent requests (LLM generations, image captioning).
+Coalesces calls arriving within a short window and dispatches them together.
+"""
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches for a single dispatch step."""
+
+    def __init__(
+        self,
+        dispatch: Callable[..., Awaitable[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+        batched: bool = False,
+    ):
+        """Initialize micro-batcher.
+
+        Args:
+            dispatch: Coroutine function. Called once per request with that request's
+                args, or, if batched, once per batch with the list of args tuples and
+                returning a list of results in the same order.
+            max_batch_size: Maximum requests per batch.
+            max_wait_ms: Maximum time to wait for a batch to fill after the first request.
+            batched: Whether dispatch handles a whole batch in one call.
+        """
+        self.dispatch = dispatch
+        self.batched = batched
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, *args: Any) -> Any:
+        """Queue a request and wait for its result.
+
+        Args:
+            *args: Positional arguments for dispatch.
+
+        Returns:
+            Result of dispatch(*args).
+        """
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((args, future))
+        return await future
+
+    async def _run(self) -> None:
+        """Background loop: gather batches and dispatch each without blocking the next."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[tuple, asyncio.Future]] = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            self.requests += len(batch)
+            task = asyncio.create_task(self._dispatch_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch_batch(self, batch: List[Tuple[tuple, asyncio.Future]]) -> None:
+        """Dispatch one batch concurrently and fan results out to waiting callers.
+
+        Args:
+            batch: List of (args, future) pairs.
+        """
+        logger.debug(f"Dispatching batch of {len(batch)}")
+        try:
+            if self.batched:
+                try:
+                    results = await self.dispatch([args for args, _ in batch])
+                except Exception as e:
+                    results = [e] * len(batch)
+            else:
+                results = await asyncio.gather(
+                    *(self.dispatch(*args) for args, _ in batch), return_exceptions=True
+                )
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def aclose(self) -> None:
+        """Stop the background loop, failing any queued requests."""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        for task in list(self._inflight):
+            task.cancel()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        while self._queue and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
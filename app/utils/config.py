@@ -4,13 +4,23 @@ Configuration loader from environment variables.
 Handles loading and validation of all configuration parameters.
 """
 import os
-from pathlib import Path
+import functools
 from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def _ensure_dir(path: str) -> None:
+    """Create a directory (and parents) once per process; later calls are cache hits.
+
+    Args:
+        path: Directory to create if missing.
+    """
+    os.makedirs(path, exist_ok=True)
+
+
 class Config:
     """Application configuration loaded from environment variables."""
 
@@ -21,26 +31,65 @@ class Config:
         if not self.telegram_bot_token:
             logger.warning("TELEGRAM_BOT_TOKEN not set")
 
+        # Webhook (polling is used unless USE_WEBHOOK is enabled)
+        self.use_webhook: bool = os.getenv("USE_WEBHOOK", "false").lower() in ("1", "true", "yes")
+        self.public_url: str = os.getenv("PUBLIC_URL", "").rstrip("/")
+        self.webhook_port: int = int(os.getenv("PORT", "8443"))
+
         # LLM Configuration
         self.openai_api_key: Optional[str] = os.getenv("OPENAI_API_KEY")
         self.ollama_url: Optional[str] = os.getenv("OLLAMA_URL")
 
         # Database
         self.database_path: str = os.getenv("DATABASE_PATH", "./data/embeddings.db")
-        Path(self.database_path).parent.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(os.path.dirname(self.database_path) or ".")
 
         # Models
         self.embedding_model: str = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "torch")
+        self.embedding_onnx_file: Optional[str] = os.getenv("EMBEDDING_ONNX_FILE") or None
+        # cpu / cuda / mps; autodetected when unset
+        self.embedding_device: Optional[str] = os.getenv("EMBEDDING_DEVICE") or None
         self.vision_model: str = os.getenv(
             "VISION_MODEL", "Salesforce/blip-image-captioning-base"
         )
+        # Dynamic int8 quantization of the BLIP Linear layers when running on CPU
+        self.vision_quantize: bool = os.getenv("VISION_QUANTIZE", "true").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        # Keep BLIP weights in host RAM and copy them to the GPU only while captioning
+        self.vision_cpu_offload: bool = os.getenv("VISION_CPU_OFFLOAD", "false").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        # float8 storage of BLIP Linear weights on fp8-capable GPUs (Ada / Hopper)
+        self.vision_fp8_weights: bool = os.getenv("VISION_FP8_WEIGHTS", "false").lower() in (
+            "1",
+            "true",
+            "yes",
+        )
 
         # Logging
         self.log_level: str = os.getenv("LOG_LEVEL", "INFO")
 
         # FAISS
         self.faiss_index_path: str = os.getenv("FAISS_INDEX_PATH", "./data/faiss_index.bin")
-        Path(self.faiss_index_path).parent.mkdir(parents=True, exist_ok=True)
+        # "none" (exact float32), "fp16" half-precision index (half the bytes scanned),
+        # "int8" scalar quantization of cache and index, or
+        # "pq" 4-bit product quantization of the FAISS index (flat or ivf)
+        self.vector_quantization: str = os.getenv("VECTOR_QUANTIZATION", "none")
+        # "faiss", or "numpy" for the flat NumPy store (no faiss needed for small corpora)
+        self.vector_store_backend: str = os.getenv("VECTOR_STORE_BACKEND", "faiss")
+        # "flat" (exact), "hnsw" (approximate graph search) or "ivf" (very large corpora)
+        self.vector_index_type: str = os.getenv("VECTOR_INDEX_TYPE", "flat")
+        # Threads scanning a large flat index for one query; CPU count when unset
+        self.vector_search_threads: Optional[int] = (
+            int(os.getenv("VECTOR_SEARCH_THREADS", "0")) or None
+        )
+        _ensure_dir(os.path.dirname(self.faiss_index_path) or ".")
 
         # Chunking
         self.chunk_size_tokens: int = int(os.getenv("CHUNK_SIZE_TOKENS", "400"))
@@ -49,11 +98,23 @@ class Config:
         # RAG
         self.rag_top_k: int = int(os.getenv("RAG_TOP_K", "3"))
         self.rag_max_context_tokens: int = int(os.getenv("RAG_MAX_CONTEXT_TOKENS", "3000"))
+        self.rag_query_cache_size: int = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+        self.rag_batch_size: int = int(os.getenv("RAG_BATCH_SIZE", "16"))
+        self.rag_batch_wait_ms: float = float(os.getenv("RAG_BATCH_WAIT_MS", "10"))
 
         # LLM Generation
         self.llm_max_tokens: int = int(os.getenv("LLM_MAX_TOKENS", "256"))
         self.llm_temperature: float = float(os.getenv("LLM_TEMPERATURE", "0.0"))
         self.llm_timeout_seconds: int = int(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+        self.llm_context_window: int = int(os.getenv("LLM_CONTEXT_WINDOW", "4096"))
+        self.llm_batch_size: int = int(os.getenv("LLM_BATCH_SIZE", "8"))
+        self.llm_batch_wait_ms: float = float(os.getenv("LLM_BATCH_WAIT_MS", "20"))
+
+        # Semantic answer cache
+        self.semantic_cache_size: int = int(os.getenv("SEMANTIC_CACHE_SIZE", "4096"))
+        self.semantic_cache_threshold: float = float(
+            os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")
+        )
 
         # Validate config
         self._validate()
@@ -62,6 +123,8 @@ class Config:
         """Validate configuration parameters."""
         if not self.openai_api_key and not self.ollama_url:
             logger.warning("Neither OPENAI_API_KEY nor OLLAMA_URL is set; LLM calls may fail")
+        if self.use_webhook and not self.public_url:
+            logger.warning("USE_WEBHOOK is enabled but PUBLIC_URL is not set")
 
     def get_llm_provider(self) -> str:
         """Determine which LLM provider to use."""
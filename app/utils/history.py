@@ -3,10 +3,12 @@
 User interaction history management.
 Maintains last 3 interactions per user for summarization and context.
 """
-from typing import Dict, List, Optional, Tuple
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import deque
 from dataclasses import dataclass
-from datetime import datetime
+import itertools
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +17,7 @@ logger = logging.getLogger(__name__)
 class Interaction:
     """A single user interaction."""
 
-    timestamp: datetime
+    timestamp: float  # time.time() seconds; formatted only when displayed
     interaction_type: str  # "image", "chat", "ask"
     content: str
     metadata: Optional[Dict] = None
@@ -31,7 +33,10 @@ class HistoryManager:
             max_per_user: Maximum interactions to keep per user.
         """
         self.max_per_user = max_per_user
-        self.history: Dict[int, List[Interaction]] = {}
+        # deque(maxlen=...) drops the oldest interaction in O(1) once a user has N of them
+        self.history: Dict[int, Deque[Interaction]] = {}
+        # Most recent image interaction still in each user's history, for O(1) lookup
+        self.last_image: Dict[int, Interaction] = {}
 
     def add_interaction(
         self, user_id: int, interaction_type: str, content: str, metadata: Optional[Dict] = None
@@ -44,21 +49,21 @@ class HistoryManager:
             content: The interaction content.
             metadata: Optional metadata (e.g., image filename, tags).
         """
-        if user_id not in self.history:
-            self.history[user_id] = []
-
         interaction = Interaction(
-            timestamp=datetime.now(),
+            timestamp=time.time(),
             interaction_type=interaction_type,
             content=content,
             metadata=metadata,
         )
 
-        self.history[user_id].append(interaction)
-
-        # Keep only the last N interactions
-        if len(self.history[user_id]) > self.max_per_user:
-            self.history[user_id] = self.history[user_id][-self.max_per_user :]
+        user_history = self.history.setdefault(user_id, deque(maxlen=self.max_per_user))
+        if len(user_history) == user_history.maxlen and user_history:
+            # The append below evicts the oldest interaction; forget it if it is the last image
+            if self.last_image.get(user_id) is user_history[0]:
+                del self.last_image[user_id]
+        user_history.append(interaction)
+        if interaction_type == "image":
+            self.last_image[user_id] = interaction
 
         logger.debug(f"Added {interaction_type} interaction for user {user_id}")
 
@@ -71,14 +76,7 @@ class HistoryManager:
         Returns:
             Last image interaction or None.
         """
-        if user_id not in self.history:
-            return None
-
-        for interaction in reversed(self.history[user_id]):
-            if interaction.interaction_type == "image":
-                return interaction
-
-        return None
+        return self.last_image.get(user_id)
 
     def get_last_interactions(self, user_id: int, count: int = 3) -> List[Interaction]:
         """Get the last N interactions for a user.
@@ -93,7 +91,7 @@ class HistoryManager:
         if user_id not in self.history:
             return []
 
-        return list(reversed(self.history[user_id]))[:count]
+        return list(itertools.islice(reversed(self.history[user_id]), count))
 
     def get_context_for_summarization(self, user_id: int) -> str:
         """Get context string for summarization.
@@ -109,12 +107,43 @@ class HistoryManager:
             return ""
 
         context_lines = []
+        localtime = time.localtime
         for i, interaction in enumerate(interactions, 1):
-            timestamp = interaction.timestamp.strftime("%H:%M")
+            timestamp = time.strftime("%H:%M", localtime(interaction.timestamp))
             context_lines.append(f"{i}. [{timestamp}] {interaction.interaction_type}: {interaction.content[:100]}")
 
         return "\n".join(context_lines)
 
+    def build_local_summary(self, user_id: int, max_chars: int = 400) -> Optional[str]:
+        """Build a templated summary for short histories without calling an LLM.
+
+        Args:
+            user_id: Telegram user ID.
+            max_chars: Total content length above which an LLM summary is needed.
+
+        Returns:
+            One-line summary, or None if the history is empty or too long.
+        """
+        interactions = self.get_last_interactions(user_id, self.max_per_user)
+        if not interactions:
+            return None
+
+        total_chars = sum(len(interaction.content) for interaction in interactions)
+        if total_chars >= max_chars and len(interactions) > 1:
+            return None
+
+        phrases = []
+        for interaction in reversed(interactions):
+            content = interaction.content[:100]
+            if interaction.interaction_type == "ask":
+                phrases.append(f'asked about "{content}"')
+            elif interaction.interaction_type == "image":
+                phrases.append(f'uploaded an image captioned "{content}"')
+            else:
+                phrases.append(f'said "{content}"')
+
+        return "You " + ", then ".join(phrases) + "."
+
     def clear_user_history(self, user_id: int) -> None:
         """Clear all history for a user.
 
@@ -123,4 +152,5 @@ class HistoryManager:
         """
         if user_id in self.history:
             del self.history[user_id]
+            self.last_image.pop(user_id, None)
             logger.debug(f"Cleared history for user {user_id}")
@@ -1,5 +1,5 @@
 # app/vision/__init__.py
 """Vision module for image captioning."""
-from app.vision.blip_service import BLIPCaptioningService
+from app.vision.blip_service import BLIPCaptioningService, CaptionResult
 
-__all__ = ["BLIPCaptioningService"]
+__all__ = ["BLIPCaptioningService", "CaptionResult"]
@@ -3,28 +3,140 @@
 BLIP-2 image captioning service.
 Generates captions and tags for images using Hugging Face transformers.
 """
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, TypedDict, Union
+import functools
+import hashlib
 import logging
+import os
+import re
+import threading
 from pathlib import Path
 import asyncio
 
+from app.utils.batcher import MicroBatcher
+
 logger = logging.getLogger(__name__)
 
+# Common words never used as tags
+_STOP_WORDS = frozenset(
+    {
+        "the",
+        "a",
+        "an",
+        "and",
+        "or",
+        "but",
+        "in",
+        "on",
+        "at",
+        "to",
+        "for",
+        "of",
+        "with",
+        "is",
+        "are",
+        "was",
+        "were",
+    }
+)
+
+# Candidate tag words: runs of 4+ letters (punctuation never becomes part of a tag)
+_KEYWORD_RE = re.compile(r"[a-z]{4,}")
+
+
+
+class CaptionResult(TypedDict):
+    """Caption result returned by BLIPCaptioningService (a plain dict at runtime)."""
+
+    caption: str  # short caption (<= 20 words), or an error message
+    tags: List[str]  # 3 keyword tags (empty on failure)
+    description: str  # full generated caption
+    success: bool
+
+
+@functools.lru_cache(maxsize=None)
+def _import_torchvision_io():
+    """Return the optional torchvision.io module (nvJPEG decoding on CUDA), or None."""
+    try:
+        import torchvision.io
+    except Exception:
+        return None
+    return torchvision.io
+
+
+# Caption length: BLIP's WordPiece captions average ~1.3 tokens per word, so 26 new
+# tokens is about the 20 words kept in the short caption (fewer decoder steps than 30)
+CAPTION_MAX_TOKENS = 26
+CAPTION_MAX_WORDS = 20
+
+# Threads decoding and preprocessing the uncached images of one batch
+PREPROCESS_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Preprocessed images (CPU pixel_values, ~0.3-0.6 MB each) kept for repeated captions
+PIXEL_CACHE_SIZE = 128
+
 
 class BLIPCaptioningService:
     """Image captioning service using BLIP-2 model."""
 
-    def __init__(self, model_name: str = "Salesforce/blip-image-captioning-base"):
+    def __init__(
+        self,
+        model_name: str = "Salesforce/blip-image-captioning-base",
+        executor: Optional[Executor] = None,
+        batch_size: int = 8,
+        batch_wait_ms: float = 20.0,
+        quantize: bool = True,
+        cpu_offload: bool = False,
+        fp8_weights: bool = False,
+    ):
         """Initialize BLIP captioning service.
 
         Args:
             model_name: HuggingFace model name for BLIP.
+            executor: Executor for blocking inference (default: a single-worker pool owned
+                by the service, so forward passes on the device never interleave).
+            batch_size: Maximum concurrent images captioned per forward pass.
+            batch_wait_ms: Maximum time to wait for a batch to fill.
+            quantize: On CPU, quantize the model's Linear layers to int8 (dynamic).
+            cpu_offload: On CUDA, keep the weights in pinned host memory and copy them to
+                the GPU only while captioning, freeing the VRAM between requests.
+            fp8_weights: On GPUs with fp8 support (compute capability 8.9+), store Linear
+                weights as float8_e4m3fn and upcast each layer's weight just before use.
         """
         self.model_name = model_name
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="blip")
+        self.batch_size = batch_size
+        self.quantize = quantize
+        # (source key) -> CPU pixel_values of one image, least recently used first
+        self._pixel_cache: OrderedDict = OrderedDict()
+        self._pixel_cache_lock = threading.Lock()
+        self._preprocess_executor = ThreadPoolExecutor(
+            max_workers=PREPROCESS_WORKERS, thread_name_prefix="blip-prep"
+        )
+        # (size, rescale factor, mean, std) for JPEG decoding on the GPU, set on CUDA
+        self._jpeg_params: Optional[Tuple] = None
+        self._batcher = MicroBatcher(
+            self._caption_batch_async,
+            max_batch_size=batch_size,
+            max_wait_ms=batch_wait_ms,
+            batched=True,
+        )
         self.device = "cuda" if self._has_cuda() else "cpu"
+        self.cpu_offload = cpu_offload and self.device == "cuda"
+        self.fp8_weights = fp8_weights and self.device == "cuda"
+        # Offloaded weights: the model's tensors and their pinned host copies
+        self._offload_tensors: List = []
+        self._host_tensors: List = []
+        self._offload_lock = threading.Lock()
         self.processor = None
         self.model = None
-        self._initialize_model()
+        # The model is loaded on first use (see _ensure_loaded), not at construction
+        self._loaded = False
+        self._model_lock = threading.Lock()
 
     def _has_cuda(self) -> bool:
         """Check if CUDA is available."""
@@ -35,26 +147,244 @@ class BLIPCaptioningService:
         except ImportError:
             return False
 
+    def _ensure_loaded(self) -> None:
+        """Load the model and processor once, on first use (thread-safe)."""
+        if self._loaded:
+            return
+        with self._model_lock:
+            if not self._loaded:
+                self._initialize_model()
+                self._loaded = True
+
     def _initialize_model(self) -> None:
         """Initialize BLIP model and processor."""
         try:
+            import torch
             from transformers import BlipProcessor, BlipForConditionalGeneration
 
-            logger.info(f"Loading BLIP model: {self.model_name} on {self.device}")
+            # Load weights straight into the compute dtype: half precision on CUDA (no
+            # fp32 copy on the GPU), fp32 on CPU (no fast bf16 matmuls there)
+            dtype = torch.float16 if self.device == "cuda" else torch.float32
+            logger.info(f"Loading BLIP model: {self.model_name} on {self.device} ({dtype})")
             self.processor = BlipProcessor.from_pretrained(self.model_name)
             self.model = BlipForConditionalGeneration.from_pretrained(
-                self.model_name, torch_dtype="auto"
-            ).to(self.device)
+                self.model_name, torch_dtype=dtype
+            )
+            self.model.eval()
+            if self.fp8_weights and torch.cuda.get_device_capability() >= (8, 9):
+                self._enable_fp8_weights()
+            else:
+                self.fp8_weights = False
+            if self.cpu_offload:
+                # Pinned pages allow asynchronous (non_blocking) host-to-GPU copies
+                self._offload_tensors = [*self.model.parameters(), *self.model.buffers()]
+                self._host_tensors = [t.data.pin_memory() for t in self._offload_tensors]
+                for tensor, host in zip(self._offload_tensors, self._host_tensors):
+                    tensor.data = host
+            else:
+                self.model.to(self.device)
+            if self.device == "cuda" and not (self.cpu_offload or self.fp8_weights):
+                # CUDA graphs capture weight addresses, which change on every offload
+                # or fp8 upcast
+                self._compile_vision_model()
+            if self.device == "cuda" and _import_torchvision_io() is not None:
+                self._setup_device_jpeg()
+            if self.device == "cpu" and self.quantize:
+                # int8 weights and int8 GEMMs for the Linear layers (most of the text decoder
+                # and the ViT blocks); the patch-embedding conv keeps fp32 weights
+                self.model = torch.ao.quantization.quantize_dynamic(
+                    self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+                )
             logger.info("BLIP model loaded successfully")
         except ImportError as e:
             logger.error(f"transformers library not installed: {e}")
         except Exception as e:
             logger.error(f"Error loading BLIP model: {e}")
 
+    def _enable_fp8_weights(self) -> None:
+        """Store Linear weights as float8_e4m3fn, upcast around each layer's forward.
+
+        Halves weight memory and weight reads versus fp16. Norm and embedding layers
+        (and Linear layers sharing an embedding's weight, like the tied LM head) stay
+        in the compute dtype; biases are not cast.
+        """
+        import torch
+
+        compute_dtype = self.model.dtype
+        storage_dtype = torch.float8_e4m3fn
+
+        def upcast(module, args):
+            module.weight.data = module.weight.data.to(compute_dtype)
+
+        def downcast(module, args, output):
+            module.weight.data = module.weight.data.to(storage_dtype)
+
+        modules = list(self.model.named_modules())
+        embedding_weights = {
+            id(module.weight) for _, module in modules if isinstance(module, torch.nn.Embedding)
+        }
+        count = 0
+        for name, module in modules:
+            if (
+                not isinstance(module, torch.nn.Linear)
+                or "norm" in name
+                or "embed" in name
+                or id(module.weight) in embedding_weights
+            ):
+                continue
+            module.weight.data = module.weight.data.to(storage_dtype)
+            module.register_forward_pre_hook(upcast)
+            module.register_forward_hook(downcast)
+            count += 1
+        logger.info(f"Stored {count} BLIP Linear weights as {storage_dtype}")
+
+    def _setup_device_jpeg(self) -> None:
+        """Precompute the BLIP image processor's resize and normalization on the GPU."""
+        import torch
+
+        image_processor = self.processor.image_processor
+        size = (image_processor.size["height"], image_processor.size["width"])
+        mean = torch.tensor(image_processor.image_mean, device=self.device).view(1, 3, 1, 1)
+        std = torch.tensor(image_processor.image_std, device=self.device).view(1, 3, 1, 1)
+        self._jpeg_params = (size, image_processor.rescale_factor, mean, std)
+
+    def _decode_jpeg_on_device(self, image_path: Union[str, BinaryIO]):
+        """Decode a JPEG with nvJPEG and preprocess it like BlipProcessor, on the GPU.
+
+        Args:
+            image_path: Path to image file, or a binary file-like object with image bytes.
+
+        Returns:
+            (3, H, W) pixel_values on self.device, or None if the image is not a JPEG
+            (it then goes through PIL and the processor).
+        """
+        if isinstance(image_path, str):
+            with open(image_path, "rb") as f:
+                data = f.read()
+        elif hasattr(image_path, "getvalue"):
+            data = image_path.getvalue()
+        else:
+            return None
+        if not data.startswith(b"\xff\xd8"):
+            return None
+
+        import torch
+        import torch.nn.functional as F
+
+        tvio = _import_torchvision_io()
+        size, rescale_factor, mean, std = self._jpeg_params
+        image = tvio.decode_jpeg(
+            torch.frombuffer(bytearray(data), dtype=torch.uint8),
+            mode=tvio.ImageReadMode.RGB,
+            device=self.device,
+        )
+        image = F.interpolate(
+            image[None].float(), size=size, mode="bicubic", align_corners=False, antialias=True
+        ).clamp_(0, 255)
+        # Normalize in place: interpolate's output is the only full-size float buffer
+        return image.mul_(rescale_factor).sub_(mean).div_(std)[0].to(self.model.dtype)
+
+    def _cache_pixels(self, key: Optional[Tuple], pixels) -> None:
+        """Store CPU pixel_values under key, evicting the least recently used entry.
+
+        Args:
+            key: Cache key from _pixel_cache_key (None: not cached).
+            pixels: (3, H, W) pixel_values (copied to the CPU if on the GPU).
+        """
+        if key is None:
+            return
+        pixels = pixels.cpu()
+        with self._pixel_cache_lock:
+            self._pixel_cache[key] = pixels
+            if len(self._pixel_cache) > PIXEL_CACHE_SIZE:
+                self._pixel_cache.popitem(last=False)
+
+    def _move_weights(self, to_gpu: bool) -> None:
+        """Point the offloaded model's tensors at GPU copies of the pinned host tensors, or back.
+
+        Weights never change during inference, so moving back just drops the GPU copies
+        (no device-to-host copy) and returns their blocks to the driver.
+
+        Args:
+            to_gpu: True to start the (asynchronous) copy to the GPU, False to release it.
+        """
+        import torch
+
+        for tensor, host in zip(self._offload_tensors, self._host_tensors):
+            tensor.data = host.to(self.device, non_blocking=True) if to_gpu else host
+        if not to_gpu:
+            torch.cuda.empty_cache()
+
+    def _compile_vision_model(self) -> None:
+        """Compile the ViT image encoder with torch.compile (CUDA graphs, fused kernels).
+
+        The processor always resizes to the checkpoint's fixed image size, so the encoder
+        sees one shape per batch size and is only recompiled for a new batch size. The
+        text decoder stays eager: its sequence length grows every decoding step.
+        Compilation is lazy, so one warm-up pass runs here; if it fails the eager
+        encoder is kept instead of failing the first captions.
+        """
+        eager = self.model.vision_model
+        try:
+            import torch
+
+            compiled = torch.compile(eager, mode="reduce-overhead", dynamic=False)
+            size = self.model.config.vision_config.image_size
+            with self._inference_context():
+                compiled(
+                    torch.zeros(1, 3, size, size, dtype=self.model.dtype, device=self.device)
+                )
+            self.model.vision_model = compiled
+        except Exception as e:
+            logger.warning(f"torch.compile unavailable, vision encoder runs eagerly: {e}")
+            self.model.vision_model = eager
+
+    def _inference_context(self) -> ExitStack:
+        """Build the context captions are generated in.
+
+        Autograd is disabled with torch.inference_mode(); on CUDA matmuls also run
+        under fp16 autocast. CPU stays in fp32, since bf16 autocast is slower on CPUs
+        without native bf16 instructions.
+
+        Returns:
+            ExitStack with the entered contexts (empty if torch is unavailable).
+        """
+        stack = ExitStack()
+        try:
+            import torch
+        except ImportError:
+            return stack
+        stack.enter_context(torch.inference_mode())
+        if self.device == "cuda":
+            stack.enter_context(torch.autocast(device_type="cuda", dtype=torch.float16))
+        return stack
+
+    @staticmethod
+    def _pixel_cache_key(image_path: Union[str, BinaryIO]) -> Optional[Tuple]:
+        """Key identifying an image's content for the preprocessing cache.
+
+        Args:
+            image_path: Path to image file, or a binary file-like object with image bytes.
+
+        Returns:
+            (path, mtime, size) for a file, a content hash for in-memory bytes, or None
+            if the source cannot be keyed (it is then preprocessed without caching).
+        """
+        try:
+            if isinstance(image_path, str):
+                stat = os.stat(image_path)
+                return ("path", image_path, stat.st_mtime_ns, stat.st_size)
+            if hasattr(image_path, "getbuffer"):
+                with image_path.getbuffer() as data:
+                    return ("bytes", hashlib.blake2b(data, digest_size=16).digest())
+        except OSError:
+            pass
+        return None
+
     def _extract_keywords(self, caption: str) -> List[str]:
         """Extract keywords from caption.
 
-        Simple heuristic: extract noun phrases (words > 3 chars, excluding common words).
+        Simple heuristic: extract noun phrases (words of 4+ letters, excluding common words).
 
         Args:
             caption: Generated caption text.
@@ -62,37 +392,21 @@ class BLIPCaptioningService:
         Returns:
             List of keyword tags (max 3).
         """
-        stop_words = {
-            "the",
-            "a",
-            "an",
-            "and",
-            "or",
-            "but",
-            "in",
-            "on",
-            "at",
-            "to",
-            "for",
-            "of",
-            "with",
-            "is",
-            "are",
-            "was",
-            "were",
-        }
-
-        words = caption.lower().split()
-        keywords = [w.strip(".,!?;:") for w in words if len(w) > 3 and w.lower() not in stop_words]
+        keywords: List[str] = []
+        for word in _KEYWORD_RE.findall(caption.lower()):
+            if word not in _STOP_WORDS and word not in keywords:
+                keywords.append(word)
+                if len(keywords) == 3:
+                    break
 
-        # Return top 3 unique keywords
-        return list(set(keywords))[:3]
+        # First 3 unique keywords, in caption order
+        return keywords
 
-    def caption_image(self, image_path: str) -> Dict[str, any]:
+    def caption_image(self, image_path: Union[str, BinaryIO]) -> CaptionResult:
         """Generate caption and tags for an image.
 
         Args:
-            image_path: Path to image file.
+            image_path: Path to image file, or a binary file-like object with image bytes.
 
         Returns:
             Dict with keys:
@@ -101,66 +415,293 @@ class BLIPCaptioningService:
                 - description: Optional detailed description
                 - success: Boolean indicating if captioning succeeded
         """
+        return self.caption_images([image_path])[0]
+
+    def caption_images(
+        self, image_paths: List[Union[str, BinaryIO]], batch_size: Optional[int] = None
+    ) -> List[CaptionResult]:
+        """Generate captions and tags for several images, one BLIP forward pass per batch.
+
+        Args:
+            image_paths: Paths or binary file-like objects.
+            batch_size: Maximum images per forward pass, bounding activation memory
+                (defaults to the service batch_size).
+
+        Returns:
+            List of caption result dicts (see caption_image), in input order. Images
+                that fail to load get an error result without affecting the others.
+        """
+        self._ensure_loaded()
         if not self.model or not self.processor:
             logger.error("BLIP model not initialized")
-            return {
-                "caption": "Error: BLIP model not initialized",
-                "tags": [],
-                "description": "",
-                "success": False,
-            }
+            return [
+                {
+                    "caption": "Error: BLIP model not initialized",
+                    "tags": [],
+                    "description": "",
+                    "success": False,
+                }
+                for _ in image_paths
+            ]
+
+        results, entries = self._prepare_images(image_paths)
+        return self._generate_captions(image_paths, results, entries, batch_size)
+
+    def _prepare_images(
+        self, image_paths: List[Union[str, BinaryIO]]
+    ) -> Tuple[List[Optional[CaptionResult]], List[Tuple[int, Any]]]:
+        """Decode and preprocess images into CPU pixel_values, reusing cached ones.
+
+        Runs on the CPU (apart from nvJPEG decoding), so it can overlap another batch's
+        forward pass. Uncached images are prepared in parallel on a thread pool.
 
-        try:
-            from PIL import Image
+        Args:
+            image_paths: Paths or binary file-like objects.
+
+        Returns:
+            (results, entries): results holds error dicts for images that failed (None
+                elsewhere); entries holds (position, pixel_values) for the other images.
+        """
+        results: List[Optional[CaptionResult]] = [None] * len(image_paths)
+        entries: List[Tuple[int, Any]] = []
+        # (position, cache key, image source) of images not found in the cache
+        pending = []
+        for i, image_path in enumerate(image_paths):
+            key = self._pixel_cache_key(image_path)
+            with self._pixel_cache_lock:
+                pixels = self._pixel_cache.get(key) if key is not None else None
+                if pixels is not None:
+                    self._pixel_cache.move_to_end(key)
+            if pixels is not None:
+                entries.append((i, pixels))
+                continue
+            if self._jpeg_params is not None:
+                try:
+                    pixels = self._decode_jpeg_on_device(image_path)
+                except Exception as e:
+                    logger.debug(f"GPU JPEG decoding failed, using PIL: {e}")
+                if pixels is not None:
+                    entries.append((i, pixels))
+                    self._cache_pixels(key, pixels)
+                    continue
+            pending.append((i, key, image_path))
+
+        # Pillow's decoders and resize, and NumPy's normalization, release the GIL, so
+        # threads decode the images of an album in parallel
+        sources = [image_path for _, _, image_path in pending]
+        if len(pending) > 1:
+            prepared = self._preprocess_executor.map(self._preprocess_image, sources)
+        else:
+            prepared = map(self._preprocess_image, sources)
+        for (i, key, image_path), (pixels, error) in zip(pending, prepared):
+            if error is not None:
+                results[i] = self._error_result(image_path, error)
+                continue
+            entries.append((i, pixels))
+            self._cache_pixels(key, pixels)
+
+        entries.sort(key=lambda entry: entry[0])
+        return results, entries
+
+    def _preprocess_image(
+        self, image_path: Union[str, BinaryIO]
+    ) -> Tuple[Any, Optional[Exception]]:
+        """Decode one image with PIL and resize + normalize it with the BLIP processor.
 
-            # Load image
+        Args:
+            image_path: Path to image file, or a binary file-like object with image bytes.
+
+        Returns:
+            ((3, H, W) CPU pixel_values in the model dtype, None), or (None, error).
+        """
+        from PIL import Image
+
+        try:
             image = Image.open(image_path).convert("RGB")
+            pixels = self.processor(images=image, return_tensors="pt")["pixel_values"][0]
+            return pixels.to(self.model.dtype), None
+        except Exception as e:
+            return None, e
 
-            # Process and generate caption
-            inputs = self.processor(image, return_tensors="pt").to(self.device)
+    def _generate_captions(
+        self,
+        image_paths: List[Union[str, BinaryIO]],
+        results: List[Optional[CaptionResult]],
+        entries: List[Tuple[int, Any]],
+        batch_size: Optional[int],
+    ) -> List[CaptionResult]:
+        """Caption preprocessed images on self.device, filling results in place.
 
-            # Generate caption (max 30 tokens to keep it short)
-            caption_ids = self.model.generate(**inputs, max_new_tokens=30, min_length=5)
-            caption = self.processor.decode(caption_ids[0], skip_special_tokens=True)
+        Args:
+            image_paths: Original image sources (for error messages).
+            results: Result list from _prepare_images.
+            entries: (position, pixel_values) pairs from _prepare_images.
+            batch_size: Maximum images per forward pass (None for the service batch_size).
 
-            # Truncate to ~20 words
-            caption_words = caption.split()[:20]
-            caption_short = " ".join(caption_words)
+        Returns:
+            results, with a caption result at every position.
+        """
+        if not entries:
+            return results
+        if not self.cpu_offload:
+            self._generate_batches(image_paths, results, entries, batch_size)
+            return results
+        with self._offload_lock:
+            self._move_weights(to_gpu=True)
+            try:
+                self._generate_batches(image_paths, results, entries, batch_size)
+            finally:
+                self._move_weights(to_gpu=False)
+        return results
+
+    def _generate_batches(
+        self,
+        image_paths: List[Union[str, BinaryIO]],
+        results: List[Optional[CaptionResult]],
+        entries: List[Tuple[int, Any]],
+        batch_size: Optional[int],
+    ) -> None:
+        """Run generate over entries in batches of at most batch_size images.
 
-            # Extract tags
-            tags = self._extract_keywords(caption)
+        Args:
+            image_paths: Original image sources (for error messages).
+            results: Result list filled in place.
+            entries: (position, pixel_values) pairs.
+            batch_size: Maximum images per forward pass (None for the service batch_size).
+        """
+        import torch
+
+        batch_size = max(1, batch_size or self.batch_size)
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start : start + batch_size]
+            try:
+                # Generate captions (max CAPTION_MAX_TOKENS to keep them short); greedy decoding
+                # with the KV cache is pinned so a checkpoint config cannot enable beams
+                pixel_values = torch.stack([pixels.to(self.device) for _, pixels in batch])
+                with self._inference_context():
+                    caption_ids = self.model.generate(
+                        pixel_values=pixel_values,
+                        max_new_tokens=CAPTION_MAX_TOKENS,
+                        min_length=5,
+                        num_beams=1,
+                        do_sample=False,
+                        use_cache=True,
+                    )
+                captions = self.processor.batch_decode(caption_ids, skip_special_tokens=True)
+
+                for (i, _), caption in zip(batch, captions):
+                    results[i] = self._format_result(caption)
+
+            except Exception as e:
+                for i, _ in batch:
+                    results[i] = self._error_result(image_paths[i], e)
+
+    def _format_result(self, caption: str) -> CaptionResult:
+        """Build a caption result from a decoded caption.
 
-            # If we need exactly 3 tags, add generic ones
-            while len(tags) < 3:
-                tags.append("image")
+        Args:
+            caption: Decoded caption text.
 
-            return {
-                "caption": caption_short,
-                "tags": tags[:3],
-                "description": caption,
-                "success": True,
-            }
+        Returns:
+            Caption result dict.
+        """
+        # Truncate to 20 words; the token cap keeps most captions under that, so the
+        # split/join only runs when a caption has more than 20 words
+        caption_short = caption.strip()
+        if caption_short.count(" ") >= CAPTION_MAX_WORDS:
+            caption_short = " ".join(caption_short.split()[:CAPTION_MAX_WORDS])
 
-        except Exception as e:
-            logger.error(f"Error captioning image {image_path}: {e}")
-            return {
-                "caption": f"Error: {str(e)[:50]}",
-                "tags": [],
-                "description": "",
-                "success": False,
-            }
-
-    async def caption_image_async(self, image_path: str) -> Dict[str, any]:
+        # Extract tags
+        tags = self._extract_keywords(caption)
+
+        # If we need exactly 3 tags, add generic ones
+        while len(tags) < 3:
+            tags.append("image")
+
+        return {
+            "caption": caption_short,
+            "tags": tags[:3],
+            "description": caption,
+            "success": True,
+        }
+
+    def _error_result(self, image_path: Union[str, BinaryIO], error: Exception) -> CaptionResult:
+        """Build a caption result for a failed image.
+
+        Args:
+            image_path: Path or file-like object that failed.
+            error: Raised exception.
+
+        Returns:
+            Caption result dict with success=False.
+        """
+        source = image_path if isinstance(image_path, str) else "from memory"
+        logger.error(f"Error captioning image {source}: {error}")
+        return {
+            "caption": f"Error: {str(error)[:50]}",
+            "tags": [],
+            "description": "",
+            "success": False,
+        }
+
+    async def caption_image_async(self, image_path: Union[str, BinaryIO]) -> CaptionResult:
         """Asynchronous version of caption_image.
 
+        Concurrent calls arriving within a short window are captioned together in
+        one batched forward pass.
+
         Args:
-            image_path: Path to image file.
+            image_path: Path to image file or binary file-like object.
 
         Returns:
             Caption result dict.
         """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, lambda: self.caption_image(image_path))
+        return await self._batcher.submit(image_path)
+
+    async def _caption_batch_async(
+        self, batch: List[Tuple[Union[str, BinaryIO]]]
+    ) -> List[CaptionResult]:
+        """Caption a micro-batch: preprocess on a CPU thread, then generate on the executor.
+
+        Args:
+            batch: List of (image_path,) argument tuples from the batcher.
+
+        Returns:
+            Caption result dicts in batch order.
+        """
+        loop = asyncio.get_running_loop()
+        image_paths = [args[0] for args in batch]
+        if not self._loaded:
+            await loop.run_in_executor(self.executor, self._ensure_loaded)
+        if not self.model or not self.processor:
+            return self.caption_images(image_paths)
+
+        # Two stages: decoding/preprocessing runs on the default (CPU) pool, so it
+        # overlaps the previous batch's generate on the single inference executor
+        results, entries = await loop.run_in_executor(
+            None, self._prepare_images, image_paths
+        )
+        return await loop.run_in_executor(
+            self.executor, self._generate_captions, image_paths, results, entries, None
+        )
+
+    async def caption_image_from_bytes_async(self, image_bytes: BinaryIO) -> CaptionResult:
+        """Caption an image held in memory (e.g. a BytesIO download).
+
+        Args:
+            image_bytes: Binary file-like object positioned at the start of the image.
+
+        Returns:
+            Caption result dict.
+        """
+        return await self.caption_image_async(image_bytes)
+
+    async def aclose(self) -> None:
+        """Stop the captioning micro-batcher and the service's own thread pools."""
+        await self._batcher.aclose()
+        if self._owns_executor:
+            await asyncio.to_thread(self.executor.shutdown, wait=True)
+        await asyncio.to_thread(self._preprocess_executor.shutdown, wait=True)
 
     def get_stats(self) -> Dict:
         """Get service statistics.
@@ -172,4 +713,6 @@ class BLIPCaptioningService:
             "model_name": self.model_name,
             "device": self.device,
             "initialized": self.model is not None,
+            "cpu_offload": self.cpu_offload,
+            "fp8_weights": self.fp8_weights,
         }
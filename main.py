@@ -16,7 +16,7 @@ import sys
 sys.path.insert(0, str(Path(__file__).parent))
 
 from app.utils.logging import setup_logging
-from app.bot import main as bot_main
+from app.bot import install_event_loop_policy, main as bot_main
 
 
 if __name__ == "__main__":
@@ -24,6 +24,7 @@ if __name__ == "__main__":
     logger = logging.getLogger(__name__)
     
     logger.info("Starting Avivo Telegram RAG Bot...")
+    install_event_loop_policy()
     try:
         asyncio.run(bot_main())
     except KeyboardInterrupt:
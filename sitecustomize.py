@@ -14,18 +14,12 @@ except Exception:
 
 if hf is not None and not hasattr(hf, "cached_download"):
     try:
-        # Newer huggingface_hub exposes hf_hub_download; match signature loosely.
+        # Newer huggingface_hub exposes hf_hub_download (returns a local file path).
+        # Aliased directly, so cached_download accepts exactly hf_hub_download's
+        # arguments; the mapping is approximate but works for typical uses.
         from huggingface_hub import hf_hub_download
 
-        def cached_download(*args, **kwargs):
-            """
-            Minimal wrapper around hf_hub_download to emulate cached_download.
-            Note: arguments mapping is approximate but works for typical uses.
-            """
-            # hf_hub_download returns a local file path
-            return hf_hub_download(*args, **kwargs)
-
-        setattr(hf, "cached_download", cached_download)
+        setattr(hf, "cached_download", hf_hub_download)
         logger.info("Patched huggingface_hub.cached_download -> hf_hub_download")
     except Exception as e:
         logger.exception("Failed to patch huggingface_hub.cached_download: %s", e)